@@ -1,5 +1,7 @@
 """Ethereum testerchain."""
 
+from ._account import AccountState, derive_accounts
+from ._async import AsyncNode, AsyncRPCNode
 from ._constants import EVMVersion
 from ._exceptions import (
     BlockNotFound,
@@ -10,19 +12,46 @@ from ._exceptions import (
     TransactionReverted,
     ValidationError,
 )
+from ._fees import FeeHistory
+from ._filters import FilterKind, FilterStats
 from ._node import Node
+from ._profile import CallFrameProfile, ContractProfile, ExecutionProfile, OpcodeProfile
+from ._replay import ReplayStats, RPCRecorder, replay_rpc
 from ._rpc import RPCNode
+from ._state_diff import AccountDiff, StateDiff
+from ._storage import StorageEntry, StorageRange
+from ._txpool import TxPoolContent, TxPoolStatus
 
 __all__ = [
+    "AccountDiff",
+    "AccountState",
+    "AsyncNode",
+    "AsyncRPCNode",
     "BlockNotFound",
+    "CallFrameProfile",
+    "ContractProfile",
     "EVMVersion",
+    "ExecutionProfile",
+    "FeeHistory",
+    "FilterKind",
     "FilterNotFound",
     "FilterParams",
+    "FilterStats",
     "IndexNotFound",
     "Node",
+    "OpcodeProfile",
     "RPCNode",
+    "RPCRecorder",
+    "ReplayStats",
+    "StateDiff",
+    "StorageEntry",
+    "StorageRange",
     "TransactionFailed",
     "TransactionNotFound",
     "TransactionReverted",
+    "TxPoolContent",
+    "TxPoolStatus",
     "ValidationError",
+    "derive_accounts",
+    "replay_rpc",
 ]
@@ -0,0 +1,57 @@
+from collections.abc import Mapping
+from dataclasses import dataclass
+from functools import cache
+
+from ethereum_rpc import Address, keccak
+
+
+@dataclass(frozen=True)
+class AccountState:
+    """
+    Values to assign to the fields of an account.
+    The fields set to ``None`` are left unchanged.
+    """
+
+    balance: None | int = None
+    """The balance in wei."""
+
+    nonce: None | int = None
+    """The number of transactions sent from the account."""
+
+    code: None | bytes = None
+    """The contract bytecode."""
+
+    storage: None | Mapping[int, int] = None
+    """
+    The storage slots to set.
+    The slots not present in the mapping are left unchanged.
+    """
+
+
+def derive_accounts(count: int, *, seed: bytes = b"alysis") -> list[tuple[bytes, Address]]:
+    """
+    Returns ``count`` pairs of (private key, address), deterministically derived from ``seed``.
+    The same seed always produces the same accounts, with the first ``n`` accounts
+    being the same for any ``count >= n``.
+
+    Intended to be used with the ``genesis_accounts`` parameter of :py:class:`Node`
+    to create a set of funded accounts.
+
+    .. note::
+
+        Deriving the addresses requires elliptic curve operations which are slow in pure Python
+        (a few milliseconds per account). They will be much faster if ``coincurve``
+        is installed (it is picked up by ``eth-keys`` automatically).
+        The results are cached, so repeated calls with the same seed are cheap.
+    """
+    return [_derive_account(seed, index) for index in range(count)]
+
+
+@cache
+def _derive_account(seed: bytes, index: int) -> tuple[bytes, Address]:
+    # Deferred since it takes a while to import, and is only needed when deriving accounts.
+    from eth_keys import KeyAPI  # noqa: PLC0415
+
+    private_key = keccak(seed + index.to_bytes(32, byteorder="big"))
+    address = KeyAPI().PrivateKey(private_key).public_key.to_canonical_address()
+    return private_key, Address(address)
@@ -0,0 +1,393 @@
+"""Asynchronous wrappers for the node APIs."""
+
+import asyncio
+import threading
+from collections.abc import Callable, Mapping, Sequence
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import ParamSpec, TypeVar
+
+from ethereum_rpc import (
+    JSON,
+    Address,
+    Amount,
+    Block,
+    BlockHash,
+    BlockInfo,
+    EstimateGasParams,
+    EthCallParams,
+    FilterParams,
+    FilterParamsEIP234,
+    LogEntry,
+    TxHash,
+    TxInfo,
+    TxReceipt,
+    structure,
+    unstructure,
+)
+
+from ._account import AccountState
+from ._fees import FeeHistory
+from ._filters import FilterStats, LogFilter
+from ._node import Node
+from ._profile import ExecutionProfile
+from ._rpc import RPCNode, translate_rpc_errors
+from ._state_diff import StateDiff
+from ._storage import StorageRange
+from ._txpool import TxPoolContent, TxPoolStatus
+
+_P = ParamSpec("_P")
+_R = TypeVar("_R")
+
+
+class AsyncNode:
+    """
+    An ``asyncio`` wrapper for :py:class:`Node`.
+
+    All the methods of :py:class:`Node` are available as coroutines with the same parameters.
+    The ones that execute EVM code or access the database run in ``executor``,
+    so that the event loop is not blocked.
+    If ``executor`` is ``None``, a dedicated thread pool is created
+    (and shut down by :py:meth:`close`).
+    """
+
+    def __init__(self, node: Node, executor: None | Executor = None):
+        self.node = node
+        self._own_executor = executor is None
+        self._executor = (
+            ThreadPoolExecutor(thread_name_prefix="alysis") if executor is None else executor
+        )
+
+        # The futures of the coroutines waiting for filter changes.
+        self._waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future[None]]] = []
+        self._waiters_lock = threading.Lock()
+        self.node._add_change_listener(self._notify_waiters)  # noqa: SLF001
+
+    def close(self) -> None:
+        """Detaches from the node and shuts down the executor if it was created by this object."""
+        self.node._remove_change_listener(self._notify_waiters)  # noqa: SLF001
+        if self._own_executor:
+            self._executor.shutdown(wait=False)
+
+    async def run(self, func: Callable[_P, _R], *args: _P.args, **kwargs: _P.kwargs) -> _R:
+        """
+        Calls ``func`` with the given arguments in the executor and returns the result.
+        Can be used to run a custom synchronous operation on :py:attr:`node`
+        without blocking the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    def _notify_waiters(self) -> None:
+        # Called from the thread that made a change to the node
+        with self._waiters_lock:
+            waiters = self._waiters
+            self._waiters = []
+        for loop, future in waiters:
+            # The loop may have been closed while the change was being made
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_resolve, future)
+
+    async def wait_for_filter_changes(
+        self, filter_id: int, timeout: None | float = None
+    ) -> list[LogEntry] | list[TxHash] | list[BlockHash]:
+        """
+        Waits until there are new entries for the filter and returns them
+        (same as :py:meth:`Node.eth_get_filter_changes` would).
+        If there are no new entries after ``timeout`` seconds, returns an empty list.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        while True:
+            # Start watching before polling, so that no notifications are missed
+            future = loop.create_future()
+            with self._waiters_lock:
+                self._waiters.append((loop, future))
+
+            try:
+                changes = await self.eth_get_filter_changes(filter_id)
+                if changes:
+                    return changes
+
+                remaining = None if deadline is None else deadline - loop.time()
+                try:
+                    await asyncio.wait_for(future, remaining)
+                except asyncio.TimeoutError:
+                    return []
+            finally:
+                with self._waiters_lock:
+                    if (loop, future) in self._waiters:
+                        self._waiters.remove((loop, future))
+
+    async def eth_get_logs(self, params: FilterParams | FilterParamsEIP234) -> list[LogEntry]:
+        """
+        Returns an array of all logs matching a given filter object.
+
+        The blocks are scanned one at a time, so other tasks get to use the executor,
+        and the scan can be cancelled between blocks.
+        The range of the blocks to scan is fixed when the call is made.
+        """
+        if isinstance(params, FilterParamsEIP234):
+            return await self.run(self.node.eth_get_logs, params)
+
+        current_block_number = await self.eth_block_number()
+        log_filter = LogFilter(params, current_block_number)
+        entries = []
+        for block_number in log_filter.block_number_range(current_block_number):
+            block_params = FilterParams(
+                from_block=block_number,
+                to_block=block_number,
+                address=params.address,
+                topics=params.topics,
+            )
+            entries.extend(await self.run(self.node.eth_get_logs, block_params))
+        return entries
+
+    async def enable_auto_mine_transactions(self) -> None:
+        await self.run(self.node.enable_auto_mine_transactions)
+
+    async def disable_auto_mine_transactions(self) -> None:
+        await self.run(self.node.disable_auto_mine_transactions)
+
+    async def set_batch_mining(
+        self, *, transactions: None | int = None, gas: None | int = None
+    ) -> None:
+        await self.run(self.node.set_batch_mining, transactions=transactions, gas=gas)
+
+    async def set_interval_mining(self, interval: None | float) -> None:
+        await self.run(self.node.set_interval_mining, interval)
+
+    async def mine_block(self, timestamp: None | int = None) -> None:
+        await self.run(self.node.mine_block, timestamp)
+
+    async def mine_blocks(
+        self, count: int, *, timestamp: None | int = None, interval: int = 1
+    ) -> None:
+        await self.run(self.node.mine_blocks, count, timestamp=timestamp, interval=interval)
+
+    async def increase_time(self, seconds: int) -> int:
+        return await self.run(self.node.increase_time, seconds)
+
+    async def apply_state_patch(self, patch: Mapping[Address, AccountState]) -> None:
+        await self.run(self.node.apply_state_patch, patch)
+
+    async def set_balance(self, address: Address, balance: int) -> None:
+        await self.run(self.node.set_balance, address, balance)
+
+    async def set_nonce(self, address: Address, nonce: int) -> None:
+        await self.run(self.node.set_nonce, address, nonce)
+
+    async def set_code(self, address: Address, code: bytes) -> None:
+        await self.run(self.node.set_code, address, code)
+
+    async def set_storage_at(self, address: Address, slot: int, value: int) -> None:
+        await self.run(self.node.set_storage_at, address, slot, value)
+
+    async def dump_state(self, path: str | Path) -> None:
+        await self.run(self.node.dump_state, path)
+
+    async def net_version(self) -> int:
+        return self.node.net_version()
+
+    async def web3_client_version(self) -> str:
+        return self.node.web3_client_version()
+
+    async def web3_sha3(self, data: bytes) -> bytes:
+        return self.node.web3_sha3(data)
+
+    async def eth_chain_id(self) -> int:
+        return self.node.eth_chain_id()
+
+    async def eth_gas_price(self) -> Amount:
+        return await self.run(self.node.eth_gas_price)
+
+    async def eth_block_number(self) -> int:
+        return await self.run(self.node.eth_block_number)
+
+    async def eth_get_balance(self, address: Address, block: Block) -> int:
+        return await self.run(self.node.eth_get_balance, address, block)
+
+    async def eth_get_code(self, address: Address, block: Block) -> bytes:
+        return await self.run(self.node.eth_get_code, address, block)
+
+    async def eth_get_storage_at(self, address: Address, slot: int, block: Block) -> bytes:
+        return await self.run(self.node.eth_get_storage_at, address, slot, block)
+
+    async def eth_get_transaction_count(self, address: Address, block: Block) -> int:
+        return await self.run(self.node.eth_get_transaction_count, address, block)
+
+    async def eth_get_transaction_by_hash(self, transaction_hash: TxHash) -> TxInfo:
+        return await self.run(self.node.eth_get_transaction_by_hash, transaction_hash)
+
+    async def eth_get_block_by_number(self, block: Block, *, with_transactions: bool) -> BlockInfo:
+        return await self.run(
+            self.node.eth_get_block_by_number, block, with_transactions=with_transactions
+        )
+
+    async def eth_get_block_range(
+        self, from_block: Block, to_block: Block, *, with_transactions: bool
+    ) -> list[BlockInfo]:
+        return await self.run(
+            self.node.eth_get_block_range,
+            from_block,
+            to_block,
+            with_transactions=with_transactions,
+        )
+
+    async def eth_get_block_by_hash(
+        self, block_hash: BlockHash, *, with_transactions: bool
+    ) -> BlockInfo:
+        return await self.run(
+            self.node.eth_get_block_by_hash, block_hash, with_transactions=with_transactions
+        )
+
+    async def eth_get_transaction_receipt(self, transaction_hash: TxHash) -> TxReceipt:
+        return await self.run(self.node.eth_get_transaction_receipt, transaction_hash)
+
+    async def eth_get_block_receipts(self, block: Block) -> list[TxReceipt]:
+        return await self.run(self.node.eth_get_block_receipts, block)
+
+    async def eth_send_raw_transaction(self, raw_transaction: bytes) -> TxHash:
+        return await self.run(self.node.eth_send_raw_transaction, raw_transaction)
+
+    async def eth_call(self, params: EthCallParams, block: Block) -> bytes:
+        return await self.run(self.node.eth_call, params, block)
+
+    async def eth_estimate_gas(self, params: EstimateGasParams, block: Block) -> int:
+        return await self.run(self.node.eth_estimate_gas, params, block)
+
+    async def eth_fee_history(
+        self,
+        block_count: int,
+        newest_block: Block,
+        reward_percentiles: None | Sequence[float] = None,
+    ) -> FeeHistory:
+        return await self.run(
+            self.node.eth_fee_history, block_count, newest_block, reward_percentiles
+        )
+
+    async def txpool_content(self) -> TxPoolContent:
+        return await self.run(self.node.txpool_content)
+
+    async def txpool_status(self) -> TxPoolStatus:
+        return await self.run(self.node.txpool_status)
+
+    async def debug_profile_call(self, params: EthCallParams, block: Block) -> ExecutionProfile:
+        return await self.run(self.node.debug_profile_call, params, block)
+
+    async def debug_profile_transaction(self, transaction_hash: TxHash) -> ExecutionProfile:
+        return await self.run(self.node.debug_profile_transaction, transaction_hash)
+
+    async def debug_storage_range_at(
+        self, address: Address, block: Block, start_key: bytes, max_results: int
+    ) -> StorageRange:
+        return await self.run(
+            self.node.debug_storage_range_at, address, block, start_key, max_results
+        )
+
+    async def get_state_diff(self, block: Block) -> StateDiff:
+        return await self.run(self.node.get_state_diff, block)
+
+    async def eth_new_block_filter(self) -> int:
+        return await self.run(self.node.eth_new_block_filter)
+
+    async def eth_new_pending_transaction_filter(self) -> int:
+        return await self.run(self.node.eth_new_pending_transaction_filter)
+
+    async def eth_new_filter(self, params: FilterParams) -> int:
+        return await self.run(self.node.eth_new_filter, params)
+
+    async def delete_filter(self, filter_id: int) -> None:
+        await self.run(self.node.delete_filter, filter_id)
+
+    async def filter_stats(self) -> dict[int, FilterStats]:
+        return await self.run(self.node.filter_stats)
+
+    async def eth_get_filter_changes(
+        self, filter_id: int
+    ) -> list[LogEntry] | list[TxHash] | list[BlockHash]:
+        return await self.run(self.node.eth_get_filter_changes, filter_id)
+
+    async def eth_get_filter_logs(self, filter_id: int) -> list[LogEntry]:
+        return await self.run(self.node.eth_get_filter_logs, filter_id)
+
+    async def eth_uninstall_filter(self, filter_id: int) -> None:
+        await self.run(self.node.eth_uninstall_filter, filter_id)
+
+    async def eth_accounts(self) -> list[Address]:
+        return self.node.eth_accounts()
+
+    async def net_listening(self) -> bool:
+        return self.node.net_listening()
+
+    async def net_peer_count(self) -> int:
+        return self.node.net_peer_count()
+
+    async def eth_coinbase(self) -> Address:
+        return self.node.eth_coinbase()
+
+    async def eth_get_block_transaction_count_by_hash(self, block_hash: BlockHash) -> int:
+        return await self.run(self.node.eth_get_block_transaction_count_by_hash, block_hash)
+
+    async def eth_get_block_transaction_count_by_number(self, block: Block) -> int:
+        return await self.run(self.node.eth_get_block_transaction_count_by_number, block)
+
+    async def eth_get_uncle_count_by_block_hash(self, block_hash: BlockHash) -> int:
+        return await self.run(self.node.eth_get_uncle_count_by_block_hash, block_hash)
+
+    async def eth_get_uncle_count_by_block_number(self, block: Block) -> int:
+        return await self.run(self.node.eth_get_uncle_count_by_block_number, block)
+
+    async def eth_get_transaction_by_block_hash_and_index(
+        self, block_hash: BlockHash, index: int
+    ) -> TxInfo:
+        return await self.run(
+            self.node.eth_get_transaction_by_block_hash_and_index, block_hash, index
+        )
+
+    async def eth_get_transaction_by_block_number_and_index(
+        self, block: Block, index: int
+    ) -> TxInfo:
+        return await self.run(self.node.eth_get_transaction_by_block_number_and_index, block, index)
+
+    async def eth_get_uncle_by_block_hash_and_index(
+        self, block_hash: BlockHash, index: int
+    ) -> BlockInfo | None:
+        return await self.run(self.node.eth_get_uncle_by_block_hash_and_index, block_hash, index)
+
+    async def eth_get_uncle_by_block_number_and_index(
+        self, block: Block, index: int
+    ) -> BlockInfo | None:
+        return await self.run(self.node.eth_get_uncle_by_block_number_and_index, block, index)
+
+
+def _resolve(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class AsyncRPCNode:
+    """
+    An ``asyncio`` wrapper for :py:class:`RPCNode`, executing the requests
+    in the executor of the given :py:class:`AsyncNode`.
+    """
+
+    def __init__(self, node: AsyncNode):
+        self.node = node
+        self._rpc_node = RPCNode(node.node)
+
+    async def rpc(self, method_name: str, *params: JSON) -> JSON:
+        """
+        Makes an RPC request to the chain and returns the result on success,
+        or raises :py:class:`ethereum_rpc.RPCError` on failure.
+        """
+        if method_name == "eth_getLogs":
+            # Scan the blocks asynchronously instead of blocking an executor thread
+            with translate_rpc_errors():
+                (typed_params,) = structure(tuple[FilterParams | FilterParamsEIP234], params)
+                entries = await self.node.eth_get_logs(typed_params)
+                return unstructure(entries, list[LogEntry])
+
+        return await self.node.run(self._rpc_node.rpc, method_name, *params)
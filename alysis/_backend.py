@@ -1,8 +1,15 @@
-"""PyEVM-specific logic. Everything imported from ``eth`` is contained within this module."""
+"""
+PyEVM-specific logic. Everything imported from ``eth`` is contained within this module
+and the helper modules it uses (``_db``, ``_mempool``, ``_tracing``, ``_trie``).
+"""
 
+import heapq
+import itertools
 import os
 import time
-from collections.abc import Sequence
+from collections.abc import Mapping, Sequence
+from copy import copy
+from pathlib import Path
 from typing import Any, cast
 
 import rlp  # type: ignore[import-untyped]
@@ -18,13 +25,15 @@ from eth.abc import (
 from eth.chains.base import MiningChain
 from eth.constants import (
     BLANK_ROOT_HASH,
+    EMPTY_SHA3,
     POST_MERGE_DIFFICULTY,
     POST_MERGE_MIX_HASH,
     POST_MERGE_NONCE,
 )
-from eth.db import get_db_backend
+from eth.db.atomic import AtomicDB
+from eth.db.schema import SchemaV1
 from eth.exceptions import HeaderNotFound, Revert, VMError
-from eth.tools.builder.chain import copy as copy_chain
+from eth.rlp.accounts import Account
 from eth.typing import AccountDetails
 from eth.vm.forks import (
     BerlinVM,
@@ -68,7 +77,9 @@ from ethereum_rpc import (
     keccak,
 )
 
+from ._account import AccountState
 from ._constants import EVMVersion
+from ._db import OverlayDB, copy_chain
 from ._exceptions import (
     BlockNotFound,
     TransactionFailed,
@@ -76,9 +87,37 @@ from ._exceptions import (
     TransactionReverted,
     ValidationError,
 )
+from ._fees import BlockFeeStats, FeeHistory
+from ._lock import ReadWriteLock
+from ._mempool import Mempool, effective_tip
+from ._preimages import make_recording_vm_class, slot_key
+from ._profile import ExecutionProfile
+from ._records import pack_tx_location, unpack_tx_location
+from ._snapshot import StateChanges, StateSnapshot
+from ._state_diff import AccountDiff, StateDiff
+from ._state_file import StateFile, write_state_file
+from ._storage import StorageEntry, StorageRange
+from ._tracing import ProfileCollector
+from ._trie import build_state, get_trie_value, is_hash_key, iterate_trie, walk_state, walk_trie
+from ._txpool import TxPoolContent, TxPoolStatus
 
 ZERO_ADDRESS = EthAddress(20 * b"\x00")
 
+# The intrinsic gas of a transaction, the minimum any transaction can use.
+_TRANSACTION_GAS = 21000
+
+_HASH_LENGTH = 32
+
+# The metadata fields written by `PyEVMBackend.dump_state()`, and their types
+_STATE_FILE_METADATA = {
+    "chain_id": int,
+    "evm_version": str,
+    "root_private_key": str,
+    "state_root": str,
+    "gas_limit": int,
+    "timestamp": int,
+}
+
 EVM_MAPPING = {
     EVMVersion.HOMESTEAD: HomesteadVM,
     EVMVersion.TANGERINE_WHISTLE: TangerineWhistleVM,
@@ -100,35 +139,136 @@ def _rlp_encode(obj: Any) -> bytes:
     return cast("bytes", rlp.encode(obj))
 
 
+def _make_chain_class(
+    chain_id: int, evm_version: EVMVersion, preimages: dict[bytes, bytes]
+) -> type[MiningChain]:
+    chain_id_ = chain_id
+    vm_class = make_recording_vm_class(EVM_MAPPING[evm_version], preimages)
+
+    class MainnetTesterPosChain(MiningChain):
+        chain_id = chain_id_
+        vm_configuration = ((EthBlockNumber(0), vm_class),)
+
+        def create_header_from_parent(
+            self, parent_header: BlockHeaderAPI, **header_params: Any
+        ) -> BlockHeaderAPI:
+            """
+            Call the parent class method maintaining the same gas_limit as the
+            previous block.
+            """
+            header_params["gas_limit"] = parent_header.gas_limit
+            return super().create_header_from_parent(parent_header, **header_params)
+
+    return MainnetTesterPosChain
+
+
+def _make_genesis_params(
+    gas_limit: int, timestamp: int
+) -> dict[str, None | int | EthBlockNumber | bytes | EthAddress | EthHash32]:
+    return {
+        "coinbase": ZERO_ADDRESS,
+        "difficulty": POST_MERGE_DIFFICULTY,
+        "extra_data": b"",
+        "gas_limit": gas_limit,
+        "mix_hash": POST_MERGE_MIX_HASH,
+        "nonce": POST_MERGE_NONCE,
+        "receipt_root": BLANK_ROOT_HASH,
+        "timestamp": timestamp,
+        "transaction_root": BLANK_ROOT_HASH,
+    }
+
+
+_EMPTY_ACCOUNT: AccountDetails = {"balance": 0, "storage": {}, "code": b"", "nonce": 0}
+
+
+def _update_account_details(details: AccountDetails, account: AccountState) -> AccountDetails:
+    return {
+        "balance": details["balance"] if account.balance is None else account.balance,
+        "nonce": details["nonce"] if account.nonce is None else account.nonce,
+        "code": details["code"] if account.code is None else account.code,
+        "storage": {**details["storage"], **(account.storage or {})},
+    }
+
+
+class _HeaderIndex:
+    """The headers of the canonical blocks, indexed by number."""
+
+    def __init__(self, first_number: int, headers: list[BlockHeaderAPI]):
+        self._first_number = first_number
+        self._headers = headers
+
+    def __copy__(self) -> "_HeaderIndex":
+        return _HeaderIndex(self._first_number, list(self._headers))
+
+    def __getitem__(self, block_number: int) -> BlockHeaderAPI:
+        return self._headers[block_number - self._first_number]
+
+    @property
+    def latest(self) -> BlockHeaderAPI:
+        return self._headers[-1]
+
+    def append(self, header: BlockHeaderAPI) -> None:
+        self._headers.append(header)
+
+    def prune(self, oldest_number: int) -> None:
+        """Removes the headers of the blocks before ``oldest_number``."""
+        removed = oldest_number - self._first_number
+        if removed > 0:
+            del self._headers[:removed]
+            self._first_number = oldest_number
+
+
+def _make_genesis_fee_stats(genesis_header: BlockHeaderAPI) -> BlockFeeStats:
+    fee_stats = BlockFeeStats(first_block=0)
+    fee_stats.append(
+        getattr(genesis_header, "base_fee_per_gas", 0),
+        genesis_header.gas_used,
+        genesis_header.gas_limit,
+        [],
+    )
+    return fee_stats
+
+
+def _validate_history_params(state_history: None | int, block_history: None | int) -> None:
+    if block_history is not None and block_history < 1:
+        raise ValidationError(f"`block_history` must be positive, got {block_history}")
+    if state_history is not None and state_history < 1:
+        raise ValidationError(f"`state_history` must be positive, got {state_history}")
+    if block_history is not None and (state_history is None or state_history > block_history):
+        raise ValidationError(
+            "State cannot be retained for blocks whose headers are pruned: "
+            "`state_history` must be set and not exceed `block_history`"
+        )
+
+
 class PyEVMBackend:
-    def __init__(self, root_balance_wei: int, chain_id: int, evm_version: EVMVersion):
-        chain_id_ = chain_id
-
-        class MainnetTesterPosChain(MiningChain):
-            chain_id = chain_id_
-            vm_configuration = ((EthBlockNumber(0), EVM_MAPPING[evm_version]),)
-
-            def create_header_from_parent(
-                self, parent_header: BlockHeaderAPI, **header_params: Any
-            ) -> BlockHeaderAPI:
-                """
-                Call the parent class method maintaining the same gas_limit as the
-                previous block.
-                """
-                header_params["gas_limit"] = parent_header.gas_limit
-                return super().create_header_from_parent(parent_header, **header_params)
-
-        genesis_params: dict[str, None | int | EthBlockNumber | bytes | EthAddress | EthHash32] = {
-            "coinbase": ZERO_ADDRESS,
-            "difficulty": POST_MERGE_DIFFICULTY,
-            "extra_data": b"",
-            "gas_limit": 30029122,  # gas limit at London fork block 12965000 on mainnet
-            "mix_hash": POST_MERGE_MIX_HASH,
-            "nonce": POST_MERGE_NONCE,
-            "receipt_root": BLANK_ROOT_HASH,
-            "timestamp": int(time.time()),
-            "transaction_root": BLANK_ROOT_HASH,
-        }
+    # The minimum number of blocks between two garbage collections of the database
+    # when the history retention is enabled.
+    PRUNING_INTERVAL = 64
+
+    # The genesis timestamp in the deterministic mode (2024-01-01 00:00:00 UTC).
+    DETERMINISTIC_GENESIS_TIMESTAMP = 1704067200
+
+    def __init__(
+        self,
+        root_balance_wei: int,
+        chain_id: int,
+        evm_version: EVMVersion,
+        *,
+        genesis_accounts: None | Mapping[Address, AccountState] = None,
+        state_history: None | int = None,
+        block_history: None | int = None,
+        seed: None | bytes = None,
+        mempool: bool = False,
+    ):
+        _validate_history_params(state_history, block_history)
+
+        genesis_params = _make_genesis_params(
+            gas_limit=30029122,  # gas limit at London fork block 12965000 on mainnet
+            timestamp=self.DETERMINISTIC_GENESIS_TIMESTAMP
+            if seed is not None
+            else int(time.time()),
+        )
 
         account_state: AccountDetails = {
             "balance": root_balance_wei,
@@ -144,32 +284,251 @@ class PyEVMBackend:
             EthAddress(root_private_key.public_key.to_canonical_address()): account_state
         }
 
-        chain = cast(
-            "MiningChain",
-            MainnetTesterPosChain.from_genesis(get_db_backend(), genesis_params, genesis_state),
+        for address, account in (genesis_accounts or {}).items():
+            eth_address = EthAddress(bytes(address))
+            genesis_state[eth_address] = _update_account_details(
+                genesis_state.get(eth_address, _EMPTY_ACCOUNT), account
+            )
+
+        preimages: dict[bytes, bytes] = {}
+        for eth_address, details in genesis_state.items():
+            preimages[keccak(eth_address)] = eth_address
+            for slot in details["storage"]:
+                key = slot_key(slot)
+                preimages[keccak(key)] = key
+
+        # Building the state trie directly is much faster than `MiningChain.from_genesis()`
+        # which inserts the accounts one by one.
+        # Same as `get_db_backend()`, but allows copying the chain in constant time
+        db = AtomicDB(OverlayDB({}))
+        genesis_header = EVM_MAPPING[evm_version].create_genesis_header(
+            state_root=build_state(db, genesis_state), **genesis_params
         )
+        chain_class = _make_chain_class(chain_id, evm_version, preimages)
+        chain = cast("MiningChain", chain_class.from_genesis_header(db, genesis_header))
 
         self._initialize(
             chain=chain,
+            evm_version=evm_version,
             root_private_key=root_private_key.to_bytes(),
-            total_difficulty=chain.get_canonical_block_by_number(
-                EthBlockNumber(0)
-            ).header.difficulty,
+            total_difficulty=chain.get_canonical_head().difficulty,
+            headers=_HeaderIndex(0, [chain.get_canonical_head()]),
+            transaction_locations={},
+            patched_blocks={},
+            state_history=state_history,
+            block_history=block_history,
+            seed=seed,
+            genesis_timestamp=genesis_header.timestamp,
+            mempool=Mempool() if mempool else None,
+            fee_stats=_make_genesis_fee_stats(genesis_header),
+            snapshot=StateSnapshot(genesis_header.state_root),
+            preimages=preimages,
         )
+        # PyEVM creates the first pending header with the wall clock time
+        self._update_pending_timestamp()
+        self._publish_pending_header()
+
+    @classmethod
+    def from_state_file(
+        cls,
+        path: str | Path,
+        *,
+        state_history: None | int = None,
+        block_history: None | int = None,
+        seed: None | bytes = None,
+        mempool: bool = False,
+    ) -> "PyEVMBackend":
+        """Creates a chain whose genesis state is loaded from a file made by `dump_state()`."""
+        _validate_history_params(state_history, block_history)
+
+        # The state is not loaded into memory; the trie nodes are read from the file on demand,
+        # and everything written afterwards is kept in memory.
+        state_file = StateFile(path, _STATE_FILE_METADATA)
+        metadata = state_file.metadata
+        try:
+            evm_version = EVMVersion(metadata["evm_version"])
+            state_root = bytes.fromhex(metadata["state_root"])
+            root_private_key = bytes.fromhex(metadata["root_private_key"])
+        except ValueError as exc:
+            raise ValidationError(f"Invalid state file metadata: {exc}") from exc
+        # The preimages of the slots in the loaded state are not known
+        preimages: dict[bytes, bytes] = {}
+        chain_class = _make_chain_class(metadata["chain_id"], evm_version, preimages)
+        db = AtomicDB(OverlayDB(state_file))
+
+        genesis_params = _make_genesis_params(
+            gas_limit=metadata["gas_limit"], timestamp=metadata["timestamp"]
+        )
+        genesis_header = EVM_MAPPING[evm_version].create_genesis_header(
+            state_root=state_root, **genesis_params
+        )
+        chain = cast("MiningChain", chain_class.from_genesis_header(db, genesis_header))
+
+        obj = object.__new__(cls)
+        obj._initialize(
+            chain=chain,
+            evm_version=evm_version,
+            root_private_key=root_private_key,
+            total_difficulty=genesis_header.difficulty,
+            headers=_HeaderIndex(0, [chain.get_canonical_head()]),
+            transaction_locations={},
+            patched_blocks={},
+            state_history=state_history,
+            block_history=block_history,
+            seed=seed,
+            genesis_timestamp=genesis_header.timestamp,
+            mempool=Mempool() if mempool else None,
+            fee_stats=_make_genesis_fee_stats(genesis_header),
+            snapshot=StateSnapshot(genesis_header.state_root),
+            preimages=preimages,
+        )
+        obj._update_pending_timestamp()
+        obj._publish_pending_header()
+        return obj
+
+    def dump_state(self, path: str | Path) -> None:
+        """Saves the state at the latest block along with the chain metadata to a file."""
+        header = self._headers.latest
+        db = self.chain.chaindb.db
+
+        keys: set[bytes] = set()
+        for _account in walk_state(db, header.state_root, keys):
+            pass
+        # The blank root and the empty code hash are not stored in the database
+        entries = {key: db[key] for key in keys if key in db}
+
+        metadata = {
+            "chain_id": self.chain_id,
+            "evm_version": self._evm_version.value,
+            "root_private_key": self.root_private_key.hex(),
+            "state_root": header.state_root.hex(),
+            "gas_limit": header.gas_limit,
+            "timestamp": header.timestamp,
+        }
+
+        write_state_file(path, metadata, entries)
 
     def _initialize(
-        self, chain: MiningChain, root_private_key: bytes, total_difficulty: int
+        self,
+        *,
+        chain: MiningChain,
+        evm_version: EVMVersion,
+        root_private_key: bytes,
+        total_difficulty: int,
+        headers: _HeaderIndex,
+        transaction_locations: dict[bytes, int],
+        patched_blocks: dict[int, int],
+        state_history: None | int,
+        block_history: None | int,
+        seed: None | bytes,
+        genesis_timestamp: int,
+        mempool: None | Mempool,
+        fee_stats: BlockFeeStats,
+        snapshot: StateSnapshot,
+        preimages: dict[bytes, bytes],
+        time_offset: int = 0,
+        oldest_block: int = 0,
+        oldest_state_block: int = 0,
+        pruned_block: int = 0,
+        pruned_state_block: int = 0,
     ) -> None:
         self.chain_id = chain.chain_id
+        self._evm_version = evm_version
         self.root_private_key = root_private_key
         self.chain = chain
 
         # PyEVM doesn't keep track of it, so we have to.
         self._total_difficulty = total_difficulty
 
+        # Looking up a header in the database takes several reads and decoding,
+        # and the pending block is recreated every time it is requested,
+        # so the block numbers and labels are resolved using this index instead.
+        self._headers = headers
+
+        # The pending header as seen by the queries.
+        # The mutations work on `self.chain.header`, and publish it here only after
+        # the index above is updated, so a query capturing this header at its start
+        # always finds its parent and all the preceding blocks in the index.
+        self._pending_header = chain.header
+
+        # Transaction hash to the packed location (see `pack_tx_location()`)
+        # of the transactions in the mined blocks, so that they can be found
+        # without scanning the blocks.
+        self._transaction_locations = transaction_locations
+
+        # Block number to the number of transactions that were already in the block
+        # when its state was first patched directly. The transactions executed after that
+        # cannot be replayed starting from the parent state.
+        self._patched_blocks = patched_blocks
+
+        # The shift of the block timestamps relative to the wall clock.
+        self._time_offset = time_offset
+
+        # If set, the wall clock is replaced by a virtual one starting at the genesis timestamp,
+        # and the `prevrandao` values are derived from the seed,
+        # so that the same sequence of requests always produces the same chain.
+        self._seed = seed
+        self._genesis_timestamp = genesis_timestamp
+
+        # If set, the sent transactions are kept here until a block is mined,
+        # instead of being applied to the pending block right away.
+        self._mempool = mempool
+
+        # Fee statistics of the mined blocks, for the gas price and fee history queries.
+        self._fee_stats = fee_stats
+
+        # The flat view of the recent states, for the account and storage queries.
+        self._snapshot = snapshot
+
+        # Hashed addresses and storage slots to their preimages,
+        # filled by the chain's VM when the accounts and the storage are written to.
+        self._preimages = preimages
+
+        # History retention
+        self._state_history = state_history
+        self._block_history = block_history
+        # The oldest blocks available for queries.
+        self._oldest_block = oldest_block
+        self._oldest_state_block = oldest_state_block
+        # The values of `self._oldest_block` and `self._oldest_state_block`
+        # during the last garbage collection.
+        self._pruned_block = pruned_block
+        self._pruned_state_block = pruned_state_block
+
+        # Held for reading by the queries to the database,
+        # and for writing when database entries are deleted.
+        self.db_lock = ReadWriteLock()
+
     def __deepcopy__(self, _memo: None | dict[Any, Any]) -> "PyEVMBackend":
+        # Copying the database freezes its current contents, which must not be read meanwhile
+        with self.db_lock.writing():
+            chain = copy_chain(self.chain)
+
         obj = object.__new__(self.__class__)
-        obj._initialize(copy_chain(self.chain), self.root_private_key, self._total_difficulty)  # noqa: SLF001
+        obj._initialize(
+            chain=chain,
+            evm_version=self._evm_version,
+            root_private_key=self.root_private_key,
+            total_difficulty=self._total_difficulty,
+            headers=copy(self._headers),
+            transaction_locations=dict(self._transaction_locations),
+            patched_blocks=dict(self._patched_blocks),
+            state_history=self._state_history,
+            block_history=self._block_history,
+            seed=self._seed,
+            genesis_timestamp=self._genesis_timestamp,
+            mempool=self._mempool.copy() if self._mempool is not None else None,
+            fee_stats=copy(self._fee_stats),
+            snapshot=copy(self._snapshot),
+            # Shared, since the copied chain has the same VM class that writes into it
+            # (and the preimages are the same for all chains anyway).
+            preimages=self._preimages,
+            time_offset=self._time_offset,
+            oldest_block=self._oldest_block,
+            oldest_state_block=self._oldest_state_block,
+            pruned_block=self._pruned_block,
+            pruned_state_block=self._pruned_state_block,
+        )
         return obj
 
     @property
@@ -178,49 +537,334 @@ class PyEVMBackend:
         # but that's what we supply in the genesis parameters.
         return Address(ZERO_ADDRESS)
 
+    def increase_time(self, seconds: int) -> int:
+        if seconds < 0:
+            raise ValidationError(f"Cannot decrease the time (requested {seconds} seconds)")
+        self._time_offset += seconds
+        self._update_pending_timestamp()
+        self._publish_pending_header()
+        return self._time_offset
+
+    def _current_timestamp(self) -> int:
+        # The timestamp of a block created now.
+        if self._seed is None:
+            now = int(time.time())
+        else:
+            # A virtual clock advancing by one second per block
+            now = self._genesis_timestamp + self.chain.header.block_number
+        return max(self._headers.latest.timestamp + 1, now + self._time_offset)
+
+    def _update_pending_timestamp(self) -> None:
+        # The transactions are executed against the pending header, so its timestamp
+        # must be the one the block will be mined with.
+        # Once the pending block has transactions, they have already seen the timestamp,
+        # so it is kept until the block is mined.
+        if self.chain.header.transaction_root == BLANK_ROOT_HASH:
+            self.chain.header = self.chain.header.copy(timestamp=self._current_timestamp())
+
+    def _publish_pending_header(self) -> None:
+        # Headers are immutable, so the queries that have already captured
+        # the previous one keep working with it.
+        self._pending_header = self.chain.header
+
+    def apply_state_patch(self, patch: Mapping[Address, AccountState]) -> None:
+        # Write directly into the pending state, without going through transactions.
+        # The changes become a part of the next mined block.
+        vm = self.chain.get_vm(self.chain.header)
+        state = vm.state
+        try:
+            for address, account in patch.items():
+                eth_address = EthAddress(bytes(address))
+                if account.balance is not None:
+                    state.set_balance(eth_address, account.balance)
+                if account.nonce is not None:
+                    state.set_nonce(eth_address, account.nonce)
+                if account.code is not None:
+                    state.set_code(eth_address, account.code)
+                if account.storage is not None:
+                    for slot, value in account.storage.items():
+                        state.set_storage(eth_address, slot, value)
+        except EthValidationError as exc:
+            raise ValidationError(f"Invalid state patch: {exc}") from exc
+
+        state.persist()
+        self._patched_blocks.setdefault(
+            self.chain.header.block_number, len(self.chain.get_block().transactions)
+        )
+        self.chain.header = self.chain.header.copy(state_root=state.state_root)
+        self._publish_pending_header()
+
     def mine_block(self, timestamp: None | int = None) -> BlockHash:
-        if timestamp is not None:
-            current_timestamp = self.chain.header.timestamp
-            if timestamp < current_timestamp:
-                raise ValidationError(
-                    f"The new timestamp ({timestamp}) must be greater than "
-                    f"the current one ({current_timestamp})"
+        return self.mine_blocks(1, timestamp=timestamp)[0]
+
+    def mine_blocks(
+        self, count: int, timestamp: None | int = None, interval: int = 1
+    ) -> list[BlockHash]:
+        if count < 1:
+            raise ValidationError(f"The number of blocks must be positive, got {count}")
+        if interval < 1:
+            raise ValidationError(f"The block interval must be positive, got {interval}")
+
+        parent_timestamp = self._headers.latest.timestamp
+        if timestamp is None:
+            self._update_pending_timestamp()
+            timestamp = self.chain.header.timestamp
+        elif timestamp <= parent_timestamp:
+            raise ValidationError(
+                f"The new timestamp ({timestamp}) must be greater than "
+                f"the latest block's one ({parent_timestamp})"
+            )
+
+        block_hashes = []
+        for block_index in range(count):
+            self.chain.header = self.chain.header.copy(timestamp=timestamp + block_index * interval)
+            if self._mempool is not None and block_index == 0:
+                self._pack_pending_block(self._mempool)
+            block_hashes.append(self._mine_pending_block())
+
+        self._update_pending_timestamp()
+        self._publish_pending_header()
+        self._prune_history()
+
+        return block_hashes
+
+    def _pack_pending_block(self, mempool: Mempool) -> None:
+        # Fill the pending block with the pooled transactions, the highest tips first,
+        # while respecting the nonce order for each sender and the block gas limit.
+        state = self.chain.get_vm().state
+        base_fee = getattr(self.chain.header, "base_fee_per_gas", 0)
+
+        # Entries are (negated tip, arrival order of the sender, transaction)
+        queue: list[tuple[int, int, SignedTransactionAPI]] = []
+        counter = itertools.count()
+
+        def push(transaction: SignedTransactionAPI) -> None:
+            tip = effective_tip(transaction, base_fee)
+            if tip >= 0:
+                heapq.heappush(queue, (-tip, next(counter), transaction))
+
+        for sender in mempool.senders():
+            nonce = state.get_nonce(sender)
+            mempool.remove_stale(sender, nonce)
+            transaction = mempool.get(sender, nonce)
+            if transaction is not None:
+                push(transaction)
+
+        while queue:
+            remaining_gas = self.chain.header.gas_limit - self.chain.header.gas_used
+            if remaining_gas < _TRANSACTION_GAS:
+                break
+
+            _tip, _order, transaction = heapq.heappop(queue)
+            if transaction.gas > remaining_gas:
+                # This sender's transactions will have to wait for the next block
+                continue
+
+            try:
+                self.chain.apply_transaction(transaction)
+            except EthValidationError:
+                # The transaction became invalid (e.g. the sender spent the funds
+                # in another transaction), it will never be included.
+                mempool.remove(transaction)
+                continue
+
+            mempool.remove(transaction)
+            next_transaction = mempool.get(transaction.sender, transaction.nonce + 1)
+            if next_transaction is not None:
+                push(next_transaction)
+
+    def _mine_pending_block(self) -> BlockHash:
+        # ParisVM and forward, generate a random `mix_hash` to simulate the `prevrandao` value.
+        if self._seed is None:
+            mix_hash = os.urandom(32)
+        else:
+            block_number = self.chain.header.block_number
+            mix_hash = keccak(self._seed + block_number.to_bytes(32, byteorder="big"))
+
+        if self.chain.header.transaction_root == BLANK_ROOT_HASH:
+            # The fast path for empty blocks.
+            # Since there are no transactions and the block reward is zero after the merge,
+            # the state stays the same, and the pending header already has all the fields set.
+            # So we can skip executing and validating the block, and just store it.
+            header = self.chain.header.copy(coinbase=ZERO_ADDRESS, mix_hash=mix_hash)
+            block = self.chain.get_vm(header).get_block_class()(header, transactions=[], uncles=[])
+            self.chain.chaindb.persist_block(block)
+            self.chain.header = self.chain.create_header_from_parent(header)
+        else:
+            block = self.chain.mine_block(coinbase=ZERO_ADDRESS, mix_hash=mix_hash)
+
+        self._total_difficulty += block.header.difficulty
+        self._headers.append(block.header)
+        for index, transaction in enumerate(block.transactions):
+            self._transaction_locations[transaction.hash] = pack_tx_location(block.number, index)
+        self._record_fee_stats(block)
+        self._snapshot.add_layer(self.chain.chaindb.db, block.header.state_root)
+        self._publish_pending_header()
+        return BlockHash(block.hash)
+
+    def _record_fee_stats(self, block: BlockAPI) -> None:
+        header = block.header
+        base_fee = getattr(header, "base_fee_per_gas", 0)
+        tips_and_gas = []
+        if block.transactions:
+            receipts = block.get_receipts(self.chain.chaindb)
+            previous_gas_used = 0
+            for transaction, receipt in zip(block.transactions, receipts, strict=True):
+                tips_and_gas.append(
+                    (
+                        effective_tip(transaction, base_fee),
+                        receipt.gas_used - previous_gas_used,
+                    )
                 )
+                previous_gas_used = receipt.gas_used
+        self._fee_stats.append(base_fee, header.gas_used, header.gas_limit, tips_and_gas)
+
+    def get_latest_base_fee(self) -> int:
+        return self._fee_stats.base_fee(self._fee_stats.last_block)
+
+    def fee_history(
+        self, block_count: int, newest_block: Block, reward_percentiles: None | Sequence[float]
+    ) -> FeeHistory:
+        # The pending block has not been mined yet, so there are no statistics for it
+        pending_header = self._pending_header
+        newest_block_number = min(
+            self._resolve_block_number(newest_block, pending_header), self._fee_stats.last_block
+        )
+        self._check_block_is_retained(newest_block_number)
+        return self._fee_stats.fee_history(
+            block_count,
+            newest_block_number,
+            getattr(pending_header, "base_fee_per_gas", 0),
+            reward_percentiles,
+            oldest_retained_block=self._oldest_block,
+        )
 
-            # timestamp adjusted by 1 b/c a second is added in mine_blocks
-            self.chain.header = self.chain.header.copy(timestamp=timestamp - 1)
+    def _prune_history(self) -> None:
+        latest_block_number = self.chain.header.block_number - 1
+        if self._state_history is not None:
+            self._oldest_state_block = max(0, latest_block_number - self._state_history + 1)
+        if self._block_history is not None:
+            self._oldest_block = max(0, latest_block_number - self._block_history + 1)
+
+        # The blocks and states older than the retention window are unavailable for queries
+        # right away, but the database is only cleaned up periodically,
+        # since it requires walking through all the retained state.
+        # Note that `self._oldest_state_block >= self._oldest_block` is guaranteed.
+        if self._oldest_state_block - self._pruned_state_block < self.PRUNING_INTERVAL:
+            return
+
+        db = self.chain.chaindb.db
+        reachable = self._find_reachable_keys(latest_block_number)
+
+        # Deleting entries may break the queries running concurrently,
+        # so it is done while no readers are active.
+        with self.db_lock.writing():
+            # Remove the lookup entries for the pruned blocks.
+            # This must be done before their transactions are removed below.
+            for block_number in range(self._pruned_block, self._oldest_block):
+                block = self.chain.get_block_by_header(self._headers[block_number])
+                for transaction in block.transactions:
+                    del db[SchemaV1.make_transaction_hash_to_block_lookup_key(transaction.hash)]
+                    del self._transaction_locations[transaction.hash]
+                self._patched_blocks.pop(block_number, None)
+                del db[SchemaV1.make_block_number_to_hash_lookup_key(EthBlockNumber(block_number))]
+                del db[SchemaV1.make_block_hash_to_score_lookup_key(block.hash)]
+
+            overlay_db = cast("OverlayDB", cast("AtomicDB", db).wrapped_db)
+            for key in overlay_db.overlay_keys():
+                if is_hash_key(key) and key not in reachable:
+                    # The entries shared with the copies of this chain are not freed,
+                    # only hidden from this one.
+                    del overlay_db[key]
+
+            self._fee_stats.prune(self._oldest_block)
+            self._headers.prune(self._oldest_block)
+
+        self._pruned_block = self._oldest_block
+        self._pruned_state_block = self._oldest_state_block
+
+    def _find_reachable_keys(self, latest_block_number: int) -> set[bytes]:
+        # Find all the database entries reachable from the retained blocks and states
+        # (and the pending block).
+        db = self.chain.chaindb.db
+        reachable: set[bytes] = set()
+
+        headers = [self.chain.header] + [
+            self._headers[block_number]
+            for block_number in range(self._oldest_block, latest_block_number + 1)
+        ]
+        for header in headers:
+            if header.block_number >= self._oldest_state_block:
+                for _account in walk_state(db, header.state_root, reachable):
+                    pass
+
+            reachable.add(header.hash)
+            reachable.add(header.uncles_hash)
+            roots = [header.transaction_root, header.receipt_root]
+            withdrawals_root = getattr(header, "withdrawals_root", None)
+            if withdrawals_root is not None:
+                roots.append(withdrawals_root)
+            for root in roots:
+                for _value in walk_trie(db, root, reachable):
+                    pass
+
+        return reachable
+
+    def _check_block_is_retained(self, block_number: int) -> None:
+        if block_number < self._oldest_block:
+            raise BlockNotFound(
+                f"Block {block_number} has been pruned "
+                f"(the oldest available block is {self._oldest_block})"
+            )
 
-        # ParisVM and forward, generate a random `mix_hash` to simulate the `prevrandao` value.
-        mix_hash = os.urandom(32)
+    def _check_state_is_retained(self, block_number: int) -> None:
+        if block_number < self._oldest_state_block:
+            raise BlockNotFound(
+                f"The state at block {block_number} has been pruned "
+                f"(the oldest available state is at block {self._oldest_state_block})"
+            )
 
-        block_hash = BlockHash(self.chain.mine_block(coinbase=ZERO_ADDRESS, mix_hash=mix_hash).hash)
-        self._total_difficulty += self._get_block_by_number(BlockLabel.LATEST).header.difficulty
-        return block_hash
+    def _resolve_block_number(self, block: Block, pending_header: BlockHeaderAPI) -> int:
+        # `pending_header` is the one captured by the query, see `self._pending_header`.
+        pending_number = pending_header.block_number
 
-    def _get_block_by_number(self, block: Block) -> BlockAPI:
         if isinstance(block, int):
+            self._check_block_is_retained(block)
             # Note: The head block is the pending block. If a block number is passed
             # explicitly here, return the block only if it is already part of the chain
             # (i.e. not pending).
-            head_block = self.chain.get_block()
-            if block < head_block.number:
-                return self.chain.get_canonical_block_by_number(EthBlockNumber(block))
+            if block < pending_number:
+                return block
 
         if block in (BlockLabel.LATEST, BlockLabel.SAFE, BlockLabel.FINALIZED):
-            head_block = self.chain.get_block()
-            return self.chain.get_canonical_block_by_number(
-                EthBlockNumber(max(0, head_block.number - 1))
-            )
+            return max(0, pending_number - 1)
 
         if block == BlockLabel.EARLIEST:
-            return self.chain.get_canonical_block_by_number(EthBlockNumber(0))
+            self._check_block_is_retained(0)
+            return 0
 
         if block == BlockLabel.PENDING:
-            return self.chain.get_block()
+            return pending_number
 
         # fallback
         raise BlockNotFound(f"No block found for block number: {block}")
 
+    def _get_header_by_number(self, block: Block, pending_header: BlockHeaderAPI) -> BlockHeaderAPI:
+        block_number = self._resolve_block_number(block, pending_header)
+        if block_number == pending_header.block_number:
+            return pending_header
+        return self._headers[block_number]
+
+    def _get_pending_block(self, pending_header: BlockHeaderAPI) -> BlockAPI:
+        # Unlike `self.chain.get_block()`, does not depend on the header being mutated.
+        return self.chain.get_vm(pending_header).get_block()
+
+    def _get_block_by_number(self, block: Block, pending_header: BlockHeaderAPI) -> BlockAPI:
+        block_number = self._resolve_block_number(block, pending_header)
+        if block_number == pending_header.block_number:
+            return self._get_pending_block(pending_header)
+        return self.chain.get_block_by_header(self._headers[block_number])
+
     def _get_log_entries(self, block: BlockAPI) -> list[LogEntry]:
         receipts = block.get_receipts(self.chain.chaindb)
         entries = []
@@ -233,20 +877,22 @@ class PyEVMBackend:
         return entries
 
     def get_log_entries_by_block_hash(self, block_hash: BlockHash) -> list[LogEntry]:
-        return self._get_log_entries(self._get_block_by_hash(block_hash))
+        return self._get_log_entries(self._get_block_by_hash(block_hash, self._pending_header))
 
     def get_log_entries_by_block_number(self, block: Block) -> list[LogEntry]:
-        return self._get_log_entries(self._get_block_by_number(block))
+        return self._get_log_entries(self._get_block_by_number(block, self._pending_header))
 
     def get_latest_block_hash(self) -> BlockHash:
-        return BlockHash(self._get_block_by_number(BlockLabel.LATEST).hash)
+        return BlockHash(self._headers[self.get_latest_block_number()].hash)
 
     def get_latest_block_number(self) -> int:
-        return self._get_block_by_number(BlockLabel.LATEST).number
+        # Not `self._headers.latest`, which may be already ahead of the published pending header
+        return self._pending_header.block_number - 1
 
     def get_block_by_number(self, block: Block, *, with_transactions: bool) -> BlockInfo:
-        block_api = self._get_block_by_number(block)
-        is_pending = block_api.number == self.chain.get_block().number
+        pending_header = self._pending_header
+        block_api = self._get_block_by_number(block, pending_header)
+        is_pending = block_api.number == pending_header.block_number
         return make_block_info(
             self.chain_id,
             block_api,
@@ -255,23 +901,57 @@ class PyEVMBackend:
             is_pending=is_pending,
         )
 
-    def _get_block_by_hash(self, block_hash: BlockHash) -> BlockAPI:
+    def get_block_range(
+        self, from_block: Block, to_block: Block, *, with_transactions: bool
+    ) -> list[BlockInfo]:
+        pending_header = self._pending_header
+        first_number = self._resolve_block_number(from_block, pending_header)
+        last_number = self._resolve_block_number(to_block, pending_header)
+        if first_number > last_number:
+            raise ValidationError(
+                f"The first block of the range ({first_number}) "
+                f"is after the last one ({last_number})"
+            )
+
+        # The blocks are read directly by their headers from the index,
+        # instead of resolving each block number separately.
+        blocks = []
+        for block_number in range(first_number, last_number + 1):
+            is_pending = block_number == pending_header.block_number
+            block = (
+                self._get_pending_block(pending_header)
+                if is_pending
+                else self.chain.get_block_by_header(self._headers[block_number])
+            )
+            blocks.append(
+                make_block_info(
+                    self.chain_id,
+                    block,
+                    total_difficulty=self._total_difficulty,
+                    with_transactions=with_transactions,
+                    is_pending=is_pending,
+                )
+            )
+        return blocks
+
+    def _get_block_by_hash(self, block_hash: BlockHash, pending_header: BlockHeaderAPI) -> BlockAPI:
         try:
             block = self.chain.get_block_by_hash(EthHash32(bytes(block_hash)))
         except HeaderNotFound as exc:
             raise BlockNotFound(f"No block found for block hash: {block_hash.hex()}") from exc
 
-        if block.number >= self.chain.get_block().number:
+        if block.number >= pending_header.block_number or block.number < self._oldest_block:
             raise BlockNotFound(f"No block found for block hash: {block_hash.hex()}")
 
         return block
 
     def get_block_number_by_hash(self, block_hash: BlockHash) -> int:
-        return self._get_block_by_hash(block_hash).number
+        return self._get_block_by_hash(block_hash, self._pending_header).number
 
     def get_block_by_hash(self, block_hash: BlockHash, *, with_transactions: bool) -> BlockInfo:
-        block = self._get_block_by_hash(block_hash)
-        is_pending = block.number == self.chain.get_block().number
+        pending_header = self._pending_header
+        block = self._get_block_by_hash(block_hash, pending_header)
+        is_pending = block.number == pending_header.block_number
         return make_block_info(
             self.chain_id,
             block,
@@ -281,42 +961,68 @@ class PyEVMBackend:
         )
 
     def _get_transaction_by_hash(
-        self, transaction_hash: TxHash
+        self, transaction_hash: TxHash, pending_header: BlockHeaderAPI
     ) -> tuple[BlockAPI, SignedTransactionAPI, int]:
-        head_block = self.chain.get_block()
+        location = self._transaction_locations.get(bytes(transaction_hash))
+        if location is not None:
+            block_number, index = unpack_tx_location(location)
+            # The block may be already out of the history, but not pruned yet.
+            if block_number < self._oldest_block:
+                raise TransactionNotFound(
+                    f"No transaction found for transaction hash: {transaction_hash.hex()}"
+                )
+            # The location is recorded before the new pending header is published,
+            # so for this query the block may still be the pending one.
+            if block_number < pending_header.block_number:
+                block = self._get_block_by_number(block_number, pending_header)
+                return block, block.transactions[index], index
+
+        head_block = self._get_pending_block(pending_header)
         for index, transaction in enumerate(head_block.transactions):
             if TxHash(transaction.hash) == transaction_hash:
                 return head_block, transaction, index
-        # Since there is no method in PyEvm to get a transaction by hash directly,
-        # we have to go through all the blocks, starting from the most recent ones.
-        for block_number in range(head_block.number - 1, -1, -1):
-            block = self._get_block_by_number(block_number)
-            for index, transaction in enumerate(block.transactions):
-                if TxHash(transaction.hash) == transaction_hash:
-                    return block, transaction, index
 
         raise TransactionNotFound(
             f"No transaction found for transaction hash: {transaction_hash.hex()}"
         )
 
     def get_transaction_by_hash(self, transaction_hash: TxHash) -> TxInfo:
+        pending_header = self._pending_header
+        if self._mempool is not None:
+            pooled_transaction = self._mempool.get_by_hash(bytes(transaction_hash))
+            if pooled_transaction is not None:
+                pending_block = self._get_pending_block(pending_header)
+                return make_transaction_info(
+                    self.chain_id, pending_block, pooled_transaction, 0, is_pending=True
+                )
+
         block, transaction, transaction_index = self._get_transaction_by_hash(
-            transaction_hash,
+            transaction_hash, pending_header
         )
-        is_pending = block.number == self.chain.get_block().number
+        is_pending = block.number == pending_header.block_number
         return make_transaction_info(
             self.chain_id, block, transaction, transaction_index, is_pending=is_pending
         )
 
+    def _get_header_with_state(self, block: Block) -> BlockHeaderAPI:
+        header = self._get_header_by_number(block, self._pending_header)
+        self._check_state_is_retained(header.block_number)
+        return header
+
     def _get_vm_for_block_number(self, block: Block) -> VirtualMachineAPI:
-        block_api = self._get_block_by_number(block)
-        return self.chain.get_vm(at_header=block_api.header)
+        return self.chain.get_vm(at_header=self._get_header_with_state(block))
 
     def get_transaction_receipt(self, transaction_hash: TxHash) -> TxReceipt:
+        if self._mempool is not None and bytes(transaction_hash) in self._mempool:
+            raise TransactionNotFound(
+                f"Transaction {transaction_hash.hex()} is not yet included in a block"
+            )
+
+        pending_header = self._pending_header
         block, transaction, transaction_index = self._get_transaction_by_hash(
-            transaction_hash,
+            transaction_hash, pending_header
         )
-        is_pending = block.number == self.chain.get_block().number
+        is_pending = block.number == pending_header.block_number
         if is_pending:
             raise TransactionNotFound(
                 f"Transaction {transaction_hash.hex()} is not yet included in a block"
@@ -331,21 +1037,144 @@ class PyEVMBackend:
             transaction_index,
         )
 
+    def get_block_receipts(self, block: Block) -> list[TxReceipt]:
+        pending_header = self._pending_header
+        block_api = self._get_block_by_number(block, pending_header)
+        if block_api.number == pending_header.block_number:
+            raise BlockNotFound("The pending block does not have receipts yet")
+
+        # The receipts are decoded once for the whole block
+        block_receipts = block_api.get_receipts(self.chain.chaindb)
+        return [
+            make_transaction_receipt(block_api, transaction, block_receipts, transaction_index)
+            for transaction_index, transaction in enumerate(block_api.transactions)
+        ]
+
+    def _get_snapshot_account(self, address: Address, block: Block) -> None | Account:
+        # Returns `None` if the state is too old (or pending with uncommitted changes),
+        # in which case it has to be read from the tries through the VM.
+        header = self._get_header_with_state(block)
+        return self._snapshot.get_account(self.chain.chaindb.db, header.state_root, bytes(address))
+
     def get_transaction_count(self, address: Address, block: Block) -> int:
+        account = self._get_snapshot_account(address, block)
+        if account is not None:
+            return account.nonce
         vm = self._get_vm_for_block_number(block)
         return vm.state.get_nonce(EthAddress(bytes(address)))
 
     def get_balance(self, address: Address, block: Block) -> int:
+        account = self._get_snapshot_account(address, block)
+        if account is not None:
+            return account.balance
         vm = self._get_vm_for_block_number(block)
         return vm.state.get_balance(EthAddress(bytes(address)))
 
     def get_code(self, address: Address, block: Block) -> bytes:
+        account = self._get_snapshot_account(address, block)
+        if account is not None:
+            if account.code_hash == EMPTY_SHA3:
+                return b""
+            return self.chain.chaindb.db[account.code_hash]
         vm = self._get_vm_for_block_number(block)
         return vm.state.get_code(EthAddress(bytes(address)))
 
     def get_storage(self, address: Address, slot: int, block: Block) -> bytes:
-        vm = self._get_vm_for_block_number(block)
-        return vm.state.get_storage(EthAddress(bytes(address)), slot).to_bytes(32, byteorder="big")
+        header = self._get_header_with_state(block)
+        value = self._snapshot.get_storage(
+            self.chain.chaindb.db, header.state_root, bytes(address), slot
+        )
+        if value is None:
+            vm = self.chain.get_vm(at_header=header)
+            value = vm.state.get_storage(EthAddress(bytes(address)), slot)
+        return value.to_bytes(32, byteorder="big")
+
+    def get_storage_range(
+        self, address: Address, block: Block, start_key: bytes, max_results: int
+    ) -> StorageRange:
+        if len(start_key) != _HASH_LENGTH:
+            raise ValidationError(f"The start key must be {_HASH_LENGTH} bytes long")
+        if max_results < 1:
+            raise ValidationError("The maximum number of results must be positive")
+
+        header = self._get_header_with_state(block)
+        db = self.chain.chaindb.db
+        encoded_account = get_trie_value(db, header.state_root, keccak(bytes(address)))
+        storage_root = (
+            rlp.decode(encoded_account, sedes=Account).storage_root
+            if encoded_account is not None
+            else BLANK_ROOT_HASH
+        )
+
+        # The trie is walked lazily, and only up to the first entry of the next range.
+        entries: list[StorageEntry] = []
+        for key, encoded_value in iterate_trie(db, storage_root, start_key):
+            if len(entries) == max_results:
+                return StorageRange(entries=tuple(entries), next_key=key)
+            preimage = self._preimages.get(key)
+            entries.append(
+                StorageEntry(
+                    key=key,
+                    slot=int.from_bytes(preimage, byteorder="big") if preimage else None,
+                    value=_decode_storage_value(encoded_value),
+                )
+            )
+        return StorageRange(entries=tuple(entries), next_key=None)
+
+    def get_state_diff(self, block: Block) -> StateDiff:
+        block_number = self._resolve_block_number(block, self._pending_header)
+        if block_number == self._pending_header.block_number:
+            raise BlockNotFound("The pending block does not have a state diff yet")
+        if block_number == 0:
+            raise BlockNotFound("The genesis block does not have a state diff")
+
+        # Even if the changes are known, the code of the old accounts may have been pruned
+        self._check_state_is_retained(block_number - 1)
+
+        state_root = self._headers[block_number].state_root
+        parent_state_root = self._headers[block_number - 1].state_root
+        # The recent changes are already known; otherwise they are found from the tries.
+        changes = self._snapshot.get_changes(parent_state_root, state_root)
+        if changes is None:
+            changes = StateChanges.between(self.chain.chaindb.db, parent_state_root, state_root)
+
+        storage: dict[bytes, tuple[dict[int, int], dict[int, int]]] = {}
+        for key, (old_value, new_value) in changes.storage.items():
+            account_key, hashed_slot = key[:_HASH_LENGTH], key[_HASH_LENGTH:]
+            slot = self._preimages.get(hashed_slot)
+            if slot is None:
+                # Can only happen for the storage loaded from a state file
+                continue
+            old_storage, new_storage = storage.setdefault(account_key, ({}, {}))
+            old_storage[int.from_bytes(slot, byteorder="big")] = _decode_storage_value(old_value)
+            new_storage[int.from_bytes(slot, byteorder="big")] = _decode_storage_value(new_value)
+
+        accounts = {}
+        for account_key, (old_account, new_account) in changes.accounts.items():
+            # All the modified accounts go through the VM, which records their addresses
+            address = Address(self._preimages[account_key])
+            old_storage, new_storage = storage.get(account_key, ({}, {}))
+            accounts[address] = AccountDiff(
+                old=self._decode_account_state(old_account, old_storage),
+                new=self._decode_account_state(new_account, new_storage),
+            )
+
+        return StateDiff(block_number=block_number, accounts=accounts)
+
+    def _decode_account_state(
+        self, encoded_account: None | bytes, storage: Mapping[int, int]
+    ) -> None | AccountState:
+        if encoded_account is None:
+            return None
+        account = rlp.decode(encoded_account, sedes=Account)
+        return AccountState(
+            balance=account.balance,
+            nonce=account.nonce,
+            code=self.chain.chaindb.db[account.code_hash]
+            if account.code_hash != EMPTY_SHA3
+            else b"",
+            storage=storage,
+        )
 
     def get_base_fee(self, block: Block) -> int:
         vm = self._get_vm_for_block_number(block)
@@ -359,15 +1188,113 @@ class PyEVMBackend:
             raise ValidationError(f"Could not decode transaction: {exc}") from exc
 
     def send_decoded_transaction(self, evm_transaction: SignedTransactionAPI) -> bytes:
+        if self._mempool is not None:
+            self._add_to_mempool(self._mempool, evm_transaction)
+            return evm_transaction.hash
+
+        # If this is the first transaction in the pending block,
+        # the block will be mined with the current time.
+        self._update_pending_timestamp()
         try:
             self.chain.apply_transaction(evm_transaction)
         except EthValidationError as exc:
             raise ValidationError(f"Invalid transaction: {exc}") from exc
         return evm_transaction.hash
 
+    def _add_to_mempool(self, mempool: Mempool, evm_transaction: SignedTransactionAPI) -> None:
+        # Only check what does not depend on the other pooled transactions;
+        # the rest is checked when the transaction is included in a block.
+        try:
+            evm_transaction.validate()
+            sender = evm_transaction.sender
+        except EthValidationError as exc:
+            raise ValidationError(f"Invalid transaction: {exc}") from exc
+
+        chain_id = getattr(evm_transaction, "chain_id", None)
+        if chain_id is not None and chain_id != self.chain_id:
+            raise ValidationError(
+                f"Invalid transaction: chain ID {chain_id} does not match {self.chain_id}"
+            )
+
+        gas_limit = self.chain.header.gas_limit
+        if evm_transaction.gas > gas_limit:
+            raise ValidationError(
+                f"Invalid transaction: gas {evm_transaction.gas} exceeds "
+                f"the block gas limit {gas_limit}"
+            )
+
+        state = self.chain.get_vm().state
+        nonce = state.get_nonce(sender)
+        if evm_transaction.nonce < nonce:
+            raise ValidationError(
+                f"Invalid transaction: nonce {evm_transaction.nonce} is too low "
+                f"(the account nonce is {nonce})"
+            )
+
+        max_cost = evm_transaction.gas * evm_transaction.max_fee_per_gas + evm_transaction.value
+        if state.get_balance(sender) < max_cost:
+            raise ValidationError("Invalid transaction: insufficient funds for gas * price + value")
+
+        mempool.add(evm_transaction)
+
+    def txpool_content(self) -> TxPoolContent:
+        pending_header = self._pending_header
+        pending_block = self._get_pending_block(pending_header)
+
+        if self._mempool is None:
+            # Without the mempool, the transactions waiting to be mined are in the pending block.
+            pending: dict[Address, dict[int, TxInfo]] = {}
+            for transaction in pending_block.transactions:
+                pending.setdefault(Address(transaction.sender), {})[transaction.nonce] = (
+                    make_transaction_info(
+                        self.chain_id, pending_block, transaction, 0, is_pending=True
+                    )
+                )
+            return TxPoolContent(pending=pending, queued={})
+
+        state = self.chain.get_vm(pending_header).state
+        pending = {}
+        queued: dict[Address, dict[int, TxInfo]] = {}
+        for sender, transactions in self._mempool.by_sender().items():
+            next_nonce = state.get_nonce(sender)
+            for nonce in sorted(transactions):
+                info = make_transaction_info(
+                    self.chain_id, pending_block, transactions[nonce], 0, is_pending=True
+                )
+                if nonce == next_nonce:
+                    pending.setdefault(Address(sender), {})[nonce] = info
+                    next_nonce += 1
+                elif nonce > next_nonce:
+                    queued.setdefault(Address(sender), {})[nonce] = info
+        return TxPoolContent(pending=pending, queued=queued)
+
+    def get_pending_load(self) -> tuple[int, int]:
+        """
+        Returns the number of transactions waiting to be mined, and the gas they use
+        (with the mempool, the gas limits of the pooled transactions that can be included
+        in the next block, since they are not executed yet;
+        the ones waiting for a nonce gap to be filled are not counted).
+        """
+        if self._mempool is not None:
+            state = self.chain.get_vm().state
+            transactions = [
+                transaction
+                for sender in self._mempool.senders()
+                for transaction in self._mempool.executable(sender, state.get_nonce(sender))
+            ]
+            return len(transactions), sum(transaction.gas for transaction in transactions)
+        return len(self.chain.get_block().transactions), self.chain.header.gas_used
+
+    def txpool_status(self) -> TxPoolStatus:
+        content = self.txpool_content()
+        return TxPoolStatus(
+            pending=sum(len(transactions) for transactions in content.pending.values()),
+            queued=sum(len(transactions) for transactions in content.queued.values()),
+        )
+
     def estimate_gas(self, params: EstimateGasParams, block: Block) -> int:
         from_ = params.from_
-        header = self._get_block_by_number(block).header
+        header = self._get_header_with_state(block)
         nonce = self.get_transaction_count(from_, block) if params.nonce is None else params.nonce
         to = EthAddress(b"" if params.to is None else bytes(params.to))
 
@@ -398,10 +1325,12 @@ class PyEVMBackend:
         except VMError as exc:
             raise TransactionFailed(exc.args[0]) from exc
 
-    def call(self, params: EthCallParams, block: Block) -> bytes:
+    def _make_call_transaction(
+        self, params: EthCallParams, block: Block
+    ) -> tuple[SignedTransactionAPI, BlockHeaderAPI]:
         nonce = self.get_transaction_count(params.from_, block) if params.from_ else 0
         from_ = EthAddress(bytes(params.from_)) if params.from_ is not None else ZERO_ADDRESS
-        header = self._get_block_by_number(block).header
+        header = self._get_header_with_state(block)
         evm_transaction = self.chain.create_unsigned_transaction(
             gas_price=params.gas_price.as_wei() if params.gas_price else 0,
             gas=params.gas if params.gas is not None else header.gas_limit,
@@ -411,13 +1340,14 @@ class PyEVMBackend:
             to=EthAddress(bytes(params.to)),
         )
         spoofed_transaction = SpoofTransaction(evm_transaction, from_=from_)
+        # For whatever reason `SpoofTransaction` does not implement `SignedTransactionAPI`,
+        # but has the same duck type.
+        return cast("SignedTransactionAPI", spoofed_transaction), header
 
+    def call(self, params: EthCallParams, block: Block) -> bytes:
+        transaction, header = self._make_call_transaction(params, block)
         try:
-            # For whatever reason `SpoofTransaction` does not implement `SignedTransactionAPI`,
-            # but has the same duck type.
-            return self.chain.get_transaction_result(
-                cast("SignedTransactionAPI", spoofed_transaction), header
-            )
+            return self.chain.get_transaction_result(transaction, header)
 
         except EthValidationError as exc:
             raise ValidationError(f"Invalid transaction: {exc}") from exc
@@ -428,6 +1358,52 @@ class PyEVMBackend:
         except VMError as exc:
             raise TransactionFailed(exc.args[0]) from exc
 
+    def profile_call(self, params: EthCallParams, block: Block) -> ExecutionProfile:
+        transaction, header = self._make_call_transaction(params, block)
+        collector = ProfileCollector()
+        vm = self.chain.get_vm(header)
+        with vm.in_costless_state() as state:
+            # Only this state object is affected; the VM class is left untouched
+            state.computation_class = collector.make_computation_class(state.computation_class)
+            try:
+                state.costless_execute_transaction(transaction)
+            except EthValidationError as exc:
+                raise ValidationError(f"Invalid transaction: {exc}") from exc
+        return collector.profile()
+
+    def profile_transaction(self, transaction_hash: TxHash) -> ExecutionProfile:
+        block, transaction, transaction_index = self._get_transaction_by_hash(
+            transaction_hash, self._pending_header
+        )
+        self._check_state_is_retained(block.number - 1)
+        if transaction_index >= self._patched_blocks.get(block.number, len(block.transactions)):
+            raise ValidationError(
+                f"Transaction {transaction_hash.hex()} cannot be replayed, since the state "
+                f"of its block ({block.number}) was patched before it was executed"
+            )
+        parent_header = self.chain.get_block_header_by_hash(block.header.parent_hash)
+
+        # Replay the block up to the requested transaction on top of the parent state.
+        vm = self.chain.get_vm(block.header.copy(state_root=parent_header.state_root))
+        # Not a part of `VirtualMachineAPI`, but defined in the base VM class
+        vm.block_preprocessing(block)  # type: ignore[attr-defined]
+        state = vm.state
+        for preceding_transaction in block.transactions[:transaction_index]:
+            state.lock_changes()
+            state.apply_transaction(preceding_transaction)
+
+        collector = ProfileCollector()
+        state.computation_class = collector.make_computation_class(state.computation_class)
+        state.lock_changes()
+        state.apply_transaction(transaction)
+        return collector.profile()
+
+
+def _decode_storage_value(encoded_value: None | bytes) -> int:
+    if encoded_value is None:
+        return 0
+    return cast("int", rlp.decode(encoded_value, sedes=rlp.sedes.big_endian_int))
+
 
 def make_block_info(
     chain_id: int,
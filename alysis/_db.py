@@ -0,0 +1,137 @@
+"""PyEVM database backends."""
+
+from collections.abc import Mapping
+from typing import cast
+
+from eth.chains.base import MiningChain
+from eth.db.atomic import AtomicDB
+from eth.db.backends.memory import MemoryDB
+from eth.tools.builder.chain import copy as eth_copy_chain
+
+# The number of frozen overlays after which they are merged into one when copying,
+# so that looking up the entries written long ago does not slow down indefinitely.
+MAX_FROZEN_LAYERS = 8
+
+# The entries written into an overlay, and the keys deleted from the layers below it.
+_Layer = tuple[dict[bytes, bytes], frozenset[bytes]]
+
+
+class OverlayDB(MemoryDB):
+    """
+    An in-memory database on top of a read-only ``base`` mapping.
+    The writes and deletions are kept in memory, and the base is only read from.
+
+    Copying freezes the current overlay, sharing it between the original and the copy,
+    and both continue writing into new empty overlays on top of the frozen ones
+    (see :py:meth:`copy`).
+
+    Since it is a ``MemoryDB``, ``kv_store`` contains the entries written into
+    the current overlay (but not the ones in the frozen overlays or the base).
+    """
+
+    def __init__(
+        self,
+        base: Mapping[bytes, bytes],
+        kv_store: None | dict[bytes, bytes] = None,
+        deleted: None | set[bytes] = None,
+        layers: tuple[_Layer, ...] = (),
+    ):
+        super().__init__(kv_store if kv_store is not None else {})
+        self.base = base
+        # The keys of the entries below the current overlay that were deleted from this database
+        self._deleted = deleted if deleted is not None else set()
+        # The frozen overlays, starting from the newest one. They are never modified,
+        # since they may be shared with other databases.
+        self._layers = layers
+
+    def copy(self) -> "OverlayDB":
+        """
+        Returns a copy with the same contents that can be modified independently.
+
+        Takes constant time and memory: the entries are not copied,
+        but the current overlay is frozen and shared with the copy.
+        Must not be called concurrently with any other access to this database.
+        """
+        if self.kv_store or self._deleted:
+            layers = ((self.kv_store, frozenset(self._deleted)), *self._layers)
+            if len(layers) > MAX_FROZEN_LAYERS:
+                layers = (_merge_layers(layers),)
+            self._layers = layers
+            self.kv_store = {}
+            self._deleted = set()
+        return OverlayDB(self.base, layers=self._layers)
+
+    def overlay_keys(self) -> list[bytes]:
+        """Returns the keys of the entries in this database that are not in the base."""
+        keys = set(self.kv_store)
+        deleted = set(self._deleted)
+        for entries, layer_deleted in self._layers:
+            keys.update(key for key in entries if key not in deleted)
+            deleted.update(layer_deleted)
+        return list(keys)
+
+    def _get_below(self, key: bytes) -> None | bytes:
+        # Returns the value in the frozen overlays or the base, or `None` if there is none.
+        for entries, deleted in self._layers:
+            if key in entries:
+                return entries[key]
+            if key in deleted:
+                return None
+        return self.base.get(key)
+
+    def __getitem__(self, key: bytes) -> bytes:
+        if key in self.kv_store:
+            return self.kv_store[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        value = self._get_below(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: bytes, value: bytes) -> None:
+        self.kv_store[key] = value
+        self._deleted.discard(key)
+
+    def _exists(self, key: bytes) -> bool:
+        return key in self.kv_store or (
+            key not in self._deleted and self._get_below(key) is not None
+        )
+
+    def __delitem__(self, key: bytes) -> None:
+        if key in self.kv_store:
+            del self.kv_store[key]
+            if self._get_below(key) is not None:
+                self._deleted.add(key)
+        elif key not in self._deleted and self._get_below(key) is not None:
+            self._deleted.add(key)
+        else:
+            raise KeyError(key)
+
+    def __repr__(self) -> str:
+        return f"OverlayDB({self.base!r}, {self.kv_store!r})"
+
+
+def _merge_layers(layers: tuple[_Layer, ...]) -> _Layer:
+    # Merges the frozen overlays (starting from the newest one) into a single one.
+    merged_entries: dict[bytes, bytes] = {}
+    merged_deleted: set[bytes] = set()
+    for entries, deleted in reversed(layers):
+        for key in deleted:
+            merged_entries.pop(key, None)
+        merged_deleted.update(deleted)
+        merged_deleted.difference_update(entries)
+        merged_entries.update(entries)
+    return merged_entries, frozenset(merged_deleted)
+
+
+def copy_chain(chain: MiningChain) -> MiningChain:
+    """
+    Makes a copy of the chain whose database can be modified independently.
+    Unlike ``eth.tools.builder.chain.copy``, supports :py:class:`OverlayDB`
+    (in which case the copying takes constant time, see :py:meth:`OverlayDB.copy`).
+    """
+    db = chain.chaindb.db
+    if isinstance(db, AtomicDB) and isinstance(db.wrapped_db, OverlayDB):
+        return type(chain)(AtomicDB(db.wrapped_db.copy()), chain.header)
+    return cast("MiningChain", eth_copy_chain(chain))
@@ -0,0 +1,159 @@
+from array import array
+from collections.abc import Sequence
+from dataclasses import dataclass
+from itertools import accumulate
+
+from ethereum_rpc import Amount
+
+from ._exceptions import ValidationError
+
+# Same as in Geth
+MAX_FEE_HISTORY_BLOCKS = 1024
+
+
+@dataclass(frozen=True)
+class FeeHistory:
+    """Fee statistics for a range of blocks."""
+
+    oldest_block: int
+    """The number of the first block in the range."""
+
+    base_fee_per_gas: tuple[Amount, ...]
+    """
+    The base fees per gas of the blocks in the range,
+    followed by the base fee of the block after the last one.
+    """
+
+    gas_used_ratio: tuple[float, ...]
+    """The ratios of the gas used to the gas limit for the blocks in the range."""
+
+    reward: None | tuple[tuple[Amount, ...], ...]
+    """
+    For each block in the range, the effective priority fees per gas at the requested
+    percentiles of the gas used in the block. ``None`` if no percentiles were requested.
+    """
+
+
+class BlockFeeStats:
+    """
+    Fee statistics of a contiguous range of blocks, recorded when the blocks are mined,
+    so that fee-related queries do not need to load the blocks.
+    """
+
+    def __init__(self, first_block: int):
+        self._first_block = first_block
+        # Base fees can overflow 64 bits if the blocks are full for long enough,
+        # so they are kept as Python integers.
+        self._base_fees: list[int] = []
+        self._gas_used_ratios = array("d")
+        # For each block, the sorted effective tips of its transactions,
+        # and the cumulative gas used by the transactions in that order.
+        self._tips: list[tuple[tuple[int, ...], tuple[int, ...]]] = []
+
+    def __copy__(self) -> "BlockFeeStats":
+        obj = BlockFeeStats(self._first_block)
+        obj._base_fees = list(self._base_fees)
+        obj._gas_used_ratios = array("d", self._gas_used_ratios)
+        obj._tips = list(self._tips)
+        return obj
+
+    @property
+    def last_block(self) -> int:
+        return self._first_block + len(self._base_fees) - 1
+
+    def base_fee(self, block_number: int) -> int:
+        return self._base_fees[block_number - self._first_block]
+
+    def append(
+        self, base_fee: int, gas_used: int, gas_limit: int, tips_and_gas: Sequence[tuple[int, int]]
+    ) -> None:
+        """
+        Records the statistics for the next block, given the effective tips
+        and the gas used by each of its transactions.
+        """
+        self._base_fees.append(base_fee)
+        self._gas_used_ratios.append(gas_used / gas_limit)
+        ordered = sorted(tips_and_gas)
+        self._tips.append(
+            (
+                tuple(tip for tip, _gas in ordered),
+                tuple(accumulate(gas for _tip, gas in ordered)),
+            )
+        )
+
+    def prune(self, oldest_block: int) -> None:
+        """Removes the statistics for the blocks before ``oldest_block``."""
+        removed = oldest_block - self._first_block
+        if removed <= 0:
+            return
+        del self._base_fees[:removed]
+        del self._gas_used_ratios[:removed]
+        del self._tips[:removed]
+        self._first_block = oldest_block
+
+    def fee_history(
+        self,
+        block_count: int,
+        newest_block: int,
+        next_base_fee: int,
+        reward_percentiles: None | Sequence[float],
+        *,
+        oldest_retained_block: int = 0,
+    ) -> FeeHistory:
+        """
+        Returns the fee history for up to ``block_count`` blocks ending with ``newest_block``
+        (fewer if the older blocks are not available, or are before ``oldest_retained_block``,
+        since the statistics are only pruned along with the database).
+        ``next_base_fee`` is the base fee of the block following ``newest_block``.
+        """
+        if not 1 <= block_count <= MAX_FEE_HISTORY_BLOCKS:
+            raise ValidationError(
+                f"The block count must be between 1 and {MAX_FEE_HISTORY_BLOCKS}, got {block_count}"
+            )
+        if reward_percentiles is not None:
+            for index, percentile in enumerate(reward_percentiles):
+                if not 0 <= percentile <= 100:
+                    raise ValidationError(f"Invalid reward percentile: {percentile}")
+                if index > 0 and percentile < reward_percentiles[index - 1]:
+                    raise ValidationError("The reward percentiles must be monotonically increasing")
+
+        oldest_block = max(self._first_block, oldest_retained_block, newest_block - block_count + 1)
+        start = oldest_block - self._first_block
+        end = newest_block - self._first_block + 1
+
+        base_fees = self._base_fees[start:end]
+        if newest_block < self.last_block:
+            next_base_fee = self._base_fees[end]
+
+        reward = None
+        if reward_percentiles is not None:
+            reward = tuple(
+                tuple(Amount(tip) for tip in _rewards(tips, gas, reward_percentiles))
+                for tips, gas in self._tips[start:end]
+            )
+
+        return FeeHistory(
+            oldest_block=oldest_block,
+            base_fee_per_gas=tuple(Amount(fee) for fee in [*base_fees, next_base_fee]),
+            gas_used_ratio=tuple(self._gas_used_ratios[start:end]),
+            reward=reward,
+        )
+
+
+def _rewards(
+    tips: Sequence[int], cumulative_gas: Sequence[int], percentiles: Sequence[float]
+) -> list[int]:
+    # Same as in Geth: the reward for a percentile is the tip of the transaction
+    # at which the cumulative gas used (ordered by tip) reaches that percentile of the total.
+    if not tips:
+        return [0] * len(percentiles)
+
+    rewards = []
+    index = 0
+    total_gas = cumulative_gas[-1]
+    for percentile in percentiles:
+        threshold = total_gas * percentile / 100
+        while index < len(tips) - 1 and cumulative_gas[index] < threshold:
+            index += 1
+        rewards.append(tips[index])
+    return rewards
@@ -0,0 +1,300 @@
+import sys
+from collections import deque
+from collections.abc import Iterator
+from dataclasses import dataclass
+from enum import Enum
+from itertools import islice
+from typing import Any, Generic, TypeVar
+
+from ethereum_rpc import BlockLabel, FilterParams, LogEntry
+
+from ._exceptions import ValidationError
+
+
+class LogFilter:
+    def __init__(self, params: FilterParams, current_block_number: int):
+        if isinstance(params.from_block, int):
+            from_block = params.from_block
+        elif params.from_block in (BlockLabel.LATEST, BlockLabel.SAFE, BlockLabel.FINALIZED):
+            from_block = current_block_number
+        elif params.from_block == BlockLabel.EARLIEST:
+            from_block = 0
+        else:
+            raise ValidationError(f"`from_block` value of {params.from_block} is not supported")
+
+        if isinstance(params.to_block, int):
+            to_block = params.to_block
+        elif params.to_block in (BlockLabel.LATEST, BlockLabel.SAFE, BlockLabel.FINALIZED):
+            to_block = None  # indicates an open-ended filter
+        elif params.from_block == BlockLabel.EARLIEST:
+            to_block = 0
+        else:
+            raise ValidationError(f"`to_block` value of {params.to_block} is not supported")
+
+        if isinstance(params.address, tuple):
+            addresses = params.address
+        elif params.address is None:
+            addresses = None
+        else:
+            addresses = (params.address,)
+
+        self._from_block = from_block
+        self._to_block = to_block
+        self._addresses = addresses
+        self._topics = params.topics
+
+    def block_number_range(self, current_block_number: int) -> range:
+        to_block = self._to_block if self._to_block is not None else current_block_number
+        return range(self._from_block, to_block + 1)
+
+    def matches(self, entry: LogEntry) -> bool:  # noqa: PLR0911
+        if entry.block_number < self._from_block:
+            return False
+
+        if self._to_block is not None and entry.block_number > self._to_block:
+            return False
+
+        if self._addresses is not None and entry.address not in self._addresses:
+            return False
+
+        if self._topics is None:
+            return True
+
+        # If we filter by more topics than there is in the entry,
+        # it's an automatic mismatch.
+        if len(self._topics) > len(entry.topics):
+            return False
+
+        # But note that if `self._topics` is shorter than `entry.topics`
+        # it is equivalent to the missing values being `None`,
+        # that is, matching anything.
+        for topics, logged_topic in zip(self._topics, entry.topics, strict=False):
+            if topics is None:
+                continue
+
+            filter_topics = topics if isinstance(topics, tuple) else (topics,)
+
+            for filter_topic in filter_topics:
+                if filter_topic == logged_topic:
+                    break
+            else:
+                return False
+
+        return True
+
+
+class FilterKind(Enum):
+    """The type of events a filter collects."""
+
+    BLOCKS = "blocks"
+    """New block hashes (created by :py:meth:`Node.eth_new_block_filter`)."""
+
+    PENDING_TRANSACTIONS = "pending_transactions"
+    """
+    New pending transaction hashes
+    (created by :py:meth:`Node.eth_new_pending_transaction_filter`).
+    """
+
+    LOGS = "logs"
+    """Log entries (created by :py:meth:`Node.eth_new_filter`)."""
+
+
+@dataclass(frozen=True)
+class FilterStats:
+    """The current state of an installed filter."""
+
+    kind: FilterKind
+    """The type of the filter."""
+
+    entries: int
+    """The number of entries waiting to be returned by the next poll."""
+
+    dropped_entries: int
+    """
+    The number of entries discarded since the last poll
+    because the buffer size limit was reached.
+    """
+
+    idle_seconds: float
+    """Time since the filter was created or last polled."""
+
+    memory_bytes: int
+    """
+    An estimate of the memory held by the buffered entries.
+    Entries shared between several filters are counted for each of them.
+    """
+
+
+_Entry = TypeVar("_Entry")
+
+
+class FilterBuffer(Generic[_Entry]):
+    """
+    A buffer of filter entries accumulated between polls.
+
+    If ``max_entries`` is not ``None``, the oldest entries are discarded
+    when the buffer is full.
+    """
+
+    def __init__(self, max_entries: None | int, timestamp: float):
+        self._entries: deque[_Entry] = deque(maxlen=max_entries)
+        self._dropped = 0
+        self.last_polled = timestamp
+
+    def __copy__(self) -> "FilterBuffer[_Entry]":
+        obj = object.__new__(self.__class__)
+        obj._entries = self._entries.copy()
+        obj._dropped = self._dropped
+        obj.last_polled = self.last_polled
+        return obj
+
+    def append(self, entry: _Entry) -> None:
+        if len(self._entries) == self._entries.maxlen:
+            self._dropped += 1
+        self._entries.append(entry)
+
+    def poll(self, timestamp: float) -> list[_Entry]:
+        """Returns the accumulated entries and clears the buffer."""
+        entries = list(self._entries)
+        self._entries.clear()
+        self._dropped = 0
+        self.last_polled = timestamp
+        return entries
+
+    def touch(self, timestamp: float) -> None:
+        """Marks the filter as used without polling it."""
+        self.last_polled = timestamp
+
+    def stats(self, kind: FilterKind, timestamp: float) -> FilterStats:
+        return FilterStats(
+            kind=kind,
+            entries=len(self._entries),
+            dropped_entries=self._dropped,
+            idle_seconds=timestamp - self.last_polled,
+            memory_bytes=sys.getsizeof(self._entries)
+            + sum(_estimate_size(entry) for entry in self._entries),
+        )
+
+
+class _Cursor:
+    def __init__(self, position: int, timestamp: float):
+        self.position = position
+        self.last_polled = timestamp
+
+
+class SharedEventLog(Generic[_Entry]):
+    """
+    An append-only log of events shared between several filters.
+    Each filter only holds a position in the log, so appending an event
+    does not depend on the number of filters.
+
+    If ``max_entries`` is not ``None``, the oldest entries are discarded
+    when the log is full, even if some filters have not received them yet.
+    """
+
+    # The minimum number of entries to accumulate before trying to discard
+    # the ones all the filters have already received.
+    _MIN_TRIM_SIZE = 64
+
+    def __init__(self, max_entries: None | int):
+        self._entries: deque[_Entry] = deque(maxlen=max_entries)
+        # The absolute position of `self._entries[0]`
+        self._offset = 0
+        self._cursors: dict[int, _Cursor] = {}
+        self._trim_size = self._MIN_TRIM_SIZE
+
+    def __copy__(self) -> "SharedEventLog[_Entry]":
+        obj = object.__new__(self.__class__)
+        obj._entries = self._entries.copy()
+        obj._offset = self._offset
+        obj._cursors = {
+            filter_id: _Cursor(cursor.position, cursor.last_polled)
+            for filter_id, cursor in self._cursors.items()
+        }
+        obj._trim_size = self._trim_size
+        return obj
+
+    def __contains__(self, filter_id: int) -> bool:
+        return filter_id in self._cursors
+
+    def filter_ids(self) -> list[int]:
+        return list(self._cursors)
+
+    def add_filter(self, filter_id: int, timestamp: float) -> None:
+        self._cursors[filter_id] = _Cursor(self._offset + len(self._entries), timestamp)
+
+    def remove_filter(self, filter_id: int) -> None:
+        del self._cursors[filter_id]
+        if not self._cursors:
+            self._trim()
+
+    def expired_filters(self, expiration_time: float) -> list[int]:
+        return [
+            filter_id
+            for filter_id, cursor in self._cursors.items()
+            if cursor.last_polled < expiration_time
+        ]
+
+    def append(self, entry: _Entry) -> None:
+        # Nobody is going to read this entry
+        if not self._cursors:
+            return
+
+        if len(self._entries) == self._entries.maxlen:
+            self._offset += 1
+        self._entries.append(entry)
+
+        if len(self._entries) >= self._trim_size:
+            self._trim()
+
+    def poll(self, filter_id: int, timestamp: float) -> list[_Entry]:
+        """Returns the entries appended since the last poll of the given filter."""
+        cursor = self._cursors[filter_id]
+        entries = list(self._pending_entries(cursor))
+        cursor.position = self._offset + len(self._entries)
+        cursor.last_polled = timestamp
+        return entries
+
+    def stats(self, filter_id: int, kind: FilterKind, timestamp: float) -> FilterStats:
+        cursor = self._cursors[filter_id]
+        pending_entries = list(self._pending_entries(cursor))
+        return FilterStats(
+            kind=kind,
+            entries=len(pending_entries),
+            dropped_entries=max(self._offset - cursor.position, 0),
+            idle_seconds=timestamp - cursor.last_polled,
+            memory_bytes=sum(_estimate_size(entry) for entry in pending_entries),
+        )
+
+    def _pending_entries(self, cursor: _Cursor) -> Iterator[_Entry]:
+        return islice(self._entries, max(cursor.position - self._offset, 0), None)
+
+    def _trim(self) -> None:
+        # Discard the entries that all the filters have already received.
+        # This is O(filters), so it is only done when the log grows enough
+        # to keep the amortized cost of an append constant.
+        if self._cursors:
+            min_position = min(cursor.position for cursor in self._cursors.values())
+        else:
+            min_position = self._offset + len(self._entries)
+
+        while self._offset < min_position and self._entries:
+            self._entries.popleft()
+            self._offset += 1
+
+        self._trim_size = max(2 * len(self._entries), self._MIN_TRIM_SIZE)
+
+
+def _estimate_size(obj: Any) -> int:
+    # A rough estimate of the memory taken by a filter entry,
+    # following the attributes of the objects and the items of the tuples.
+    # Does not account for objects shared between entries.
+    size = sys.getsizeof(obj)
+    if isinstance(obj, tuple):
+        size += sum(_estimate_size(item) for item in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(_estimate_size(getattr(obj, name)) for name in obj.__slots__)
+    elif hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+        size += sum(_estimate_size(value) for value in obj.__dict__.values())
+    return size
@@ -0,0 +1,114 @@
+"""Pending transactions waiting to be included in a block."""
+
+from collections.abc import Iterator, Mapping
+
+from eth.abc import SignedTransactionAPI
+from eth_typing import Address as EthAddress
+
+from ._exceptions import ValidationError
+
+# The minimum increase (in percent) of the fees for a transaction
+# to replace a pooled one with the same sender and nonce (same as in Geth).
+PRICE_BUMP = 10
+
+
+def effective_tip(transaction: SignedTransactionAPI, base_fee: int) -> int:
+    """
+    Returns the fee per gas the block producer gets from the transaction,
+    or a negative value if the transaction cannot be included at this base fee.
+    """
+    if transaction.max_fee_per_gas < base_fee:
+        return -1
+    return min(transaction.max_priority_fee_per_gas, transaction.max_fee_per_gas - base_fee)
+
+
+class Mempool:
+    """
+    Transactions grouped by sender and ordered by nonce.
+
+    The pool does not know the account nonces; the caller is responsible
+    for adding only the transactions with nonces not below the sender's current one,
+    and for removing the transactions that became stale.
+    """
+
+    def __init__(self) -> None:
+        self._by_sender: dict[EthAddress, dict[int, SignedTransactionAPI]] = {}
+        self._by_hash: dict[bytes, SignedTransactionAPI] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_hash)
+
+    def __contains__(self, transaction_hash: object) -> bool:
+        return transaction_hash in self._by_hash
+
+    def get_by_hash(self, transaction_hash: bytes) -> None | SignedTransactionAPI:
+        return self._by_hash.get(transaction_hash)
+
+    def get(self, sender: EthAddress, nonce: int) -> None | SignedTransactionAPI:
+        return self._by_sender.get(sender, {}).get(nonce)
+
+    def senders(self) -> Iterator[EthAddress]:
+        return iter(list(self._by_sender))
+
+    def by_sender(self) -> Mapping[EthAddress, Mapping[int, SignedTransactionAPI]]:
+        return self._by_sender
+
+    def executable(self, sender: EthAddress, account_nonce: int) -> list[SignedTransactionAPI]:
+        """
+        Returns the transactions of ``sender`` that can be included in the next block,
+        that is those with consecutive nonces starting from ``account_nonce``.
+        """
+        transactions = self._by_sender.get(sender, {})
+        result = []
+        nonce = account_nonce
+        while nonce in transactions:
+            result.append(transactions[nonce])
+            nonce += 1
+        return result
+
+    def add(self, transaction: SignedTransactionAPI) -> None:
+        """
+        Adds a transaction to the pool, replacing the one with the same sender and nonce
+        if the new one pays sufficiently higher fees.
+        """
+        if transaction.hash in self._by_hash:
+            raise ValidationError(f"Transaction {transaction.hash.hex()} is already in the pool")
+
+        transactions = self._by_sender.setdefault(transaction.sender, {})
+        existing = transactions.get(transaction.nonce)
+        if existing is not None:
+            bump = 100 + PRICE_BUMP
+            if (
+                transaction.max_fee_per_gas * 100 < existing.max_fee_per_gas * bump
+                or transaction.max_priority_fee_per_gas * 100
+                < existing.max_priority_fee_per_gas * bump
+            ):
+                raise ValidationError(
+                    "Replacement transaction underpriced: the fees must be increased "
+                    f"by at least {PRICE_BUMP}%"
+                )
+            del self._by_hash[existing.hash]
+
+        transactions[transaction.nonce] = transaction
+        self._by_hash[transaction.hash] = transaction
+
+    def remove(self, transaction: SignedTransactionAPI) -> None:
+        del self._by_hash[transaction.hash]
+        transactions = self._by_sender[transaction.sender]
+        del transactions[transaction.nonce]
+        if not transactions:
+            del self._by_sender[transaction.sender]
+
+    def remove_stale(self, sender: EthAddress, account_nonce: int) -> None:
+        """Removes the transactions of ``sender`` with nonces below ``account_nonce``."""
+        transactions = self._by_sender.get(sender, {})
+        for nonce in [nonce for nonce in transactions if nonce < account_nonce]:
+            self.remove(transactions[nonce])
+
+    def copy(self) -> "Mempool":
+        obj = Mempool()
+        obj._by_sender = {
+            sender: dict(transactions) for sender, transactions in self._by_sender.items()
+        }
+        obj._by_hash = dict(self._by_hash)
+        return obj
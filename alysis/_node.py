@@ -1,5 +1,11 @@
-from copy import deepcopy
-from typing import Any, cast
+import logging
+import threading
+import time
+from collections.abc import Callable, Mapping, Sequence
+from copy import copy, deepcopy
+from functools import wraps
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Concatenate, ParamSpec, TypeVar, cast
 
 from ethereum_rpc import (
     Address,
@@ -7,7 +13,6 @@ from ethereum_rpc import (
     Block,
     BlockHash,
     BlockInfo,
-    BlockLabel,
     EstimateGasParams,
     EthCallParams,
     FilterParams,
@@ -19,81 +24,72 @@ from ethereum_rpc import (
     keccak,
 )
 
-from ._backend import PyEVMBackend
+from ._account import AccountState
 from ._constants import EVMVersion
 from ._exceptions import FilterNotFound, IndexNotFound, ValidationError
-
-
-class LogFilter:
-    def __init__(self, params: FilterParams, current_block_number: int):
-        if isinstance(params.from_block, int):
-            from_block = params.from_block
-        elif params.from_block in (BlockLabel.LATEST, BlockLabel.SAFE, BlockLabel.FINALIZED):
-            from_block = current_block_number
-        elif params.from_block == BlockLabel.EARLIEST:
-            from_block = 0
-        else:
-            raise ValidationError(f"`from_block` value of {params.from_block} is not supported")
-
-        if isinstance(params.to_block, int):
-            to_block = params.to_block
-        elif params.to_block in (BlockLabel.LATEST, BlockLabel.SAFE, BlockLabel.FINALIZED):
-            to_block = None  # indicates an open-ended filter
-        elif params.from_block == BlockLabel.EARLIEST:
-            to_block = 0
-        else:
-            raise ValidationError(f"`to_block` value of {params.to_block} is not supported")
-
-        if isinstance(params.address, tuple):
-            addresses = params.address
-        elif params.address is None:
-            addresses = None
-        else:
-            addresses = (params.address,)
-
-        self._from_block = from_block
-        self._to_block = to_block
-        self._addresses = addresses
-        self._topics = params.topics
-
-    def block_number_range(self, current_block_number: int) -> range:
-        to_block = self._to_block if self._to_block is not None else current_block_number
-        return range(self._from_block, to_block + 1)
-
-    def matches(self, entry: LogEntry) -> bool:  # noqa: PLR0911
-        if entry.block_number < self._from_block:
-            return False
-
-        if self._to_block is not None and entry.block_number > self._to_block:
-            return False
-
-        if self._addresses is not None and entry.address not in self._addresses:
-            return False
-
-        if self._topics is None:
-            return True
-
-        # If we filter by more topics than there is in the entry,
-        # it's an automatic mismatch.
-        if len(self._topics) > len(entry.topics):
-            return False
-
-        # But note that if `self._topics` is shorter than `entry.topics`
-        # it is equivalent to the missing values being `None`,
-        # that is, matching anything.
-        for topics, logged_topic in zip(self._topics, entry.topics, strict=False):
-            if topics is None:
-                continue
-
-            filter_topics = topics if isinstance(topics, tuple) else (topics,)
-
-            for filter_topic in filter_topics:
-                if filter_topic == logged_topic:
-                    break
-            else:
-                return False
-
-        return True
+from ._fees import FeeHistory
+from ._filters import FilterBuffer, FilterKind, FilterStats, LogFilter, SharedEventLog
+from ._profile import ExecutionProfile
+from ._records import LogRecord
+from ._state_diff import StateDiff
+from ._storage import StorageRange
+from ._timer import RepeatingTimer
+from ._txpool import TxPoolContent, TxPoolStatus
+
+if TYPE_CHECKING:
+    # Importing the backend loads the whole of py-evm (with all the forks),
+    # which is the most of the package's import time, so it is deferred until a node is created.
+    from ._backend import PyEVMBackend
+
+_P = ParamSpec("_P")
+_R = TypeVar("_R")
+_T = TypeVar("_T")
+
+_logger = logging.getLogger(__name__)
+
+
+def _call_listeners(listeners: list[Callable[[_T], None]], value: _T) -> None:
+    # The list is copied, since the listeners may unsubscribe while being called.
+    for listener in list(listeners):
+        _call_listener(listener, value)
+
+
+def _call_listener(listener: Callable[[_T], None], value: _T) -> None:
+    # The listeners are called in the middle of the node's bookkeeping,
+    # which must not be interrupted by their errors.
+    try:
+        listener(value)
+    except Exception:
+        _logger.exception("Unhandled exception in the listener %r", listener)
+
+
+def _mutating(
+    method: Callable[Concatenate["Node", _P], _R],
+) -> Callable[Concatenate["Node", _P], _R]:
+    # Mutations are executed one at a time.
+    @wraps(method)
+    def wrapper(self: "Node", /, *args: _P.args, **kwargs: _P.kwargs) -> _R:
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def _read_only(
+    method: Callable[Concatenate["Node", _P], _R],
+) -> Callable[Concatenate["Node", _P], _R]:
+    # Queries only read the immutable database entries (the blocks and states
+    # are addressed by hashes), so they can run concurrently with each other and the mutations.
+    # The chain head they see is captured once (see `PyEVMBackend._pending_header`),
+    # so a block mined meanwhile does not change the meaning of "latest" mid-query.
+    # The only thing they must be protected from is the deletion of entries
+    # when the old history is pruned.
+    @wraps(method)
+    def wrapper(self: "Node", /, *args: _P.args, **kwargs: _P.kwargs) -> _R:
+        with self._backend.db_lock.reading():
+            return method(self, *args, **kwargs)
+
+    return wrapper
 
 
 class Node:
@@ -101,7 +97,48 @@ class Node:
     An Ethereum node maintaining its own local chain.
 
     If ``auto_mine_transactions`` is ``True``, a new block is mined
-    after every successful transaction.
+    after every successful transaction. Otherwise, blocks can be mined
+    by a timer (see :py:meth:`set_interval_mining`) or when enough transactions
+    are pending (see :py:meth:`set_batch_mining`), or explicitly.
+
+    If ``filter_buffer_size`` is not ``None``, each filter keeps at most that many
+    entries between polls, discarding the oldest ones.
+    If ``filter_timeout`` is not ``None``, filters that have not been polled
+    for that many seconds are uninstalled (major providers use 5 minutes).
+
+    ``genesis_accounts`` are written directly into the genesis state
+    (in addition to the root account, whose fields can be overridden this way).
+    The fields set to ``None`` take the default values (zero balance and nonce, no code,
+    empty storage). See :py:func:`derive_accounts` for creating a set of accounts to fund.
+
+    If ``state_history`` is not ``None``, the state is only kept for that many latest blocks;
+    state queries (balances, calls, gas estimates etc) for older blocks raise
+    :py:class:`BlockNotFound`. Similarly, if ``block_history`` is not ``None``,
+    only that many latest blocks (with their transactions and receipts) are kept.
+    If ``block_history`` is set, ``state_history`` must be set and not exceed it.
+    The unreachable data is removed from the database periodically,
+    so that the memory taken by a long-running node stays bounded.
+
+    If ``seed`` is not ``None``, the node runs in the deterministic mode:
+    the genesis timestamp is fixed, the timestamps of the new blocks do not depend
+    on the wall clock (each block is one second after its parent, unless the time
+    is shifted explicitly), and the ``prevrandao`` values are derived from the seed.
+    The same sequence of requests then produces the same chain, which allows one to
+    replay recorded traffic (see :py:class:`RPCRecorder`) and compare the responses.
+
+    If ``mempool`` is ``True``, the sent transactions are not applied right away,
+    but kept in a pool until a block is mined. The block is then filled with the transactions
+    paying the highest tips first (respecting the nonce order of each sender),
+    as long as they fit into the block gas limit; the rest stay in the pool.
+    Transactions with nonces ahead of the sender's current one are accepted and wait
+    for the gap to be filled, and a pooled transaction can be replaced by sending another one
+    with the same nonce and the fees increased by at least 10%.
+    Note that in this mode the execution errors are not reported when a transaction is sent.
+
+    The methods can be called from several threads. The calls changing the state
+    of the node (sending transactions, mining, managing filters etc) are executed one at a time,
+    while the queries (balances, calls, blocks, logs etc) run concurrently with them
+    and with each other, only seeing the blocks mined before the query started.
     """
 
     DEFAULT_ID = int.from_bytes(b"alysis", byteorder="big")
@@ -117,75 +154,243 @@ class Node:
         chain_id: int = DEFAULT_ID,
         net_version: int = 1,
         auto_mine_transactions: bool = True,
+        filter_buffer_size: None | int = None,
+        filter_timeout: None | float = 300,
+        genesis_accounts: None | Mapping[Address, AccountState] = None,
+        state_history: None | int = None,
+        block_history: None | int = None,
+        seed: None | bytes = None,
+        mempool: bool = False,
     ):
+        from ._backend import PyEVMBackend  # noqa: PLC0415
+
         backend = PyEVMBackend(
-            root_balance_wei=root_balance_wei, chain_id=chain_id, evm_version=evm_version
+            root_balance_wei=root_balance_wei,
+            chain_id=chain_id,
+            evm_version=evm_version,
+            genesis_accounts=genesis_accounts,
+            state_history=state_history,
+            block_history=block_history,
+            seed=seed,
+            mempool=mempool,
         )
+        self._initialize_with_backend(
+            backend=backend,
+            net_version=net_version,
+            auto_mine_transactions=auto_mine_transactions,
+            filter_buffer_size=filter_buffer_size,
+            filter_timeout=filter_timeout,
+        )
+
+    @classmethod
+    def load_state(
+        cls,
+        path: str | Path,
+        *,
+        net_version: int = 1,
+        auto_mine_transactions: bool = True,
+        filter_buffer_size: None | int = None,
+        filter_timeout: None | float = 300,
+        state_history: None | int = None,
+        block_history: None | int = None,
+        seed: None | bytes = None,
+        mempool: bool = False,
+    ) -> "Node":
+        """
+        Creates a node whose genesis state is loaded from a file created by :py:meth:`dump_state`.
+        The chain ID, the EVM version, and the root private key are restored as well.
+        The rest of the parameters have the same meaning as in the constructor.
+
+        The file is memory-mapped, and the state is read from it on demand,
+        so the loading time does not depend on the size of the state.
+        The new blocks and the state changes are kept in memory.
+        The file must not be modified while the node (or any of its copies) is alive.
+
+        Raises :py:class:`ValidationError` if the file is not a valid state file.
+        """
+        from ._backend import PyEVMBackend  # noqa: PLC0415
+
+        backend = PyEVMBackend.from_state_file(
+            path,
+            state_history=state_history,
+            block_history=block_history,
+            seed=seed,
+            mempool=mempool,
+        )
+        obj = object.__new__(cls)
+        obj._initialize_with_backend(
+            backend=backend,
+            net_version=net_version,
+            auto_mine_transactions=auto_mine_transactions,
+            filter_buffer_size=filter_buffer_size,
+            filter_timeout=filter_timeout,
+        )
+        return obj
+
+    def _initialize_with_backend(
+        self,
+        *,
+        backend: "PyEVMBackend",
+        net_version: int,
+        auto_mine_transactions: bool,
+        filter_buffer_size: None | int,
+        filter_timeout: None | float,
+    ) -> None:
         self._initialize(
             backend=backend,
             net_version=net_version,
             auto_mine_transactions=auto_mine_transactions,
+            filter_buffer_size=filter_buffer_size,
+            filter_timeout=filter_timeout,
+            batch_mining_transactions=None,
+            batch_mining_gas=None,
             filter_counter=0,
             log_filters={},
             log_filter_entries={},
-            block_filters={},
-            pending_transaction_filters={},
+            block_filters=SharedEventLog(filter_buffer_size),
+            pending_transaction_filters=SharedEventLog(filter_buffer_size),
         )
 
     def _initialize(
         self,
-        backend: PyEVMBackend,
+        *,
+        backend: "PyEVMBackend",
         net_version: int,
-        auto_mine_transactions: bool,  # noqa: FBT001
+        auto_mine_transactions: bool,
+        batch_mining_transactions: None | int,
+        batch_mining_gas: None | int,
+        filter_buffer_size: None | int,
+        filter_timeout: None | float,
         filter_counter: int,
         log_filters: dict[int, LogFilter],
-        log_filter_entries: dict[int, list[LogEntry]],
-        block_filters: dict[int, list[BlockHash]],
-        pending_transaction_filters: dict[int, list[TxHash]],
+        log_filter_entries: dict[int, FilterBuffer[LogRecord]],
+        block_filters: SharedEventLog[bytes],
+        pending_transaction_filters: SharedEventLog[bytes],
     ) -> None:
         self.root_private_key = backend.root_private_key
         self._backend = backend
         self._auto_mine_transactions = auto_mine_transactions
+        self._batch_mining_transactions = batch_mining_transactions
+        self._batch_mining_gas = batch_mining_gas
         self._net_version = net_version
 
         # filter tracking
+        self._filter_buffer_size = filter_buffer_size
+        self._filter_timeout = filter_timeout
         self._filter_counter = filter_counter
         self._log_filters = log_filters
+        # The entries are stored in a compact form,
+        # and converted to the API types when the filters are polled.
         self._log_filter_entries = log_filter_entries
         self._block_filters = block_filters
         self._pending_transaction_filters = pending_transaction_filters
 
+        # Serializes the calls that change the state of the node
+        # (the queries do not need it, see `_read_only()`)
+        self._lock = threading.RLock()
+
+        # Not copied along with the node, since they are bound to a specific object
+        self._change_listeners: list[Callable[[], None]] = []
+        self._block_listeners: list[Callable[[BlockInfo], None]] = []
+        self._log_listeners: list[tuple[LogFilter, Callable[[list[LogEntry]], None]]] = []
+        self._pending_transaction_listeners: list[Callable[[TxHash], None]] = []
+        self._state_diff_listeners: list[Callable[[StateDiff], None]] = []
+        self._interval_mining: None | RepeatingTimer = None
+
     def __deepcopy__(self, memo: None | dict[Any, Any]) -> "Node":
         """
         Makes a copy of this object that includes the chain state
         (with the pending transactions) and the filter state.
+        The interval mining is not enabled in the copy.
         """
-        obj = object.__new__(self.__class__)
-        obj._initialize(  # noqa: SLF001
-            backend=deepcopy(self._backend, memo),
-            net_version=self._net_version,
-            auto_mine_transactions=self._auto_mine_transactions,
-            filter_counter=self._filter_counter,
-            # Shallow copy is enough, LogFilter objects are immutable
-            log_filters=dict(self._log_filters),
-            # One level deep copy is enough here
-            log_filter_entries={key: val[:] for key, val in self._log_filter_entries.items()},
-            block_filters={key: val[:] for key, val in self._block_filters.items()},
-            pending_transaction_filters={
-                key: val[:] for key, val in self._pending_transaction_filters.items()
-            },
-        )
+        with self._lock:
+            obj = object.__new__(self.__class__)
+            obj._initialize(
+                backend=deepcopy(self._backend, memo),
+                net_version=self._net_version,
+                auto_mine_transactions=self._auto_mine_transactions,
+                batch_mining_transactions=self._batch_mining_transactions,
+                batch_mining_gas=self._batch_mining_gas,
+                filter_buffer_size=self._filter_buffer_size,
+                filter_timeout=self._filter_timeout,
+                filter_counter=self._filter_counter,
+                # Shallow copy is enough, LogFilter objects are immutable
+                log_filters=dict(self._log_filters),
+                # Buffers are copied, the entries themselves are immutable
+                log_filter_entries={
+                    key: copy(val) for key, val in self._log_filter_entries.items()
+                },
+                # Only the cursors and the shared logs are copied
+                block_filters=copy(self._block_filters),
+                pending_transaction_filters=copy(self._pending_transaction_filters),
+            )
         return obj
 
+    @_mutating
     def enable_auto_mine_transactions(self) -> None:
         """Turns automining on and mines a new block."""
         self._auto_mine_transactions = True
         self.mine_block()
 
+    @_mutating
     def disable_auto_mine_transactions(self) -> None:
         """Turns automining off."""
         self._auto_mine_transactions = False
 
+    @_mutating
+    def set_batch_mining(self, *, transactions: None | int = None, gas: None | int = None) -> None:
+        """
+        Makes the node mine a block as soon as the number of pending transactions
+        reaches ``transactions``, or the gas they use reaches ``gas``, whichever happens first
+        (``None`` disables the corresponding condition).
+        Only has effect while ``auto_mine_transactions`` is ``False``.
+
+        If the mempool is enabled, the gas limits of the pooled transactions are counted
+        instead of the gas they use.
+        """
+        if transactions is not None and transactions < 1:
+            raise ValidationError(
+                f"The number of transactions must be positive, got {transactions}"
+            )
+        if gas is not None and gas < 1:
+            raise ValidationError(f"The amount of gas must be positive, got {gas}")
+        self._batch_mining_transactions = transactions
+        self._batch_mining_gas = gas
+        self._mine_if_batch_is_full()
+
+    @_mutating
+    def set_interval_mining(self, interval: None | float) -> None:
+        """
+        Starts mining a block every ``interval`` seconds in a background thread
+        (regardless of whether there are pending transactions),
+        replacing the previous interval, if any.
+        If ``interval`` is ``None``, stops the interval mining.
+
+        The background thread does not keep the node alive,
+        and stops once the node is garbage collected.
+        """
+        if interval is not None and interval <= 0:
+            raise ValidationError(f"The mining interval must be positive, got {interval}")
+
+        timer = RepeatingTimer(interval, self.mine_block) if interval is not None else None
+        timer, self._interval_mining = self._interval_mining, timer
+        if timer is not None:
+            timer.stop()
+
+    def _mine_if_batch_is_full(self) -> None:
+        if self._auto_mine_transactions or (
+            self._batch_mining_transactions is None and self._batch_mining_gas is None
+        ):
+            return
+
+        transactions, gas = self._backend.get_pending_load()
+        if (
+            self._batch_mining_transactions is not None
+            and transactions >= self._batch_mining_transactions
+        ) or (self._batch_mining_gas is not None and gas >= self._batch_mining_gas):
+            self.mine_block()
+
+    @_mutating
     def mine_block(self, timestamp: None | int = None) -> None:
         """
         Mines a new block containing all the pending transactions.
@@ -193,16 +398,204 @@ class Node:
         If ``timestamp`` is not ``None``, sets the new block's timestamp to the given value.
         """
         block_hash = self._backend.mine_block(timestamp=timestamp)
+        self._process_new_blocks([block_hash])
+
+    @_mutating
+    def mine_blocks(self, count: int, *, timestamp: None | int = None, interval: int = 1) -> None:
+        """
+        Mines ``count`` blocks, the first one containing all the pending transactions,
+        and the rest empty (which is much faster than mining them one by one).
+
+        If ``timestamp`` is not ``None``, sets the first block's timestamp to the given value.
+        The timestamps of the subsequent blocks are increased by ``interval`` seconds.
+        """
+        block_hashes = self._backend.mine_blocks(count, timestamp=timestamp, interval=interval)
+        self._process_new_blocks(block_hashes)
+
+    @_mutating
+    def increase_time(self, seconds: int) -> int:
+        """
+        Shifts the timestamps of the blocks mined from now on by ``seconds``
+        relative to the wall clock.
+        The transactions sent afterwards see the shifted ``block.timestamp``
+        (unless the pending block already has transactions executed with the old one).
+        Returns the total shift.
+        """
+        return self._backend.increase_time(seconds)
+
+    @_mutating
+    def apply_state_patch(self, patch: Mapping[Address, AccountState]) -> None:
+        """
+        Sets the balances, nonces, codes, and storage of the given accounts
+        in the pending block, without creating transactions.
+        All the changes are applied at once; if any of them is invalid,
+        raises :py:class:`ValidationError` and leaves the state unchanged.
+
+        If ``auto_mine_transactions`` is ``True``, a new block is mined afterwards,
+        so that the changes are visible in the latest block.
+        """
+        self._backend.apply_state_patch(patch)
+        if self._auto_mine_transactions:
+            self.mine_block()
+
+    def set_balance(self, address: Address, balance: int) -> None:
+        """Sets the balance of an account. See :py:meth:`apply_state_patch` for details."""
+        self.apply_state_patch({address: AccountState(balance=balance)})
+
+    def set_nonce(self, address: Address, nonce: int) -> None:
+        """Sets the nonce of an account. See :py:meth:`apply_state_patch` for details."""
+        self.apply_state_patch({address: AccountState(nonce=nonce)})
+
+    def set_code(self, address: Address, code: bytes) -> None:
+        """Sets the bytecode of an account. See :py:meth:`apply_state_patch` for details."""
+        self.apply_state_patch({address: AccountState(code=code)})
+
+    def set_storage_at(self, address: Address, slot: int, value: int) -> None:
+        """Sets a storage slot of an account. See :py:meth:`apply_state_patch` for details."""
+        self.apply_state_patch({address: AccountState(storage={slot: value})})
+
+    @_read_only
+    def dump_state(self, path: str | Path) -> None:
+        """
+        Saves the state at the latest block (balances, nonces, codes, and storage of all accounts)
+        along with the chain metadata to a binary file at ``path``.
+        The node can be restored from it with :py:meth:`load_state`.
+
+        The block history, the pending transactions, and the filters are not saved.
+        """
+        self._backend.dump_state(path)
 
-        # feed the block hash to any block filters
-        for block_filter in self._block_filters.values():
-            block_filter.append(block_hash)
+    def _process_new_blocks(self, block_hashes: list[BlockHash]) -> None:
+        self._remove_expired_filters()
 
+        for block_hash in block_hashes:
+            # feed the block hash to any block filters
+            self._block_filters.append(bytes(block_hash))
+
+            if self._log_filters or self._log_listeners:
+                # Decoded once, and shared between the filters and the listeners
+                log_entries = self._backend.get_log_entries_by_block_hash(block_hash)
+                self._feed_log_filters(log_entries)
+            else:
+                log_entries = []
+
+            self._call_block_listeners(block_hash, log_entries)
+
+        self._notify_change_listeners()
+
+    def _feed_log_filters(self, log_entries: list[LogEntry]) -> None:
+        # Created on demand, and shared between the filters
+        log_records: dict[int, LogRecord] = {}
         for filter_id, log_filter in self._log_filters.items():
-            log_entries = self._backend.get_log_entries_by_block_hash(block_hash)
-            for log_entry in log_entries:
+            for index, log_entry in enumerate(log_entries):
                 if log_filter.matches(log_entry):
-                    self._log_filter_entries[filter_id].append(log_entry)
+                    if index not in log_records:
+                        log_records[index] = LogRecord(log_entry)
+                    self._log_filter_entries[filter_id].append(log_records[index])
+
+    def _call_block_listeners(self, block_hash: BlockHash, log_entries: list[LogEntry]) -> None:
+        if self._block_listeners:
+            block_info = self._backend.get_block_by_hash(block_hash, with_transactions=False)
+            _call_listeners(self._block_listeners, block_info)
+
+        for log_filter, log_listener in list(self._log_listeners):
+            matching_entries = [entry for entry in log_entries if log_filter.matches(entry)]
+            if matching_entries:
+                _call_listener(log_listener, matching_entries)
+
+        if self._state_diff_listeners:
+            block_number = self._backend.get_block_number_by_hash(block_hash)
+            state_diff = self._backend.get_state_diff(block_number)
+            _call_listeners(self._state_diff_listeners, state_diff)
+
+    @_read_only
+    def get_state_diff(self, block: Block) -> StateDiff:
+        """
+        Returns the accounts changed by a mined block, with their old and new balances,
+        nonces, codes, and the old and new values of the changed storage slots.
+
+        The storage slots of a state loaded with :py:meth:`load_state` that were not
+        written to by this node afterwards are not reported, since their preimages are unknown.
+
+        Raises :py:class:`BlockNotFound` if the block does not exist, is the genesis block
+        or the pending block, or the state before it has been pruned.
+        """
+        return self._backend.get_state_diff(block)
+
+    def on_block(self, listener: Callable[[BlockInfo], None]) -> Callable[[], None]:
+        """
+        Registers a function to be called with every newly mined block (without transactions).
+        Returns a function that unregisters the listener.
+
+        The listeners are called synchronously from the thread that mined the block,
+        before the mining method returns. Unlike polling a filter,
+        nothing is buffered and no work is done when no blocks are mined.
+
+        An exception raised by a listener is logged (to the ``alysis`` logger)
+        and does not propagate: the block is processed, and the other listeners are called,
+        as if the listener returned normally.
+        """
+        return self._add_listener(self._block_listeners, listener)
+
+    def on_logs(
+        self, params: FilterParams, listener: Callable[[list[LogEntry]], None]
+    ) -> Callable[[], None]:
+        """
+        Registers a function to be called with the log entries matching ``params``
+        for every newly mined block that has any.
+        Returns a function that unregisters the listener.
+
+        The log entries of a block are decoded once and shared
+        between all the listeners and filters.
+        See :py:meth:`on_block` for when the listeners are called
+        and how the exceptions raised by them are handled.
+        """
+        log_filter = LogFilter(params, self._backend.get_latest_block_number())
+        return self._add_listener(self._log_listeners, (log_filter, listener))
+
+    def on_pending_transaction(self, listener: Callable[[TxHash], None]) -> Callable[[], None]:
+        """
+        Registers a function to be called with the hash of every transaction
+        accepted by :py:meth:`eth_send_raw_transaction`, before it is mined.
+        Returns a function that unregisters the listener.
+        See :py:meth:`on_block` for how the exceptions raised by the listeners are handled.
+        """
+        return self._add_listener(self._pending_transaction_listeners, listener)
+
+    def on_state_diff(self, listener: Callable[[StateDiff], None]) -> Callable[[], None]:
+        """
+        Registers a function to be called with the state diff (see :py:meth:`get_state_diff`)
+        of every newly mined block.
+        Returns a function that unregisters the listener.
+        See :py:meth:`on_block` for when the listeners are called
+        and how the exceptions raised by them are handled.
+        """
+        return self._add_listener(self._state_diff_listeners, listener)
+
+    def _add_listener(self, listeners: list[_T], listener: _T) -> Callable[[], None]:
+        with self._lock:
+            listeners.append(listener)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                if listener in listeners:
+                    listeners.remove(listener)
+
+        return unsubscribe
+
+    def _add_change_listener(self, listener: Callable[[], None]) -> None:
+        # Registers a function called (from the thread making the change)
+        # every time new events become available to the filters.
+        with self._lock:
+            self._change_listeners.append(listener)
+
+    def _remove_change_listener(self, listener: Callable[[], None]) -> None:
+        with self._lock:
+            self._change_listeners.remove(listener)
+
+    def _notify_change_listeners(self) -> None:
+        for listener in self._change_listeners:
+            listener()
 
     def net_version(self) -> int:
         """Returns the current network id."""
@@ -218,27 +611,49 @@ class Node:
         """Returns the chain ID used for signing replay-protected transactions."""
         return self._backend.chain_id
 
+    @_read_only
     def eth_gas_price(self) -> Amount:
         """Returns an estimate of the current price per gas in wei."""
         # The specific algorithm is not enforced in the standard,
         # but this is the logic Infura uses. Seems to work for them.
-        block_info = self.eth_get_block_by_number(BlockLabel.LATEST, with_transactions=False)
-
         # Base fee plus 1 GWei
-        return block_info.base_fee_per_gas + Amount.gwei(1)
+        return Amount(self._backend.get_latest_base_fee()) + Amount.gwei(1)
 
+    @_read_only
+    def eth_fee_history(
+        self,
+        block_count: int,
+        newest_block: Block,
+        reward_percentiles: None | Sequence[float] = None,
+    ) -> FeeHistory:
+        """
+        Returns the base fees, the gas used ratios and (if ``reward_percentiles`` are given)
+        the priority fees paid at the given percentiles of the gas used,
+        for up to ``block_count`` blocks ending with ``newest_block``.
+        The range is shortened if some of the blocks are not available
+        (the pending block is treated as the latest one).
+
+        Raises :py:class:`ValidationError` if the block count exceeds 1024,
+        or the percentiles are not monotonically increasing values between 0 and 100.
+        """
+        return self._backend.fee_history(block_count, newest_block, reward_percentiles)
+
+    @_read_only
     def eth_block_number(self) -> int:
         """Returns the number of most recent block."""
         return self._backend.get_latest_block_number()
 
+    @_read_only
     def eth_get_balance(self, address: Address, block: Block) -> int:
         """Returns the balance (in wei) of the account of given address."""
         return self._backend.get_balance(address, block)
 
+    @_read_only
     def eth_get_code(self, address: Address, block: Block) -> bytes:
         """Returns code of the contract at a given address."""
         return self._backend.get_code(address, block)
 
+    @_read_only
     def eth_get_storage_at(
         self,
         address: Address,
@@ -248,10 +663,12 @@ class Node:
         """Returns the value from a storage position at a given address."""
         return self._backend.get_storage(address, slot, block)
 
+    @_read_only
     def eth_get_transaction_count(self, address: Address, block: Block) -> int:
         """Returns the number of transactions sent from an address."""
         return self._backend.get_transaction_count(address, block)
 
+    @_read_only
     def eth_get_transaction_by_hash(self, transaction_hash: TxHash) -> TxInfo:
         """
         Returns the information about a transaction requested by transaction hash.
@@ -261,6 +678,7 @@ class Node:
         """
         return self._backend.get_transaction_by_hash(transaction_hash)
 
+    @_read_only
     def eth_get_block_by_number(self, block: Block, *, with_transactions: bool) -> BlockInfo:
         """
         Returns information about a block by block number.
@@ -269,6 +687,22 @@ class Node:
         """
         return self._backend.get_block_by_number(block, with_transactions=with_transactions)
 
+    @_read_only
+    def eth_get_block_range(
+        self, from_block: Block, to_block: Block, *, with_transactions: bool
+    ) -> list[BlockInfo]:
+        """
+        Returns information about the blocks from ``from_block`` to ``to_block`` (inclusive).
+        The blocks are read in a single pass, which is faster than requesting them one by one.
+
+        Raises :py:class:`BlockNotFound` if any of the range boundaries does not exist,
+        and :py:class:`ValidationError` if ``from_block`` is after ``to_block``.
+        """
+        return self._backend.get_block_range(
+            from_block, to_block, with_transactions=with_transactions
+        )
+
+    @_read_only
     def eth_get_block_by_hash(self, block_hash: BlockHash, *, with_transactions: bool) -> BlockInfo:
         """
         Returns information about a block by hash.
@@ -277,6 +711,7 @@ class Node:
         """
         return self._backend.get_block_by_hash(block_hash, with_transactions=with_transactions)
 
+    @_read_only
     def eth_get_transaction_receipt(self, transaction_hash: TxHash) -> TxReceipt:
         """
         Returns the receipt of a transaction by transaction hash.
@@ -286,9 +721,22 @@ class Node:
         """
         return self._backend.get_transaction_receipt(transaction_hash)
 
+    @_read_only
+    def eth_get_block_receipts(self, block: Block) -> list[TxReceipt]:
+        """
+        Returns the receipts of all the transactions in a block, in the order of transactions.
+        This is faster than requesting the receipts one by one.
+
+        Raises :py:class:`BlockNotFound` if the requested block does not exist
+        or is the pending block.
+        """
+        return self._backend.get_block_receipts(block)
+
+    @_mutating
     def eth_send_raw_transaction(self, raw_transaction: bytes) -> TxHash:
         """
-        Attempts to add a signed RLP-encoded transaction to the current block.
+        Attempts to add a signed RLP-encoded transaction to the current block
+        (or to the mempool, if it is enabled).
         Returns the transaction hash on success.
 
         If the transaction is invalid, raises :py:class:`ValidationError`.
@@ -299,16 +747,22 @@ class Node:
         transaction = self._backend.decode_transaction(raw_transaction)
         transaction_hash = TxHash(transaction.hash)
 
-        for tx_filter in self._pending_transaction_filters.values():
-            tx_filter.append(transaction_hash)
+        self._remove_expired_filters()
+        self._pending_transaction_filters.append(bytes(transaction_hash))
+        self._notify_change_listeners()
 
         self._backend.send_decoded_transaction(transaction)
 
+        _call_listeners(self._pending_transaction_listeners, transaction_hash)
+
         if self._auto_mine_transactions:
             self.mine_block()
+        else:
+            self._mine_if_batch_is_full()
 
         return transaction_hash
 
+    @_read_only
     def eth_call(self, params: EthCallParams, block: Block) -> bytes:
         """
         Executes a new message call immediately without creating a transaction on the blockchain.
@@ -320,6 +774,7 @@ class Node:
         """
         return self._backend.call(params, block)
 
+    @_read_only
     def eth_estimate_gas(self, params: EstimateGasParams, block: Block) -> int:
         """
         Generates and returns an estimate of how much gas is necessary to allow
@@ -332,31 +787,95 @@ class Node:
         """
         return self._backend.estimate_gas(params, block)
 
+    # The mempool is modified in place, so the pool queries wait for the mutations
+    @_mutating
+    def txpool_content(self) -> TxPoolContent:
+        """Returns the transactions waiting to be included in a block."""
+        return self._backend.txpool_content()
+
+    @_mutating
+    def txpool_status(self) -> TxPoolStatus:
+        """Returns the number of transactions waiting to be included in a block."""
+        return self._backend.txpool_status()
+
+    @_read_only
+    def debug_profile_call(self, params: EthCallParams, block: Block) -> ExecutionProfile:
+        """
+        Executes a message call like :py:meth:`eth_call` does,
+        and returns the gas and time spent, broken down by opcode, contract, and call frame.
+
+        If the transaction is invalid, raises :py:class:`ValidationError`.
+        Unlike :py:meth:`eth_call`, a reverted or failed execution does not raise an exception,
+        but is reflected in the returned profile.
+        """
+        return self._backend.profile_call(params, block)
+
+    @_read_only
+    def debug_storage_range_at(
+        self, address: Address, block: Block, start_key: bytes, max_results: int
+    ) -> StorageRange:
+        """
+        Returns up to ``max_results`` storage entries of an account at the given block,
+        ordered by the hashed slots and starting from ``start_key`` (a 32-byte hash).
+        Use 32 zero bytes to start from the beginning, and the ``next_key``
+        of the returned range to continue.
+
+        Only the requested part of the storage is read, so large storages
+        can be iterated over without loading them into memory.
+
+        Raises :py:class:`BlockNotFound` if the state at the block has been pruned,
+        and :py:class:`ValidationError` if the start key or the number of results are invalid.
+        """
+        return self._backend.get_storage_range(address, block, start_key, max_results)
+
+    @_read_only
+    def debug_profile_transaction(self, transaction_hash: TxHash) -> ExecutionProfile:
+        """
+        Re-executes a transaction (either mined or pending) in the context of its block,
+        and returns the gas and time spent, broken down by opcode, contract, and call frame.
+
+        The transactions are not profiled when they are sent, so that there is no overhead
+        for the normal operation; this method can be called for any transaction afterwards.
+
+        Raises :py:class:`TransactionNotFound` if the transaction does not exist,
+        :py:class:`BlockNotFound` if the state it was executed on has been pruned,
+        and :py:class:`ValidationError` if that state was modified
+        by :py:meth:`apply_state_patch` (or the ``set_*`` methods) before the transaction,
+        so that it cannot be reproduced.
+        """
+        return self._backend.profile_transaction(transaction_hash)
+
+    @_mutating
     def eth_new_block_filter(self) -> int:
         """
         Creates a filter in the node, to notify when a new block arrives.
         Returns the identifier of the created filter.
         """
+        self._remove_expired_filters()
         filter_id = self._filter_counter
         self._filter_counter += 1
-        self._block_filters[filter_id] = []
+        self._block_filters.add_filter(filter_id, time.monotonic())
         return filter_id
 
+    @_mutating
     def eth_new_pending_transaction_filter(self) -> int:
         """
         Creates a filter in the node, to notify when new pending transactions arrive.
         Returns the identifier of the created filter.
         """
+        self._remove_expired_filters()
         filter_id = self._filter_counter
         self._filter_counter += 1
-        self._pending_transaction_filters[filter_id] = []
+        self._pending_transaction_filters.add_filter(filter_id, time.monotonic())
         return filter_id
 
+    @_mutating
     def eth_new_filter(self, params: FilterParams) -> int:
         """
         Creates a filter object, based on filter options, to notify when the state changes (logs).
         Returns the identifier of the created filter.
         """
+        self._remove_expired_filters()
         filter_id = self._filter_counter
         self._filter_counter += 1
 
@@ -364,21 +883,62 @@ class Node:
         log_filter = LogFilter(params, current_block_number)
 
         self._log_filters[filter_id] = log_filter
-        self._log_filter_entries[filter_id] = []
+        self._log_filter_entries[filter_id] = FilterBuffer(
+            self._filter_buffer_size, time.monotonic()
+        )
 
         return filter_id
 
+    def _remove_expired_filters(self) -> None:
+        if self._filter_timeout is None:
+            return
+
+        expiration_time = time.monotonic() - self._filter_timeout
+        expired_ids = (
+            self._block_filters.expired_filters(expiration_time)
+            + self._pending_transaction_filters.expired_filters(expiration_time)
+            + [
+                filter_id
+                for filter_id, buffer in self._log_filter_entries.items()
+                if buffer.last_polled < expiration_time
+            ]
+        )
+        for filter_id in expired_ids:
+            self.delete_filter(filter_id)
+
+    @_mutating
     def delete_filter(self, filter_id: int) -> None:
         """Deletes the filter with the given identifier."""
         if filter_id in self._block_filters:
-            del self._block_filters[filter_id]
+            self._block_filters.remove_filter(filter_id)
         elif filter_id in self._pending_transaction_filters:
-            del self._pending_transaction_filters[filter_id]
+            self._pending_transaction_filters.remove_filter(filter_id)
         elif filter_id in self._log_filters:
             del self._log_filters[filter_id]
+            del self._log_filter_entries[filter_id]
         else:
             raise FilterNotFound(f"Unknown filter id: {filter_id}")
 
+    @_mutating
+    def filter_stats(self) -> dict[int, FilterStats]:
+        """
+        Returns the state of all the installed filters,
+        including the estimated memory held by each of them.
+        """
+        self._remove_expired_filters()
+        timestamp = time.monotonic()
+        stats = {}
+        for filter_id in self._block_filters.filter_ids():
+            stats[filter_id] = self._block_filters.stats(filter_id, FilterKind.BLOCKS, timestamp)
+        for filter_id in self._pending_transaction_filters.filter_ids():
+            stats[filter_id] = self._pending_transaction_filters.stats(
+                filter_id, FilterKind.PENDING_TRANSACTIONS, timestamp
+            )
+        for filter_id, log_buffer in self._log_filter_entries.items():
+            stats[filter_id] = log_buffer.stats(FilterKind.LOGS, timestamp)
+        return stats
+
+    @_mutating
     def eth_get_filter_changes(
         self, filter_id: int
     ) -> list[LogEntry] | list[TxHash] | list[BlockHash]:
@@ -391,20 +951,22 @@ class Node:
             even if they satisfy the filter predicate.
             Call :py:meth:`eth_get_filter_logs` to get those.
         """
+        self._remove_expired_filters()
+        timestamp = time.monotonic()
+
         if filter_id in self._block_filters:
-            block_entries = self._block_filters[filter_id]
-            self._block_filters[filter_id] = []
-            return block_entries
+            return [BlockHash(entry) for entry in self._block_filters.poll(filter_id, timestamp)]
 
         if filter_id in self._pending_transaction_filters:
-            tx_entries = self._pending_transaction_filters[filter_id]
-            self._pending_transaction_filters[filter_id] = []
-            return tx_entries
+            return [
+                TxHash(entry)
+                for entry in self._pending_transaction_filters.poll(filter_id, timestamp)
+            ]
 
         if filter_id in self._log_filters:
-            log_entries = self._log_filter_entries[filter_id]
-            self._log_filter_entries[filter_id] = []
-            return log_entries
+            return [
+                record.to_entry() for record in self._log_filter_entries[filter_id].poll(timestamp)
+            ]
 
         raise FilterNotFound(f"Unknown filter id: {filter_id}")
 
@@ -420,6 +982,7 @@ class Node:
 
         return entries
 
+    @_read_only
     def eth_get_logs(self, params: FilterParams | FilterParamsEIP234) -> list[LogEntry]:
         """Returns an array of all logs matching a given filter object."""
         current_block_number = self._backend.get_latest_block_number()
@@ -436,26 +999,21 @@ class Node:
         log_filter = LogFilter(params, current_block_number)
         return self._get_logs(log_filter)
 
+    @_mutating
     def eth_get_filter_logs(self, filter_id: int) -> list[LogEntry]:
         """Returns an array of all logs matching filter with given id."""
+        self._remove_expired_filters()
         if filter_id in self._log_filters:
             log_filter = self._log_filters[filter_id]
+            self._log_filter_entries[filter_id].touch(time.monotonic())
         else:
             raise FilterNotFound(f"Unknown filter id: {filter_id}")
 
         return self._get_logs(log_filter)
 
+    @_mutating
     def eth_uninstall_filter(self, filter_id: int) -> None:
-        if filter_id in self._log_filters:
-            del self._log_filters[filter_id]
-            return
-        if filter_id in self._block_filters:
-            del self._block_filters[filter_id]
-            return
-        if filter_id in self._pending_transaction_filters:
-            del self._pending_transaction_filters[filter_id]
-            return
-        raise FilterNotFound(f"Unknown filter id: {filter_id}")
+        self.delete_filter(filter_id)
 
     def eth_accounts(self) -> list[Address]:
         # Returning an empty list allows us to not implement the related methods
@@ -476,18 +1034,23 @@ class Node:
     def eth_coinbase(self) -> Address:
         return self._backend.coinbase
 
+    @_read_only
     def eth_get_block_transaction_count_by_hash(self, block_hash: BlockHash) -> int:
         return len(self.eth_get_block_by_hash(block_hash, with_transactions=False).transactions)
 
+    @_read_only
     def eth_get_block_transaction_count_by_number(self, block: Block) -> int:
         return len(self.eth_get_block_by_number(block, with_transactions=False).transactions)
 
+    @_read_only
     def eth_get_uncle_count_by_block_hash(self, block_hash: BlockHash) -> int:
         return len(self.eth_get_block_by_hash(block_hash, with_transactions=False).uncles)
 
+    @_read_only
     def eth_get_uncle_count_by_block_number(self, block: Block) -> int:
         return len(self.eth_get_block_by_number(block, with_transactions=False).uncles)
 
+    @_read_only
     def eth_get_transaction_by_block_hash_and_index(
         self, block_hash: BlockHash, index: int
     ) -> TxInfo:
@@ -499,6 +1062,7 @@ class Node:
         # Can cast here since we requested a block with transactions above
         return cast("TxInfo", block_info.transactions[index])
 
+    @_read_only
     def eth_get_transaction_by_block_number_and_index(self, block: Block, index: int) -> TxInfo:
         block_info = self.eth_get_block_by_number(block, with_transactions=True)
         if index < 0 or index >= len(block_info.transactions):
@@ -508,6 +1072,7 @@ class Node:
         # Can cast here since we requested a block with transactions above
         return cast("TxInfo", block_info.transactions[index])
 
+    @_read_only
     def eth_get_uncle_by_block_hash_and_index(
         self, block_hash: BlockHash, index: int
     ) -> BlockInfo | None:
@@ -517,6 +1082,7 @@ class Node:
             return None
         return self.eth_get_block_by_hash(block_info.uncles[index], with_transactions=False)
 
+    @_read_only
     def eth_get_uncle_by_block_number_and_index(self, block: Block, index: int) -> BlockInfo | None:
         block_info = self.eth_get_block_by_number(block, with_transactions=False)
         if index < 0 or index >= len(block_info.uncles):
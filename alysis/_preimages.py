@@ -0,0 +1,43 @@
+"""Recording the preimages of the hashed keys in the state tries."""
+
+from typing import Any
+
+from eth.abc import VirtualMachineAPI
+from eth_typing import Address as EthAddress
+from ethereum_rpc import keccak
+
+
+def slot_key(slot: int) -> bytes:
+    """Returns the storage slot in the form it is hashed with for the storage trie."""
+    return slot.to_bytes(32, byteorder="big")
+
+
+def make_recording_vm_class(
+    vm_class: type[VirtualMachineAPI], preimages: dict[bytes, bytes]
+) -> type[VirtualMachineAPI]:
+    """
+    Returns a subclass of ``vm_class`` whose state records the preimages
+    of the hashed addresses of the modified accounts,
+    and of the hashed storage slots written to into ``preimages``.
+    """
+    state_class = vm_class.get_state_class()
+    account_db_class: Any = state_class.get_account_db_class()
+
+    class PreimageRecordingAccountDB(account_db_class):  # type: ignore[misc]
+        # All the modifications of an account go through one of these two methods
+        def _set_account(self, address: EthAddress, account: Any) -> None:
+            preimages[keccak(address)] = address
+            super()._set_account(address, account)
+
+        def delete_account(self, address: EthAddress) -> None:
+            preimages[keccak(address)] = address
+            super().delete_account(address)
+
+        def set_storage(self, address: EthAddress, slot: int, value: int) -> None:
+            key = slot_key(slot)
+            preimages[keccak(key)] = key
+            super().set_storage(address, slot, value)
+
+    return vm_class.configure(
+        _state_class=state_class.configure(account_db_class=PreimageRecordingAccountDB)
+    )
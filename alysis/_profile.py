@@ -0,0 +1,95 @@
+from dataclasses import dataclass
+
+from ethereum_rpc import Address
+
+
+@dataclass(frozen=True)
+class OpcodeProfile:
+    """Aggregated statistics for an opcode."""
+
+    mnemonic: str
+    """The opcode name (e.g. ``SSTORE``)."""
+
+    count: int
+    """The number of times the opcode was executed."""
+
+    gas: int
+    """
+    The total gas spent by the opcode.
+    For the opcodes creating call frames (``CALL``, ``CREATE`` etc), the gas spent
+    by the callee is not included.
+    """
+
+    time: float
+    """
+    The total time (in seconds) spent executing the opcode.
+    For the opcodes creating call frames, the time spent in the callee is not included.
+    """
+
+
+@dataclass(frozen=True)
+class ContractProfile:
+    """Aggregated statistics for the code at an address."""
+
+    address: Address
+    """
+    The address the executed code belongs to (for ``DELEGATECALL``, the callee's one,
+    and not the one whose storage is used).
+    """
+
+    calls: int
+    """The number of call frames executing this code."""
+
+    gas: int
+    """The total gas spent in these call frames, not including the nested calls."""
+
+    time: float
+    """The total time (in seconds) spent in these call frames, not including the nested calls."""
+
+
+@dataclass(frozen=True)
+class CallFrameProfile:
+    """Statistics for a single call frame."""
+
+    depth: int
+    """The call depth (0 for the transaction itself)."""
+
+    address: Address
+    """The address of the executed code."""
+
+    gas: int
+    """The gas spent in the frame, including the nested calls."""
+
+    time: float
+    """The time (in seconds) spent in the frame, including the nested calls."""
+
+    success: bool
+    """``False`` if the frame reverted or failed."""
+
+
+@dataclass(frozen=True)
+class ExecutionProfile:
+    """
+    Aggregated gas and time statistics of a transaction or a call execution.
+
+    Only the execution of the code is profiled; the intrinsic gas of the transaction
+    and the refunds are not included.
+    """
+
+    gas: int
+    """The total gas spent executing the code."""
+
+    time: float
+    """The total time (in seconds) spent executing the code."""
+
+    success: bool
+    """``False`` if the execution reverted or failed."""
+
+    opcodes: tuple[OpcodeProfile, ...]
+    """Per-opcode statistics, from the most expensive opcode in terms of gas."""
+
+    contracts: tuple[ContractProfile, ...]
+    """Per-contract statistics, from the most expensive contract in terms of gas."""
+
+    call_frames: tuple[CallFrameProfile, ...]
+    """Per-call frame statistics, in the order the frames were entered."""
@@ -0,0 +1,72 @@
+"""Compact representations of the data the node keeps for a long time."""
+
+from ethereum_rpc import Address, BlockHash, LogEntry, LogTopic, TxHash
+
+_TOPIC_SIZE = 32
+
+# The number of lower bits holding the transaction index in a packed location.
+_TRANSACTION_INDEX_BITS = 32
+
+
+class LogRecord:
+    """
+    A compact form of :py:class:`ethereum_rpc.LogEntry` for buffering in filters.
+
+    Uses slots instead of an instance dictionary, and keeps the raw bytes
+    instead of the typed wrappers (each of which is a separate object with its own dictionary);
+    the topics are concatenated into a single bytestring.
+    The entries are never marked as removed since there are no chain reorganizations.
+    """
+
+    __slots__ = (
+        "address",
+        "block_hash",
+        "block_number",
+        "data",
+        "log_index",
+        "topics",
+        "transaction_hash",
+        "transaction_index",
+    )
+
+    def __init__(self, entry: LogEntry):
+        self.address = bytes(entry.address)
+        self.data = entry.data
+        self.topics = b"".join(bytes(topic) for topic in entry.topics)
+        self.log_index = entry.log_index
+        self.transaction_index = entry.transaction_index
+        self.transaction_hash = bytes(entry.transaction_hash)
+        self.block_hash = bytes(entry.block_hash)
+        self.block_number = entry.block_number
+
+    def to_entry(self) -> LogEntry:
+        return LogEntry(
+            removed=False,
+            address=Address(self.address),
+            data=self.data,
+            topics=tuple(
+                LogTopic(self.topics[offset : offset + _TOPIC_SIZE])
+                for offset in range(0, len(self.topics), _TOPIC_SIZE)
+            ),
+            log_index=self.log_index,
+            transaction_index=self.transaction_index,
+            transaction_hash=TxHash(self.transaction_hash),
+            block_hash=BlockHash(self.block_hash),
+            block_number=self.block_number,
+        )
+
+
+def pack_tx_location(block_number: int, transaction_index: int) -> int:
+    """
+    Packs the position of a transaction in the chain into a single integer
+    (which takes less memory than a tuple of two).
+    """
+    return (block_number << _TRANSACTION_INDEX_BITS) | transaction_index
+
+
+def unpack_tx_location(location: int) -> tuple[int, int]:
+    """Returns the block number and the transaction index packed by `pack_tx_location()`."""
+    return (
+        location >> _TRANSACTION_INDEX_BITS,
+        location & ((1 << _TRANSACTION_INDEX_BITS) - 1),
+    )
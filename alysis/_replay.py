@@ -0,0 +1,140 @@
+"""Recording RPC traffic and replaying it against a node."""
+
+import json
+import math
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from ethereum_rpc import JSON, RPCError
+
+from ._rpc import RPCNode
+
+
+class RPCRecorder:
+    """
+    A wrapper for :py:class:`RPCNode` writing every request and its response (or error)
+    to a file, one JSON object per line.
+    The file can then be replayed with :py:func:`replay_rpc`.
+
+    For the recorded responses to be reproducible, the node should be created
+    in the deterministic mode (see the ``seed`` parameter of :py:class:`Node`).
+    """
+
+    def __init__(self, rpc_node: RPCNode, path: str | Path):
+        self.rpc_node = rpc_node
+        self._file = Path(path).open("w")  # noqa: SIM115
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+
+    def close(self) -> None:
+        """Closes the record file."""
+        self._file.close()
+
+    def rpc(self, method_name: str, *params: JSON) -> JSON:
+        """Makes an RPC request to the wrapped node, recording it along with the response."""
+        record: dict[str, Any] = dict(
+            time=time.monotonic() - self._start, method=method_name, params=list(params)
+        )
+        try:
+            result = self.rpc_node.rpc(method_name, *params)
+        except RPCError as exc:
+            record["error"] = _error_to_json(exc)
+            self._write(record)
+            raise
+        record["result"] = result
+        self._write(record)
+        return result
+
+    def _write(self, record: dict[str, Any]) -> None:
+        line = json.dumps(record)
+        # The requests can come from several threads
+        with self._lock:
+            self._file.write(line + "\n")
+
+
+@dataclass(frozen=True)
+class ReplayStats:
+    """The results of replaying recorded RPC traffic."""
+
+    requests: int
+    """The number of replayed requests."""
+
+    mismatches: int
+    """The number of requests whose response differs from the recorded one."""
+
+    elapsed: float
+    """The total time (in seconds) taken by the replay."""
+
+    latencies: tuple[float, ...]
+    """The time (in seconds) taken by each request, in the order they were made."""
+
+    @property
+    def throughput(self) -> float:
+        """The number of requests per second."""
+        return self.requests / self.elapsed if self.elapsed > 0 else math.inf
+
+    def latency_percentile(self, percentile: float) -> float:
+        """
+        Returns the latency (in seconds) that ``percentile`` percent of the requests
+        did not exceed (e.g. ``latency_percentile(99)`` for the 99th percentile).
+        """
+        if not 0 < percentile <= 100:
+            raise ValueError(f"The percentile must be within (0, 100], got {percentile}")
+        if not self.latencies:
+            return 0
+        latencies = sorted(self.latencies)
+        # The nearest-rank method
+        rank = math.ceil(percentile / 100 * len(latencies))
+        return latencies[rank - 1]
+
+
+def replay_rpc(rpc_node: RPCNode, path: str | Path, *, max_speed: bool = False) -> ReplayStats:
+    """
+    Makes the requests from a file created by :py:class:`RPCRecorder`,
+    and compares the responses with the recorded ones.
+
+    If ``max_speed`` is ``False``, the requests are made with the same time intervals
+    as they were recorded with (unless the node is too slow to keep up);
+    otherwise each request is made as soon as the previous one finishes.
+    """
+    latencies = []
+    mismatches = 0
+
+    start = time.monotonic()
+    with Path(path).open() as file:
+        for line in file:
+            record = json.loads(line)
+
+            if not max_speed:
+                delay = start + record["time"] - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            request_start = time.perf_counter()
+            try:
+                response = dict(result=rpc_node.rpc(record["method"], *record["params"]))
+            except RPCError as exc:
+                response = dict(error=_error_to_json(exc))
+            latencies.append(time.perf_counter() - request_start)
+
+            expected = {key: record[key] for key in ("result", "error") if key in record}
+            if response != expected:
+                mismatches += 1
+
+    return ReplayStats(
+        requests=len(latencies),
+        mismatches=mismatches,
+        elapsed=time.monotonic() - start,
+        latencies=tuple(latencies),
+    )
+
+
+def _error_to_json(exc: RPCError) -> JSON:
+    return dict(
+        code=exc.code,
+        message=exc.message,
+        data=None if exc.data is None else "0x" + exc.data.hex(),
+    )
@@ -1,5 +1,8 @@
 """RPC-like API, mimicking the behavior of major Ethereum providers."""
 
+from collections.abc import Iterator
+from contextlib import contextmanager
+
 from compages import StructuringError, UnstructuringError
 from ethereum_rpc import (
     JSON,
@@ -29,6 +32,10 @@ from ._exceptions import (
     ValidationError,
 )
 from ._node import Node
+from ._profile import ExecutionProfile
+from ._state_diff import AccountDiff, StateDiff
+
+_WORD_SIZE = 32
 
 
 class RPCNode:
@@ -46,6 +53,7 @@ class RPCNode:
             eth_chainId=self._eth_chain_id,
             eth_getBalance=self._eth_get_balance,
             eth_getTransactionReceipt=self._eth_get_transaction_receipt,
+            eth_getBlockReceipts=self._eth_get_block_receipts,
             eth_getTransactionCount=self._eth_get_transaction_count,
             eth_getCode=self._eth_get_code,
             eth_getStorageAt=self._eth_get_storage_at,
@@ -53,10 +61,12 @@ class RPCNode:
             eth_sendRawTransaction=self._eth_send_raw_transaction,
             eth_estimateGas=self._eth_estimate_gas,
             eth_gasPrice=self._eth_gas_price,
+            eth_feeHistory=self._eth_fee_history,
             eth_blockNumber=self._eth_block_number,
             eth_getTransactionByHash=self._eth_get_transaction_by_hash,
             eth_getBlockByHash=self._eth_get_block_by_hash,
             eth_getBlockByNumber=self._eth_get_block_by_number,
+            eth_getBlockRange=self._eth_get_block_range,
             eth_newBlockFilter=self._eth_new_block_filter,
             eth_newPendingTransactionFilter=self._eth_new_pending_transaction_filter,
             eth_newFilter=self._eth_new_filter,
@@ -76,6 +86,27 @@ class RPCNode:
             eth_getTransactionByBlockNumberAndIndex=self._eth_get_transaction_by_block_number_and_index,
             eth_getUncleByBlockHashAndIndex=self._eth_get_uncle_by_block_hash_and_index,
             eth_getUncleByBlockNumberAndIndex=self._eth_get_uncle_by_block_number_and_index,
+            evm_mine=self._evm_mine,
+            evm_increaseTime=self._evm_increase_time,
+            hardhat_mine=self._hardhat_mine,
+            anvil_mine=self._hardhat_mine,
+            evm_setAutomine=self._evm_set_automine,
+            anvil_setAutomine=self._evm_set_automine,
+            evm_setIntervalMining=self._evm_set_interval_mining,
+            anvil_setIntervalMining=self._anvil_set_interval_mining,
+            hardhat_setBalance=self._hardhat_set_balance,
+            anvil_setBalance=self._hardhat_set_balance,
+            hardhat_setNonce=self._hardhat_set_nonce,
+            anvil_setNonce=self._hardhat_set_nonce,
+            hardhat_setCode=self._hardhat_set_code,
+            anvil_setCode=self._hardhat_set_code,
+            hardhat_setStorageAt=self._hardhat_set_storage_at,
+            anvil_setStorageAt=self._hardhat_set_storage_at,
+            txpool_content=self._txpool_content,
+            txpool_status=self._txpool_status,
+            debug_profileCall=self._debug_profile_call,
+            debug_profileTransaction=self._debug_profile_transaction,
+            debug_getStateDiff=self._debug_get_state_diff,
         )
 
     def rpc(self, method_name: str, *params: JSON) -> JSON:
@@ -88,46 +119,9 @@ class RPCNode:
                 RPCErrorCode.METHOD_NOT_FOUND, f"Unknown method: {method_name}"
             )
 
-        try:
+        with translate_rpc_errors():
             return self._methods[method_name](params)
 
-        except (BlockNotFound, TransactionNotFound) as exc:
-            # If we didn't process it earlier, it's a SERVER_ERROR
-            raise RPCError.with_code(RPCErrorCode.SERVER_ERROR, str(exc)) from exc
-
-        except (FilterNotFound, IndexNotFound) as exc:
-            # That's what the providers seem to return.
-            raise RPCError.with_code(RPCErrorCode.METHOD_NOT_FOUND, str(exc)) from exc
-
-        except (StructuringError, ValidationError) as exc:
-            raise RPCError.with_code(RPCErrorCode.INVALID_PARAMETER, str(exc)) from exc
-
-        except UnstructuringError as exc:
-            raise RPCError.with_code(RPCErrorCode.SERVER_ERROR, str(exc)) from exc
-
-        except TransactionReverted as exc:
-            reason_data = exc.args[0]
-
-            if reason_data == b"":
-                # Empty `revert()`, or `require()` without a message.
-
-                # who knows why it's different in this specific case,
-                # but that's how Infura and Quicknode work
-                error = RPCErrorCode.SERVER_ERROR
-
-                message = "execution reverted"
-                data = None
-
-            else:
-                error = RPCErrorCode.EXECUTION_ERROR
-                message = "execution reverted"
-                data = reason_data
-
-            raise RPCError.with_code(error, message, data) from exc
-
-        except TransactionFailed as exc:
-            raise RPCError.with_code(RPCErrorCode.SERVER_ERROR, exc.args[0]) from exc
-
     def _net_version(self, params: tuple[JSON, ...]) -> JSON:
         _ = structure(tuple[()], params)
         # Note: it's not hex encoded, but just stringified!
@@ -189,6 +183,13 @@ class RPCNode:
             return None
         return unstructure(block_info)
 
+    def _eth_get_block_range(self, params: tuple[JSON, ...]) -> JSON:
+        from_block, to_block, with_transactions = structure(tuple[Block, Block, bool], params)
+        blocks = self.node.eth_get_block_range(
+            from_block, to_block, with_transactions=with_transactions
+        )
+        return [unstructure(block_info) for block_info in blocks]
+
     def _eth_get_transaction_receipt(self, params: tuple[JSON, ...]) -> JSON:
         (transaction_hash,) = structure(tuple[TxHash], params)
         try:
@@ -197,6 +198,14 @@ class RPCNode:
             return None
         return unstructure(receipt)
 
+    def _eth_get_block_receipts(self, params: tuple[JSON, ...]) -> JSON:
+        (block,) = structure(tuple[Block], params)
+        try:
+            receipts = self.node.eth_get_block_receipts(block)
+        except BlockNotFound:
+            return None
+        return [unstructure(receipt) for receipt in receipts]
+
     def _eth_send_raw_transaction(self, params: tuple[JSON, ...]) -> JSON:
         (raw_transaction,) = structure(tuple[bytes], params)
         return unstructure(self.node.eth_send_raw_transaction(raw_transaction))
@@ -209,10 +218,74 @@ class RPCNode:
         transaction, block = structure(tuple[EstimateGasParams, Block], params)
         return unstructure(self.node.eth_estimate_gas(transaction, block))
 
+    def _txpool_content(self, params: tuple[JSON, ...]) -> JSON:
+        _ = structure(tuple[()], params)
+        content = self.node.txpool_content()
+        # Same as in Geth: the nonces are keyed by their decimal representations.
+        return {
+            name: {
+                address.checksum: {
+                    str(nonce): unstructure(transaction)
+                    for nonce, transaction in transactions.items()
+                }
+                for address, transactions in group.items()
+            }
+            for name, group in (("pending", content.pending), ("queued", content.queued))
+        }
+
+    def _txpool_status(self, params: tuple[JSON, ...]) -> JSON:
+        _ = structure(tuple[()], params)
+        status = self.node.txpool_status()
+        return {"pending": unstructure(status.pending), "queued": unstructure(status.queued)}
+
+    def _debug_profile_call(self, params: tuple[JSON, ...]) -> JSON:
+        transaction, block = structure(tuple[EthCallParams, Block], params)
+        return _unstructure_profile(self.node.debug_profile_call(transaction, block))
+
+    def _debug_profile_transaction(self, params: tuple[JSON, ...]) -> JSON:
+        (transaction_hash,) = structure(tuple[TxHash], params)
+        return _unstructure_profile(self.node.debug_profile_transaction(transaction_hash))
+
+    def _debug_get_state_diff(self, params: tuple[JSON, ...]) -> JSON:
+        (block,) = structure(tuple[Block], params)
+        try:
+            state_diff = self.node.get_state_diff(block)
+        except BlockNotFound:
+            return None
+        return _unstructure_state_diff(state_diff)
+
     def _eth_gas_price(self, params: tuple[JSON, ...]) -> JSON:
         _ = structure(tuple[()], params)
         return unstructure(self.node.eth_gas_price())
 
+    def _eth_fee_history(self, params: tuple[JSON, ...]) -> JSON:
+        # The block count is often sent as a JSON number, and the percentiles are floats
+        # which `structure()` does not support.
+        if len(params) > 3:
+            raise ValidationError(f"Expected at most 3 parameters, got {len(params)}")
+        block_count, newest_block = structure(tuple[int, Block], _quantities_to_hex(params[:2]))
+        reward_percentiles = None
+        if len(params) == 3:
+            raw_percentiles = params[2]
+            if not isinstance(raw_percentiles, list) or not all(
+                isinstance(value, int | float) and not isinstance(value, bool)
+                for value in raw_percentiles
+            ):
+                raise ValidationError("Reward percentiles must be a list of numbers")
+            reward_percentiles = [float(value) for value in raw_percentiles]
+
+        history = self.node.eth_fee_history(block_count, newest_block, reward_percentiles)
+        result = {
+            "oldestBlock": unstructure(history.oldest_block),
+            "baseFeePerGas": [unstructure(fee) for fee in history.base_fee_per_gas],
+            "gasUsedRatio": list(history.gas_used_ratio),
+        }
+        if history.reward is not None:
+            result["reward"] = [
+                [unstructure(reward) for reward in rewards] for rewards in history.reward
+            ]
+        return result
+
     def _eth_new_block_filter(self, params: tuple[JSON, ...]) -> JSON:
         _ = structure(tuple[()], params)
         return unstructure(self.node.eth_new_block_filter())
@@ -305,3 +378,210 @@ class RPCNode:
         return unstructure(
             self.node.eth_get_uncle_by_block_number_and_index(block, index), BlockInfo | None
         )
+
+    def _evm_mine(self, params: tuple[JSON, ...]) -> JSON:
+        # Clients often send the timestamp as a JSON number instead of a hex string.
+        if len(params) == 0:
+            timestamp = None
+        else:
+            (timestamp,) = structure(tuple[int], _quantities_to_hex(params))
+        self.node.mine_block(timestamp=timestamp)
+        return "0x0"
+
+    def _hardhat_mine(self, params: tuple[JSON, ...]) -> JSON:
+        # Both parameters are optional
+        count, interval = structure(
+            tuple[int, int], _quantities_to_hex(params) + ("0x1", "0x1")[len(params) :]
+        )
+        self.node.mine_blocks(count, interval=interval)
+        return True
+
+    def _evm_increase_time(self, params: tuple[JSON, ...]) -> JSON:
+        (seconds,) = structure(tuple[int], _quantities_to_hex(params))
+        # That's what Hardhat returns: the total shift as a decimal string
+        return str(self.node.increase_time(seconds))
+
+    def _evm_set_automine(self, params: tuple[JSON, ...]) -> JSON:
+        (enabled,) = structure(tuple[bool], params)
+        if enabled:
+            self.node.enable_auto_mine_transactions()
+        else:
+            self.node.disable_auto_mine_transactions()
+        return True
+
+    def _evm_set_interval_mining(self, params: tuple[JSON, ...]) -> JSON:
+        # Hardhat takes the interval in milliseconds, with 0 disabling the interval mining
+        (interval,) = structure(tuple[int], _quantities_to_hex(params))
+        self.node.set_interval_mining(interval / 1000 if interval > 0 else None)
+        return True
+
+    def _anvil_set_interval_mining(self, params: tuple[JSON, ...]) -> JSON:
+        # Anvil takes the interval in seconds, with 0 disabling the interval mining
+        (interval,) = structure(tuple[int], _quantities_to_hex(params))
+        self.node.set_interval_mining(interval if interval > 0 else None)
+        return True
+
+    def _hardhat_set_balance(self, params: tuple[JSON, ...]) -> JSON:
+        address, balance = structure(tuple[Address, int], _quantities_to_hex(params))
+        self.node.set_balance(address, balance)
+        return True
+
+    def _hardhat_set_nonce(self, params: tuple[JSON, ...]) -> JSON:
+        address, nonce = structure(tuple[Address, int], _quantities_to_hex(params))
+        self.node.set_nonce(address, nonce)
+        return True
+
+    def _hardhat_set_code(self, params: tuple[JSON, ...]) -> JSON:
+        address, code = structure(tuple[Address, bytes], params)
+        self.node.set_code(address, code)
+        return True
+
+    def _hardhat_set_storage_at(self, params: tuple[JSON, ...]) -> JSON:
+        # The value is a 32-byte word, not a quantity
+        address, slot, value = structure(
+            tuple[Address, int, bytes], _quantities_to_hex(params[:2]) + params[2:]
+        )
+        if len(value) != _WORD_SIZE:
+            raise ValidationError(
+                f"The storage value must be {_WORD_SIZE} bytes long, got {len(value)}"
+            )
+        self.node.set_storage_at(address, slot, int.from_bytes(value, byteorder="big"))
+        return True
+
+
+def _quantities_to_hex(params: tuple[JSON, ...]) -> tuple[JSON, ...]:
+    # Development methods like `evm_*` are often called with integers
+    # instead of the hex-encoded quantities.
+    return tuple(
+        hex(param) if isinstance(param, int) and not isinstance(param, bool) else param
+        for param in params
+    )
+
+
+def _unstructure_profile(profile: ExecutionProfile) -> JSON:
+    # `unstructure()` does not support floats, so the times are added manually.
+    # The quantities are hex-encoded, as everywhere else in the API.
+    return {
+        "gas": unstructure(profile.gas),
+        "time": profile.time,
+        "success": profile.success,
+        "opcodes": [
+            {
+                "mnemonic": opcode.mnemonic,
+                "count": unstructure(opcode.count),
+                "gas": unstructure(opcode.gas),
+                "time": opcode.time,
+            }
+            for opcode in profile.opcodes
+        ],
+        "contracts": [
+            {
+                "address": unstructure(contract.address),
+                "calls": unstructure(contract.calls),
+                "gas": unstructure(contract.gas),
+                "time": contract.time,
+            }
+            for contract in profile.contracts
+        ],
+        "callFrames": [
+            {
+                "depth": unstructure(frame.depth),
+                "address": unstructure(frame.address),
+                "gas": unstructure(frame.gas),
+                "time": frame.time,
+                "success": frame.success,
+            }
+            for frame in profile.call_frames
+        ],
+    }
+
+
+def _unstructure_state_diff(state_diff: StateDiff) -> JSON:
+    # Follows the `stateDiff` format of Parity/OpenEthereum `trace_*` methods:
+    # each field is either "=" (unchanged), `{"+": new}` (account created),
+    # `{"-": old}` (account deleted), or `{"*": {"from": old, "to": new}}`.
+    return {
+        address.checksum: _unstructure_account_diff(account_diff)
+        for address, account_diff in state_diff.accounts.items()
+    }
+
+
+def _unstructure_field_diff(old: None | JSON, new: None | JSON) -> JSON:
+    if old is None:
+        return {"+": new}
+    if new is None:
+        return {"-": old}
+    if old == new:
+        return "="
+    return {"*": {"from": old, "to": new}}
+
+
+def _unstructure_word(value: int) -> str:
+    return "0x" + value.to_bytes(_WORD_SIZE, byteorder="big").hex()
+
+
+def _unstructure_account_diff(account_diff: AccountDiff) -> JSON:
+    old, new = account_diff.old, account_diff.new
+    fields: dict[str, JSON] = {
+        name: _unstructure_field_diff(
+            None if old is None else unstructure(getattr(old, name)),
+            None if new is None else unstructure(getattr(new, name)),
+        )
+        for name in ("balance", "nonce", "code")
+    }
+
+    # The storage of a created or deleted account is reported as created or deleted as well.
+    old_storage = (old.storage if old is not None else None) or {}
+    new_storage = (new.storage if new is not None else None) or {}
+    fields["storage"] = {
+        _unstructure_word(slot): _unstructure_field_diff(
+            None if old is None else _unstructure_word(old_storage.get(slot, 0)),
+            None if new is None else _unstructure_word(new_storage.get(slot, 0)),
+        )
+        for slot in sorted(old_storage.keys() | new_storage.keys())
+    }
+    return fields
+
+
+@contextmanager
+def translate_rpc_errors() -> Iterator[None]:
+    """Converts the exceptions raised by :py:class:`Node` into RPC errors."""
+    try:
+        yield
+
+    except (BlockNotFound, TransactionNotFound) as exc:
+        # If we didn't process it earlier, it's a SERVER_ERROR
+        raise RPCError.with_code(RPCErrorCode.SERVER_ERROR, str(exc)) from exc
+
+    except (FilterNotFound, IndexNotFound) as exc:
+        # That's what the providers seem to return.
+        raise RPCError.with_code(RPCErrorCode.METHOD_NOT_FOUND, str(exc)) from exc
+
+    except (StructuringError, ValidationError) as exc:
+        raise RPCError.with_code(RPCErrorCode.INVALID_PARAMETER, str(exc)) from exc
+
+    except UnstructuringError as exc:
+        raise RPCError.with_code(RPCErrorCode.SERVER_ERROR, str(exc)) from exc
+
+    except TransactionReverted as exc:
+        reason_data = exc.args[0]
+
+        if reason_data == b"":
+            # Empty `revert()`, or `require()` without a message.
+
+            # who knows why it's different in this specific case,
+            # but that's how Infura and Quicknode work
+            error = RPCErrorCode.SERVER_ERROR
+
+            message = "execution reverted"
+            data = None
+
+        else:
+            error = RPCErrorCode.EXECUTION_ERROR
+            message = "execution reverted"
+            data = reason_data
+
+        raise RPCError.with_code(error, message, data) from exc
+
+    except TransactionFailed as exc:
+        raise RPCError.with_code(RPCErrorCode.SERVER_ERROR, exc.args[0]) from exc
@@ -0,0 +1,260 @@
+"""
+A flat snapshot of the recent states, used to read accounts and storage
+without walking the state tries.
+"""
+
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Mapping
+
+import rlp  # type: ignore[import-untyped]
+from eth.constants import BLANK_ROOT_HASH
+from eth.rlp.accounts import Account
+from ethereum_rpc import keccak
+
+from ._trie import diff_tries, get_trie_value
+
+# The number of the latest state changes kept as separate layers
+# (reading a state older than that falls back to the tries).
+MAX_DIFF_LAYERS = 16
+
+# The number of the base state entries of each kind (accounts and storage values)
+# kept in memory; the least recently used ones are dropped beyond that.
+MAX_CACHED_ENTRIES = 2**16
+
+
+class StateChanges:
+    """
+    The changes between two states, keyed by the hashed addresses
+    (and the hashed addresses concatenated with the hashed slots for the storage).
+    The values are ``(old, new)`` pairs of the RLP-encoded accounts and storage values,
+    with ``None`` meaning the entry does not exist.
+    """
+
+    def __init__(
+        self,
+        accounts: dict[bytes, tuple[None | bytes, None | bytes]],
+        storage: dict[bytes, tuple[None | bytes, None | bytes]],
+    ):
+        self.accounts = accounts
+        self.storage = storage
+
+    @classmethod
+    def between(cls, db: Mapping[bytes, bytes], old_root: bytes, new_root: bytes) -> "StateChanges":
+        """Finds the changes between two states by comparing their tries."""
+        accounts = {}
+        storage = {}
+        for account_key, old_account, new_account in diff_tries(db, old_root, new_root):
+            accounts[account_key] = (old_account, new_account)
+            old_storage_root = _storage_root(old_account)
+            new_storage_root = _storage_root(new_account)
+            for slot_key, old_value, new_value in diff_tries(
+                db, old_storage_root, new_storage_root
+            ):
+                storage[account_key + slot_key] = (old_value, new_value)
+        return cls(accounts, storage)
+
+
+class _EntryCache:
+    """
+    A bounded cache of the RLP-encoded entries at the base state
+    (``None`` meaning the entry does not exist), evicting the least recently used ones.
+    Not thread-safe, so the owner must serialize the access.
+    """
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._entries: OrderedDict[bytes, None | bytes] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: bytes) -> tuple[bool, None | bytes]:
+        # Returns a flag indicating whether the entry is cached, and the value.
+        if key not in self._entries:
+            return False, None
+        self._entries.move_to_end(key)
+        return True, self._entries[key]
+
+    def put(self, key: bytes, value: None | bytes) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: bytes) -> None:
+        self._entries.pop(key, None)
+
+
+def _storage_root(encoded_account: None | bytes) -> bytes:
+    if encoded_account is None:
+        return BLANK_ROOT_HASH
+    _nonce, _balance, storage_root, _code_hash = rlp.decode(encoded_account)
+    return storage_root  # type: ignore[no-any-return]
+
+
+class StateSnapshot:
+    """
+    The flat key-value view of the latest state, and the changes made by
+    the last several blocks, so that the accounts and the storage at any of these states
+    can be read with a few dictionary lookups.
+
+    The base layer is filled lazily: an entry that was not changed by any of the layers
+    is read from the latest state trie on the first request.
+    """
+
+    def __init__(self, state_root: bytes):
+        # The snapshot may be read concurrently with adding layers,
+        # so the layers are replaced as a whole instead of being modified.
+        self._roots: tuple[bytes, ...] = (state_root,)
+        # The changes between consecutive roots
+        self._diffs: tuple[StateChanges, ...] = ()
+
+        # The recently requested entries at the oldest root.
+        self._accounts = _EntryCache(MAX_CACHED_ENTRIES)
+        self._storage = _EntryCache(MAX_CACHED_ENTRIES)
+        # Incremented every time the base root changes,
+        # so that the entries read for an outdated base are not saved.
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __copy__(self) -> "StateSnapshot":
+        # The base entries are only a cache of the trie reads, so the copy starts without them
+        # (copying them would take time and memory proportional to the accessed state).
+        obj = StateSnapshot(self._roots[0])
+        with self._lock:
+            obj._roots = self._roots
+            obj._diffs = self._diffs
+        return obj
+
+    @property
+    def latest_root(self) -> bytes:
+        return self._roots[-1]
+
+    def get_changes(self, old_root: bytes, new_root: bytes) -> None | StateChanges:
+        """
+        Returns the changes between two states if they are consecutive layers
+        of the snapshot (or the same state), and ``None`` otherwise.
+        """
+        if old_root == new_root:
+            return StateChanges({}, {})
+        with self._lock:
+            roots, diffs = self._roots, self._diffs
+        for index, changes in enumerate(diffs):
+            if roots[index] == old_root and roots[index + 1] == new_root:
+                return changes
+        return None
+
+    def add_layer(self, db: Mapping[bytes, bytes], state_root: bytes) -> StateChanges:
+        """Records the changes from the latest state to the new one, and returns them."""
+        changes = StateChanges.between(db, self.latest_root, state_root)
+        if state_root == self.latest_root:
+            return changes
+
+        with self._lock:
+            roots = (*self._roots, state_root)
+            diffs = (*self._diffs, changes)
+            if len(diffs) > MAX_DIFF_LAYERS:
+                # The oldest layer becomes the base. Its changes are not copied into the caches
+                # (that would fill them with entries nobody asked for), only the outdated entries
+                # are dropped, to be read from the latest state again on request.
+                oldest = diffs[0]
+                for key in oldest.accounts:
+                    self._accounts.discard(key)
+                for key in oldest.storage:
+                    self._storage.discard(key)
+                roots = roots[1:]
+                diffs = diffs[1:]
+                self._generation += 1
+            self._roots, self._diffs = roots, diffs
+
+        return changes
+
+    def _lookup(
+        self,
+        state_root: bytes,
+        key: bytes,
+        get_changes: Callable[[StateChanges], Mapping[bytes, tuple[None | bytes, None | bytes]]],
+        base: _EntryCache,
+        read_latest: Callable[[bytes], None | bytes],
+    ) -> tuple[bool, None | bytes]:
+        # Returns a flag indicating whether the state is in the snapshot, and the value.
+        with self._lock:
+            roots, diffs, generation = self._roots, self._diffs, self._generation
+
+        if state_root not in roots:
+            return False, None
+        # The same root can appear several times if a state was returned to;
+        # any of them can be used.
+        index = roots.index(state_root)
+
+        # The latest change made at or before the requested state
+        for changes in reversed(diffs[:index]):
+            entries = get_changes(changes)
+            if key in entries:
+                return True, entries[key][1]
+
+        # The state before the earliest change made after the requested state
+        for changes in diffs[index:]:
+            entries = get_changes(changes)
+            if key in entries:
+                return True, entries[key][0]
+
+        # Not changed by any of the layers, so it is the same in all of them.
+        with self._lock:
+            cached, value = base.get(key)
+        if cached:
+            return True, value
+        value = read_latest(roots[-1])
+        with self._lock:
+            if generation == self._generation:
+                base.put(key, value)
+        return True, value
+
+    def get_account(
+        self, db: Mapping[bytes, bytes], state_root: bytes, address: bytes
+    ) -> None | Account:
+        """
+        Returns the account at the given state,
+        or ``None`` if the state is not one of the snapshot's states.
+        """
+        account_key = keccak(address)
+        found, encoded_account = self._lookup(
+            state_root,
+            account_key,
+            lambda changes: changes.accounts,
+            self._accounts,
+            lambda latest_root: get_trie_value(db, latest_root, account_key),
+        )
+        if not found:
+            return None
+        if encoded_account is None:
+            return Account()
+        return rlp.decode(encoded_account, sedes=Account)  # type: ignore[no-any-return]
+
+    def get_storage(
+        self, db: Mapping[bytes, bytes], state_root: bytes, address: bytes, slot: int
+    ) -> None | int:
+        """
+        Returns the storage value at the given state,
+        or ``None`` if the state is not one of the snapshot's states.
+        """
+        account_key = keccak(address)
+        slot_key = keccak(slot.to_bytes(32, byteorder="big"))
+
+        def read_latest(latest_root: bytes) -> None | bytes:
+            encoded_account = get_trie_value(db, latest_root, account_key)
+            return get_trie_value(db, _storage_root(encoded_account), slot_key)
+
+        found, encoded_value = self._lookup(
+            state_root,
+            account_key + slot_key,
+            lambda changes: changes.storage,
+            self._storage,
+            read_latest,
+        )
+        if not found:
+            return None
+        if encoded_value is None:
+            return 0
+        return rlp.decode(encoded_value, sedes=rlp.sedes.big_endian_int)  # type: ignore[no-any-return]
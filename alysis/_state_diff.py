@@ -0,0 +1,33 @@
+from collections.abc import Mapping
+from dataclasses import dataclass
+
+from ethereum_rpc import Address
+
+from ._account import AccountState
+
+
+@dataclass(frozen=True)
+class AccountDiff:
+    """
+    The change of an account made by a block.
+
+    The balance, the nonce and the code of the account states are always set;
+    the storage only contains the slots that were changed.
+    """
+
+    old: None | AccountState
+    """The account before the block, or ``None`` if it did not exist."""
+
+    new: None | AccountState
+    """The account after the block, or ``None`` if it was deleted."""
+
+
+@dataclass(frozen=True)
+class StateDiff:
+    """The changes made to the state by a block."""
+
+    block_number: int
+    """The number of the block."""
+
+    accounts: Mapping[Address, AccountDiff]
+    """The changed accounts."""
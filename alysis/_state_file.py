@@ -0,0 +1,161 @@
+"""
+A binary file format for saving a chain state.
+
+The file consists of:
+
+- a header: the format signature, the length of the metadata, and the number of entries;
+- the metadata (JSON-encoded);
+- the index of the database entries: a sequence of fixed-size records
+  (key, offset of the value, length of the value), sorted by key;
+- the values of the entries.
+
+All the integers are little-endian. The keys are 32-byte hashes of the values
+(trie nodes and contract codes).
+"""
+
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from collections.abc import Iterator, Mapping, Sequence
+from pathlib import Path
+from typing import Any
+
+from ._exceptions import ValidationError
+
+_SIGNATURE = b"ALYSIS\x00\x01"  # The last byte is the format version
+
+# signature, metadata length, number of entries
+_HEADER = struct.Struct("<8sIQ")
+
+# key, value offset (relative to the start of the values section), value length
+_INDEX_ENTRY = struct.Struct("<32sQI")
+
+KEY_LENGTH = 32
+
+_INVALID_FILE_MESSAGE = "Not a state file, or the format version is not supported"
+
+_CORRUPTED_FILE_MESSAGE = "The state file is truncated or corrupted"
+
+
+def write_state_file(
+    path: str | Path, metadata: Mapping[str, Any], entries: Mapping[bytes, bytes]
+) -> None:
+    """Saves the metadata and the database entries to a file."""
+    encoded_metadata = json.dumps(metadata).encode()
+    keys = sorted(entries)
+
+    with Path(path).open("wb") as file:
+        file.write(_HEADER.pack(_SIGNATURE, len(encoded_metadata), len(keys)))
+        file.write(encoded_metadata)
+
+        offset = 0
+        for key in keys:
+            if len(key) != KEY_LENGTH:
+                raise ValueError(f"Invalid key length: {len(key)}")
+            length = len(entries[key])
+            file.write(_INDEX_ENTRY.pack(key, offset, length))
+            offset += length
+
+        for key in keys:
+            file.write(entries[key])
+
+
+class StateFile(Mapping[bytes, bytes]):
+    """
+    Read-only access to the entries of a state file.
+
+    The file is memory-mapped, and the entries are looked up in the index by binary search,
+    so opening the file takes constant time, and only the accessed entries
+    are read from the disk.
+    The file must not be modified while the object is alive.
+
+    If ``required_metadata`` is given, the metadata must have all of its fields
+    with the values of the corresponding types.
+    """
+
+    def __init__(self, path: str | Path, required_metadata: None | Mapping[str, type] = None):
+        with Path(path).open("rb") as file:
+            file_size = os.fstat(file.fileno()).st_size
+            if file_size < _HEADER.size:
+                raise ValidationError(_INVALID_FILE_MESSAGE)
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        signature, metadata_length, entries_num = _HEADER.unpack_from(self._data)
+        if signature != _SIGNATURE:
+            raise ValidationError(_INVALID_FILE_MESSAGE)
+
+        metadata_start = _HEADER.size
+        self._index_start = metadata_start + metadata_length
+        self._values_start = self._index_start + entries_num * _INDEX_ENTRY.size
+        self._entries_num: int = entries_num
+
+        if self._values_start > file_size:
+            raise ValidationError(_CORRUPTED_FILE_MESSAGE)
+        # The values are written in the order of the keys,
+        # so the last entry in the index is the last one in the file.
+        if entries_num > 0:
+            _key, offset, length = _INDEX_ENTRY.unpack_from(
+                self._data, self._values_start - _INDEX_ENTRY.size
+            )
+            if self._values_start + offset + length > file_size:
+                raise ValidationError(_CORRUPTED_FILE_MESSAGE)
+
+        try:
+            metadata = json.loads(self._data[metadata_start : self._index_start])
+        except ValueError as exc:  # Includes JSON and UTF-8 decoding errors
+            raise ValidationError(_CORRUPTED_FILE_MESSAGE) from exc
+        if not isinstance(metadata, dict):
+            raise ValidationError(_CORRUPTED_FILE_MESSAGE)
+        for field, field_type in (required_metadata or {}).items():
+            value = metadata.get(field)
+            # `bool` is a subclass of `int`, but never a valid value for it
+            if not isinstance(value, field_type) or isinstance(value, bool):
+                raise ValidationError(
+                    f"{_CORRUPTED_FILE_MESSAGE}: the metadata field `{field}` "
+                    f"is missing or is not of type `{field_type.__name__}`"
+                )
+        self.metadata: dict[str, Any] = metadata
+
+    def _key(self, position: int) -> bytes:
+        offset = self._index_start + position * _INDEX_ENTRY.size
+        return self._data[offset : offset + KEY_LENGTH]
+
+    def _find(self, key: bytes) -> None | int:
+        # `bisect` only needs `__getitem__` and `__len__` from the sequence,
+        # so we can avoid creating the list of keys.
+        position = bisect_left(_IndexKeys(self), key)
+        if position < self._entries_num and self._key(position) == key:
+            return position
+        return None
+
+    def __getitem__(self, key: bytes) -> bytes:
+        position = self._find(key)
+        if position is None:
+            raise KeyError(key)
+        _key, offset, length = _INDEX_ENTRY.unpack_from(
+            self._data, self._index_start + position * _INDEX_ENTRY.size
+        )
+        start = self._values_start + offset
+        return self._data[start : start + length]
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, bytes) and self._find(key) is not None
+
+    def __iter__(self) -> Iterator[bytes]:
+        return (self._key(position) for position in range(self._entries_num))
+
+    def __len__(self) -> int:
+        return self._entries_num
+
+
+class _IndexKeys(Sequence[bytes]):
+    def __init__(self, state_file: StateFile):
+        self._state_file = state_file
+
+    def __getitem__(self, position: int) -> bytes:  # type: ignore[override]
+        return self._state_file._key(position)  # noqa: SLF001
+
+    def __len__(self) -> int:
+        return len(self._state_file)
@@ -0,0 +1,29 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class StorageEntry:
+    """A storage slot of an account."""
+
+    key: bytes
+    """The hash of the slot (the storage trie is ordered by these)."""
+
+    slot: None | int
+    """The slot, if it is known (that is, it was written to by this node)."""
+
+    value: int
+    """The value stored in the slot."""
+
+
+@dataclass(frozen=True)
+class StorageRange:
+    """A part of an account's storage, ordered by the hashed slots."""
+
+    entries: tuple[StorageEntry, ...]
+    """The entries of the range."""
+
+    next_key: None | bytes
+    """
+    The hashed slot to start the next range from,
+    or ``None`` if there are no more entries.
+    """
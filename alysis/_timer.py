@@ -0,0 +1,35 @@
+import threading
+import weakref
+from collections.abc import Callable
+
+
+class RepeatingTimer:
+    """
+    Calls a method every ``interval`` seconds in a background thread, until stopped.
+
+    Only a weak reference to the method's object is kept, so the timer does not prevent it
+    from being garbage collected (the thread exits when that happens).
+    """
+
+    def __init__(self, interval: float, method: Callable[[], object]):
+        self._interval = interval
+        self._method = weakref.WeakMethod(method)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._interval):
+            method = self._method()
+            if method is None:
+                return
+            method()
+            # Do not keep the object alive while waiting
+            del method
+
+    def stop(self) -> None:
+        """
+        Stops the timer. Does not wait for the thread to finish,
+        so a call that has already started may still complete.
+        """
+        self._stopped.set()
@@ -0,0 +1,174 @@
+"""Gas and time profiling of the EVM execution in PyEVM."""
+
+from collections.abc import Callable
+from time import perf_counter
+from typing import Any, ClassVar, cast
+
+from eth.abc import ComputationAPI, MessageAPI, OpcodeAPI, StateAPI, TransactionContextAPI
+from ethereum_rpc import Address
+
+from ._profile import CallFrameProfile, ContractProfile, ExecutionProfile, OpcodeProfile
+
+
+class _Frame:
+    def __init__(self, depth: int, address: bytes):
+        self.depth = depth
+        self.address = address
+        # The gas and time spent in the nested frames
+        self.nested_gas = 0
+        self.nested_time = 0.0
+
+
+class _OpcodeStats:
+    def __init__(self) -> None:
+        self.count = 0
+        self.gas = 0
+        self.time = 0.0
+
+
+class _ContractStats:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.gas = 0
+        self.time = 0.0
+
+
+class ProfileCollector:
+    """Accumulates the statistics of an execution."""
+
+    def __init__(self) -> None:
+        self._stack: list[_Frame] = []
+        self._opcodes: dict[str, _OpcodeStats] = {}
+        self._contracts: dict[bytes, _ContractStats] = {}
+        self._call_frames: list[CallFrameProfile] = []
+        # The indices of the call frame records for the frames in the stack,
+        # since the records are finalized on exit but must be ordered by entry.
+        self._call_frame_indices: list[int] = []
+        self._root_gas = 0
+        self._root_time = 0.0
+        self._root_success = True
+
+    def _enter_frame(self, message: MessageAPI) -> None:
+        self._stack.append(_Frame(message.depth, message.code_address))
+        self._call_frame_indices.append(len(self._call_frames))
+        # A placeholder, to be replaced on exit
+        self._call_frames.append(cast("CallFrameProfile", None))
+
+    def _exit_frame(self, gas: int, time: float, *, success: bool) -> None:
+        frame = self._stack.pop()
+        index = self._call_frame_indices.pop()
+        self._call_frames[index] = CallFrameProfile(
+            depth=frame.depth,
+            address=Address(frame.address),
+            gas=gas,
+            time=time,
+            success=success,
+        )
+
+        contract = self._contracts.setdefault(frame.address, _ContractStats())
+        contract.calls += 1
+        contract.gas += gas - frame.nested_gas
+        contract.time += time - frame.nested_time
+
+        if self._stack:
+            parent = self._stack[-1]
+            parent.nested_gas += gas
+            parent.nested_time += time
+        else:
+            self._root_gas = gas
+            self._root_time = time
+            self._root_success = success
+
+    def _wrap_opcode(self, opcode_fn: OpcodeAPI) -> Callable[..., None]:
+        try:
+            mnemonic = opcode_fn.mnemonic
+        except AttributeError:
+            # Some opcodes are wrapped in decorators
+            mnemonic = opcode_fn.__wrapped__.mnemonic  # type: ignore[attr-defined]
+
+        stats = self._opcodes.setdefault(mnemonic, _OpcodeStats())
+        stack = self._stack
+
+        def profiled_opcode(computation: ComputationAPI) -> None:
+            frame = stack[-1]
+            gas_before = computation.get_gas_remaining()
+            nested_gas_before = frame.nested_gas
+            nested_time_before = frame.nested_time
+            start = perf_counter()
+            try:
+                opcode_fn(computation=computation)
+            finally:
+                # Halting opcodes raise exceptions, so the stats must be updated regardless
+                time = perf_counter() - start
+                stats.count += 1
+                stats.gas += (
+                    gas_before
+                    - computation.get_gas_remaining()
+                    - (frame.nested_gas - nested_gas_before)
+                )
+                stats.time += time - (frame.nested_time - nested_time_before)
+
+        return profiled_opcode
+
+    def make_computation_class(
+        self, computation_class: type[ComputationAPI]
+    ) -> type[ComputationAPI]:
+        """
+        Returns a subclass of the given computation class collecting the statistics
+        into this object.
+        """
+        collector = self
+        base_class: Any = computation_class
+
+        class ProfilingComputation(base_class):  # type: ignore[misc]
+            opcodes: ClassVar[dict[int, Callable[..., None]]] = {
+                opcode: collector._wrap_opcode(opcode_fn)
+                for opcode, opcode_fn in computation_class.opcodes.items()
+            }
+
+            @classmethod
+            def apply_computation(
+                cls,
+                state: StateAPI,
+                message: MessageAPI,
+                transaction_context: TransactionContextAPI,
+                parent_computation: None | ComputationAPI = None,
+            ) -> ComputationAPI:
+                collector._enter_frame(message)
+                start = perf_counter()
+                computation = cast(
+                    "ComputationAPI",
+                    super().apply_computation(
+                        state, message, transaction_context, parent_computation
+                    ),
+                )
+                collector._exit_frame(
+                    message.gas - computation.get_gas_remaining(),
+                    perf_counter() - start,
+                    success=computation.is_success,
+                )
+                return computation
+
+        return ProfilingComputation
+
+    def profile(self) -> ExecutionProfile:
+        """Returns the accumulated statistics."""
+        opcodes = [
+            OpcodeProfile(mnemonic=mnemonic, count=stats.count, gas=stats.gas, time=stats.time)
+            for mnemonic, stats in self._opcodes.items()
+            if stats.count > 0
+        ]
+        contracts = [
+            ContractProfile(
+                address=Address(address), calls=stats.calls, gas=stats.gas, time=stats.time
+            )
+            for address, stats in self._contracts.items()
+        ]
+        return ExecutionProfile(
+            gas=self._root_gas,
+            time=self._root_time,
+            success=self._root_success,
+            opcodes=tuple(sorted(opcodes, key=lambda profile: profile.gas, reverse=True)),
+            contracts=tuple(sorted(contracts, key=lambda profile: profile.gas, reverse=True)),
+            call_frames=tuple(self._call_frames),
+        )
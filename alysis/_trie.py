@@ -0,0 +1,366 @@
+"""Low-level construction and traversal of the Merkle Patricia tries in the PyEVM database."""
+
+from collections.abc import Iterator, Mapping, MutableMapping, Sequence
+from itertools import groupby
+from typing import Any
+
+import rlp  # type: ignore[import-untyped]
+from eth.constants import BLANK_ROOT_HASH, EMPTY_SHA3
+from eth.typing import AccountDetails
+from eth_typing import Address as EthAddress
+from ethereum_rpc import keccak
+
+from ._exceptions import ValidationError
+
+_HASH_LENGTH = 32
+
+
+def _decode_node(
+    db: Mapping[bytes, bytes], reference: Any, visited: set[bytes]
+) -> None | list[Any]:
+    # A node is referenced either by its hash (if its RLP encoding is 32 bytes or longer),
+    # or embedded into its parent.
+    if isinstance(reference, list):
+        return reference
+    if reference == b"" or reference in visited:
+        return None
+    visited.add(reference)
+    if reference == BLANK_ROOT_HASH:
+        return None
+    return rlp.decode(db[reference])  # type: ignore[no-any-return]
+
+
+def walk_trie(db: Mapping[bytes, bytes], root_hash: bytes, visited: set[bytes]) -> Iterator[bytes]:
+    """
+    Walks the trie with the given root, adding the hashes of all the encountered nodes
+    to ``visited``, and yielding the values stored in the trie.
+
+    Subtries whose root hashes are already in ``visited`` are skipped,
+    so walking several tries sharing the same ``visited`` set
+    yields the values of each shared subtrie only once.
+    """
+    stack = [root_hash]
+    while stack:
+        node = _decode_node(db, stack.pop(), visited)
+        if node is None:
+            continue
+
+        if len(node) == 17:
+            # A branch node: 16 children and an optional value
+            stack.extend(child for child in node[:16] if child != b"")
+            if node[16] != b"":
+                yield node[16]
+        # A leaf or an extension node; the lowest bit of the first nibble of the path
+        # is the parity of the path length, and the second lowest bit indicates a leaf.
+        elif node[0][0] & 0x20:
+            yield node[1]
+        else:
+            stack.append(node[1])
+
+
+def walk_state(
+    db: Mapping[bytes, bytes], state_root: bytes, visited: set[bytes]
+) -> Iterator[bytes]:
+    """
+    Walks the account trie with the given root, the storage tries of the accounts,
+    and their codes, adding all the encountered database keys to ``visited``.
+    Yields the RLP-encoded accounts.
+    """
+    for encoded_account in walk_trie(db, state_root, visited):
+        _nonce, _balance, storage_root, code_hash = rlp.decode(encoded_account)
+        for _value in walk_trie(db, storage_root, visited):
+            pass
+        visited.add(code_hash)
+        yield encoded_account
+
+
+def _to_nibbles(key: bytes) -> bytes:
+    return bytes(nibble for byte in key for nibble in divmod(byte, 16))
+
+
+def _from_nibbles(nibbles: bytes) -> bytes:
+    return bytes(nibbles[i] * 16 + nibbles[i + 1] for i in range(0, len(nibbles), 2))
+
+
+def _decode_hex_prefix(encoded: bytes) -> tuple[bytes, bool]:
+    # The reverse of `_encode_hex_prefix()`
+    nibbles = _to_nibbles(encoded)
+    flags = nibbles[0]
+    is_leaf = flags & 2 != 0
+    return (nibbles[1:] if flags & 1 else nibbles[2:]), is_leaf
+
+
+def _load_node(db: Mapping[bytes, bytes], reference: Any) -> None | list[Any]:
+    if isinstance(reference, list):
+        return reference
+    if reference in (b"", BLANK_ROOT_HASH):
+        return None
+    return rlp.decode(db[reference])  # type: ignore[no-any-return]
+
+
+def get_trie_value(db: Mapping[bytes, bytes], root_hash: bytes, key: bytes) -> None | bytes:
+    """Returns the value stored under ``key`` in the trie with the given root, if any."""
+    path = _to_nibbles(key)
+    depth = 0
+    node = _load_node(db, root_hash)
+    while node is not None:
+        if len(node) == 17:
+            if depth == len(path):
+                return node[16] or None
+            node = _load_node(db, node[path[depth]])
+            depth += 1
+            continue
+
+        nibbles, is_leaf = _decode_hex_prefix(node[0])
+        if path[depth : depth + len(nibbles)] != nibbles:
+            return None
+        depth += len(nibbles)
+        if is_leaf:
+            return node[1] if depth == len(path) else None
+        node = _load_node(db, node[1])
+
+    return None
+
+
+def _iterate_from(
+    db: Mapping[bytes, bytes], reference: Any, prefix: bytes, start: bytes
+) -> Iterator[tuple[bytes, bytes]]:
+    # Yields the (full path, value) pairs of the subtrie in order, skipping the paths
+    # below `prefix + start` (if `start` is empty, all the items are yielded).
+    node = _load_node(db, reference)
+    if node is None:
+        return
+
+    if len(node) == 17:
+        if node[16] != b"" and not start:
+            yield prefix, node[16]
+        for nibble, child in enumerate(node[:16]):
+            if start and nibble < start[0]:
+                continue
+            child_start = start[1:] if start and nibble == start[0] else b""
+            yield from _iterate_from(db, child, prefix + bytes([nibble]), child_start)
+        return
+
+    nibbles, is_leaf = _decode_hex_prefix(node[0])
+    child_start = b""
+    if start:
+        head = start[: len(nibbles)]
+        if nibbles[: len(head)] < head:
+            return
+        if nibbles[: len(head)] == head:
+            child_start = start[len(nibbles) :]
+
+    if is_leaf:
+        yield prefix + nibbles, node[1]
+    else:
+        yield from _iterate_from(db, node[1], prefix + nibbles, child_start)
+
+
+def iterate_trie(
+    db: Mapping[bytes, bytes], root_hash: bytes, start_key: bytes
+) -> Iterator[tuple[bytes, bytes]]:
+    """
+    Yields the key-value pairs of the trie with the keys not less than ``start_key``,
+    in the order of keys. The nodes are only read as the iteration progresses.
+    """
+    for path, value in _iterate_from(db, root_hash, b"", _to_nibbles(start_key)):
+        yield _from_nibbles(path), value
+
+
+def _walk_items(
+    db: Mapping[bytes, bytes], reference: Any, prefix: bytes
+) -> Iterator[tuple[bytes, bytes]]:
+    # Yields the (full path, value) pairs of the subtrie
+    node = _load_node(db, reference)
+    if node is None:
+        return
+    if len(node) == 17:
+        if node[16] != b"":
+            yield prefix, node[16]
+        for nibble, child in enumerate(node[:16]):
+            yield from _walk_items(db, child, prefix + bytes([nibble]))
+        return
+    nibbles, is_leaf = _decode_hex_prefix(node[0])
+    if is_leaf:
+        yield prefix + nibbles, node[1]
+    else:
+        yield from _walk_items(db, node[1], prefix + nibbles)
+
+
+def _as_branch(node: list[Any]) -> tuple[list[Any], bytes]:
+    # Represents a branch or an extension node as 16 children and a value.
+    # An extension is turned into a branch with a single child,
+    # which is an extension with the rest of the path (or the original child).
+    if len(node) == 17:
+        return node[:16], node[16]
+    nibbles, _is_leaf = _decode_hex_prefix(node[0])
+    children: list[Any] = [b""] * 16
+    if len(nibbles) == 1:
+        children[nibbles[0]] = node[1]
+    else:
+        children[nibbles[0]] = [_encode_hex_prefix(nibbles[1:], is_leaf=False), node[1]]
+    return children, b""
+
+
+def _is_leaf(node: list[Any]) -> bool:
+    return len(node) == 2 and _decode_hex_prefix(node[0])[1]
+
+
+def _diff_nodes(
+    db: Mapping[bytes, bytes], old_reference: Any, new_reference: Any, prefix: bytes
+) -> Iterator[tuple[bytes, None | bytes, None | bytes]]:
+    # Identical references (hashes or embedded nodes) mean identical subtries
+    if old_reference == new_reference:
+        return
+
+    old_node = _load_node(db, old_reference)
+    new_node = _load_node(db, new_reference)
+
+    if old_node is None or new_node is None or _is_leaf(old_node) or _is_leaf(new_node):
+        # One of the sides has at most one item, so the other side's items
+        # are either all added/removed, or all but one of them are.
+        old_items = dict(_walk_items(db, old_reference, prefix))
+        new_items = dict(_walk_items(db, new_reference, prefix))
+        for path in old_items.keys() | new_items.keys():
+            old_value = old_items.get(path)
+            new_value = new_items.get(path)
+            if old_value != new_value:
+                yield path, old_value, new_value
+        return
+
+    old_children, old_value = _as_branch(old_node)
+    new_children, new_value = _as_branch(new_node)
+    if old_value != new_value:
+        yield prefix, old_value or None, new_value or None
+    for nibble in range(16):
+        yield from _diff_nodes(
+            db, old_children[nibble], new_children[nibble], prefix + bytes([nibble])
+        )
+
+
+def diff_tries(
+    db: Mapping[bytes, bytes], old_root: bytes, new_root: bytes
+) -> Iterator[tuple[bytes, None | bytes, None | bytes]]:
+    """
+    Yields the ``(key, old value, new value)`` for every key whose value differs
+    between the two tries (``None`` meaning the key is not present).
+
+    The subtries shared by both tries are skipped, so the cost is proportional
+    to the number of changes rather than to the size of the tries.
+    """
+    for path, old_value, new_value in _diff_nodes(db, old_root, new_root, b""):
+        yield _from_nibbles(path), old_value, new_value
+
+
+def is_hash_key(key: bytes) -> bool:
+    """
+    Returns ``True`` if the key is a hash of the value
+    (as opposed to the keys of PyEVM's lookup tables).
+    """
+    return len(key) == _HASH_LENGTH
+
+
+def _encode_hex_prefix(nibbles: Sequence[int], *, is_leaf: bool) -> bytes:
+    flags = 2 if is_leaf else 0
+    if len(nibbles) % 2 == 1:
+        prefixed = [flags + 1, *nibbles]
+    else:
+        prefixed = [flags, 0, *nibbles]
+    return bytes(prefixed[i] * 16 + prefixed[i + 1] for i in range(0, len(prefixed), 2))
+
+
+def _store_node(db: MutableMapping[bytes, bytes], node: list[Any], *, is_root: bool = False) -> Any:
+    # Nodes shorter than a hash are embedded into their parent (but the root is always stored)
+    encoded = rlp.encode(node)
+    if len(encoded) < _HASH_LENGTH and not is_root:
+        return node
+    node_hash = keccak(encoded)
+    db[node_hash] = encoded
+    return node_hash
+
+
+def _build_node(
+    db: MutableMapping[bytes, bytes],
+    items: Sequence[tuple[bytes, bytes]],
+    depth: int,
+    *,
+    is_root: bool = False,
+) -> Any:
+    # `items` are the sorted (nibbles, value) pairs with the common prefix of length `depth`.
+    # All the keys are assumed to be of the same length.
+    first_key = items[0][0]
+    if len(items) == 1:
+        node = [_encode_hex_prefix(first_key[depth:], is_leaf=True), items[0][1]]
+        return _store_node(db, node, is_root=is_root)
+
+    # Since the keys are sorted, the common prefix of the first and the last ones
+    # is the common prefix of all of them.
+    last_key = items[-1][0]
+    prefix_end = depth
+    while first_key[prefix_end] == last_key[prefix_end]:
+        prefix_end += 1
+
+    branch: list[Any] = [b""] * 17
+    for nibble, group in groupby(items, key=lambda item: item[0][prefix_end]):
+        branch[nibble] = _build_node(db, list(group), prefix_end + 1)
+
+    if prefix_end == depth:
+        return _store_node(db, branch, is_root=is_root)
+
+    branch_reference = _store_node(db, branch)
+    node = [_encode_hex_prefix(first_key[depth:prefix_end], is_leaf=False), branch_reference]
+    return _store_node(db, node, is_root=is_root)
+
+
+def build_trie(db: MutableMapping[bytes, bytes], items: Mapping[bytes, bytes]) -> bytes:
+    """
+    Writes the nodes of a trie containing the given key-value pairs into ``db``,
+    and returns the root hash. All the keys must be of the same length.
+
+    Unlike inserting the items one by one, every node is only encoded and hashed once.
+    """
+    if not items:
+        return BLANK_ROOT_HASH
+    nibble_items = sorted((_to_nibbles(key), value) for key, value in items.items())
+    return _build_node(db, nibble_items, 0, is_root=True)  # type: ignore[no-any-return]
+
+
+_MAX_UINT256 = 2**256 - 1
+
+
+def build_state(
+    db: MutableMapping[bytes, bytes], accounts: Mapping[EthAddress, AccountDetails]
+) -> bytes:
+    """
+    Writes the account trie, the storage tries and the codes of the given accounts
+    into ``db``, and returns the state root.
+    """
+    encoded_accounts = {}
+    for address, details in accounts.items():
+        if not 0 <= details["balance"] <= _MAX_UINT256:
+            raise ValidationError(f"Invalid balance for {address.hex()}: {details['balance']}")
+        if not 0 <= details["nonce"] <= _MAX_UINT256:
+            raise ValidationError(f"Invalid nonce for {address.hex()}: {details['nonce']}")
+        for slot, value in details["storage"].items():
+            if not (0 <= slot <= _MAX_UINT256 and 0 <= value <= _MAX_UINT256):
+                raise ValidationError(f"Invalid storage slot {slot} for {address.hex()}: {value}")
+
+        storage_root = build_trie(
+            db,
+            {
+                keccak(slot.to_bytes(32, byteorder="big")): rlp.encode(value)
+                for slot, value in details["storage"].items()
+                if value != 0
+            },
+        )
+
+        code = details["code"]
+        code_hash = keccak(code) if code else EMPTY_SHA3
+        if code:
+            db[code_hash] = code
+
+        encoded_accounts[keccak(address)] = rlp.encode(
+            [details["nonce"], details["balance"], storage_root, code_hash]
+        )
+
+    return build_trie(db, encoded_accounts)
@@ -0,0 +1,32 @@
+from collections.abc import Mapping
+from dataclasses import dataclass
+
+from ethereum_rpc import Address, TxInfo
+
+
+@dataclass(frozen=True)
+class TxPoolContent:
+    """The transactions waiting to be included in a block."""
+
+    pending: Mapping[Address, Mapping[int, TxInfo]]
+    """
+    The transactions that can be included in the next block, grouped by sender and nonce
+    (that is, the ones with nonces following the sender's current nonce without gaps).
+    """
+
+    queued: Mapping[Address, Mapping[int, TxInfo]]
+    """
+    The transactions that cannot be included yet because of a gap in the sender's nonces,
+    grouped by sender and nonce.
+    """
+
+
+@dataclass(frozen=True)
+class TxPoolStatus:
+    """The number of transactions waiting to be included in a block."""
+
+    pending: int
+    """The number of transactions that can be included in the next block."""
+
+    queued: int
+    """The number of transactions waiting for the preceding nonces to be used."""
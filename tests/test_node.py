@@ -1,6 +1,40 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import time
 from copy import deepcopy
 
-from alysis import RPCNode
+import pytest
+from eth_account import Account
+from ethereum_rpc import (
+    Address,
+    Amount,
+    BlockLabel,
+    EthCallParams,
+    FilterParams,
+    LogTopic,
+    RPCError,
+    TxHash,
+)
+
+import alysis._snapshot
+from alysis import (
+    AccountDiff,
+    AccountState,
+    AsyncNode,
+    AsyncRPCNode,
+    BlockNotFound,
+    FilterKind,
+    FilterNotFound,
+    Node,
+    RPCNode,
+    RPCRecorder,
+    TransactionNotFound,
+    ValidationError,
+    derive_accounts,
+    replay_rpc,
+)
 
 
 def transfer(rpc_node, signer, to, value, nonce):
@@ -22,6 +56,34 @@ def get_balance(rpc_node, account):
     return int(rpc_node.rpc("eth_getBalance", account.address, "latest"), 16)
 
 
+# Stores `block.timestamp` in the slot 0
+TIMESTAMP_CONTRACT_CODE = bytes.fromhex("4260005500")
+
+
+def call_contract(node, signer, contract, nonce):
+    tx = {
+        "type": 2,
+        "chainId": node.eth_chain_id(),
+        "to": contract.checksum,
+        "value": 0,
+        "gas": 100000,
+        "maxFeePerGas": int(node.eth_gas_price()),
+        "maxPriorityFeePerGas": 10**9,
+        "nonce": nonce,
+    }
+    return node.eth_send_raw_transaction(signer.sign_transaction(tx).raw_transaction)
+
+
+def get_stored_timestamp(node, contract):
+    return int.from_bytes(node.eth_get_storage_at(contract, 0, BlockLabel.LATEST), "big")
+
+
+def test_lazy_backend_import():
+    # py-evm is only imported when a node is created
+    code = "import sys, alysis; assert 'eth' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)  # noqa: S603
+
+
 def test_snapshots(node, root_account, another_account):
     rpc_node1 = RPCNode(node)
 
@@ -34,3 +96,913 @@ def test_snapshots(node, root_account, another_account):
     assert get_balance(rpc_node1, another_account) == 2 * 10**9
 
     assert get_balance(rpc_node2, another_account) == 10**9
+
+
+def test_snapshots_of_snapshots(root_account, another_account):
+    # The copies share the database entries written before copying,
+    # but each of them only sees its own changes.
+    node = Node(root_balance_wei=10**18, state_history=2, block_history=4)
+    nodes = [node]
+    for nonce in range(12):
+        transfer(RPCNode(nodes[-1]), root_account, another_account, 10**9, nonce)
+        nodes.append(deepcopy(nodes[-1]))
+
+    # Enough blocks to trigger a database cleanup in one of the copies
+    nodes[5].mine_blocks(100)
+
+    address = Address.from_hex(another_account.address)
+    for index, copied in enumerate(nodes):
+        assert copied.eth_get_balance(address, BlockLabel.LATEST) == min(index + 1, 12) * 10**9
+
+
+def test_increase_time(node, root_account):
+    contract = Address(b"\x01" * 20)
+    node.set_code(contract, TIMESTAMP_CONTRACT_CODE)
+
+    call_contract(node, root_account, contract, 0)
+    before = get_stored_timestamp(node, contract)
+
+    start = int(time.time())
+    node.increase_time(100000)
+    call_contract(node, root_account, contract, 1)
+    after = get_stored_timestamp(node, contract)
+
+    assert after >= start + 100000 > before
+    # The transactions see the timestamp of the block they are included in
+    latest = node.eth_get_block_by_number(BlockLabel.LATEST, with_transactions=False)
+    assert after == latest.timestamp
+
+
+def test_filter_buffer_size(root_account, another_account):
+    node = Node(root_balance_wei=10**18, filter_buffer_size=2)
+    rpc_node = RPCNode(node)
+    filter_id = node.eth_new_block_filter()
+
+    for nonce in range(3):
+        transfer(rpc_node, root_account, another_account, 10**9, nonce)
+
+    stats = node.filter_stats()[filter_id]
+    assert stats.kind == FilterKind.BLOCKS
+    assert stats.entries == 2
+    assert stats.dropped_entries == 1
+    assert stats.memory_bytes > 0
+
+    block_hashes = node.eth_get_filter_changes(filter_id)
+    assert block_hashes == [
+        node.eth_get_block_by_number(number, with_transactions=False).hash_ for number in (2, 3)
+    ]
+    assert node.filter_stats()[filter_id].dropped_entries == 0
+
+
+def test_filter_timeout(monkeypatch, node):
+    current_time = 1000.0
+    monkeypatch.setattr(time, "monotonic", lambda: current_time)
+
+    block_filter = node.eth_new_block_filter()
+    log_filter = node.eth_new_filter(
+        FilterParams(from_block=BlockLabel.LATEST, to_block=BlockLabel.LATEST)
+    )
+
+    current_time += 200
+    node.eth_get_filter_changes(block_filter)
+
+    current_time += 200
+    assert list(node.filter_stats()) == [block_filter]
+    with pytest.raises(FilterNotFound):
+        node.eth_get_filter_changes(log_filter)
+    assert node._log_filter_entries == {}
+
+
+def test_shared_block_filters(node, root_account, another_account):
+    rpc_node = RPCNode(node)
+    filter1 = node.eth_new_block_filter()
+    transfer(rpc_node, root_account, another_account, 10**9, 0)
+    filter2 = node.eth_new_block_filter()
+    transfer(rpc_node, root_account, another_account, 10**9, 1)
+
+    node2 = deepcopy(node)
+
+    hash1, hash2 = (
+        node.eth_get_block_by_number(number, with_transactions=False).hash_ for number in (1, 2)
+    )
+    assert node.eth_get_filter_changes(filter1) == [hash1, hash2]
+    assert node.eth_get_filter_changes(filter2) == [hash2]
+    assert node.eth_get_filter_changes(filter1) == []
+
+    # The copy has its own cursors
+    assert node2.eth_get_filter_changes(filter1) == [hash1, hash2]
+
+    # The entries received by all the filters are eventually discarded
+    for nonce in range(2, 100):
+        transfer(rpc_node, root_account, another_account, 10**9, nonce)
+        node.eth_get_filter_changes(filter1)
+        node.eth_get_filter_changes(filter2)
+    assert len(node._block_filters._entries) < 64
+
+
+def test_log_filters(node, root_account, another_account):
+    # Emits a log without data, with the topics 7 and the first word of the calldata
+    contract = Address(b"\x01" * 20)
+    node.set_code(contract, bytes.fromhex("600035600760006000a200"))
+    topic0 = LogTopic((7).to_bytes(32, byteorder="big"))
+    topic1s = [LogTopic(bytes([index]) * 32) for index in range(3)]
+
+    params = [
+        FilterParams(from_block=BlockLabel.LATEST, to_block=BlockLabel.LATEST, address=contract),
+        FilterParams(
+            from_block=BlockLabel.LATEST,
+            to_block=BlockLabel.LATEST,
+            topics=(topic0, (topic1s[0], topic1s[2])),
+        ),
+        FilterParams(
+            from_block=BlockLabel.LATEST, to_block=BlockLabel.LATEST, topics=(None, topic1s[1])
+        ),
+    ]
+    filter_ids = [node.eth_new_filter(filter_params) for filter_params in params]
+    first_block = node.eth_block_number() + 1
+
+    for nonce, topic1 in enumerate(topic1s):
+        tx = {
+            "type": 2,
+            "chainId": node.eth_chain_id(),
+            "to": contract.checksum,
+            "value": 0,
+            "gas": 100000,
+            "maxFeePerGas": int(node.eth_gas_price()),
+            "maxPriorityFeePerGas": 10**9,
+            "nonce": nonce,
+            "data": bytes(topic1),
+        }
+        node.eth_send_raw_transaction(root_account.sign_transaction(tx).raw_transaction)
+    transfer(RPCNode(node), root_account, another_account, 10**9, len(topic1s))
+
+    expected_topic1s = [topic1s, [topic1s[0], topic1s[2]], [topic1s[1]]]
+    for filter_id, filter_params, expected in zip(
+        filter_ids, params, expected_topic1s, strict=True
+    ):
+        changes = node.eth_get_filter_changes(filter_id)
+        assert [log_entry.topics for log_entry in changes] == [
+            (topic0, topic1) for topic1 in expected
+        ]
+        logs = node.eth_get_logs(
+            FilterParams(
+                from_block=first_block,
+                to_block=BlockLabel.LATEST,
+                address=filter_params.address,
+                topics=filter_params.topics,
+            )
+        )
+        assert changes == logs
+        assert node.eth_get_filter_changes(filter_id) == []
+
+
+def test_history_retention(root_account, another_account):
+    node = Node(root_balance_wei=10**18, state_history=2, block_history=4)
+    rpc_node = RPCNode(node)
+    kv_store = node._backend.chain.chaindb.db.wrapped_db.kv_store
+
+    transfer(rpc_node, root_account, another_account, 10**9, 0)
+    tx_hash = node.eth_get_block_by_number(1, with_transactions=False).transactions[0]
+
+    # Enough blocks to trigger a database cleanup
+    node.mine_blocks(100)
+    db_size = len(kv_store)
+
+    for nonce in range(1, 6):
+        transfer(rpc_node, root_account, another_account, 10**9, nonce)
+        node.mine_blocks(100)
+
+    # The pruned data is removed from the database
+    assert len(kv_store) <= db_size
+
+    latest = node.eth_block_number()
+    address = Address.from_hex(another_account.address)
+
+    # The recent blocks and states are available
+    node.eth_get_block_by_number(latest - 3, with_transactions=False)
+    assert node.eth_get_balance(address, latest - 1) == 6 * 10**9
+
+    # The old ones are not
+    with pytest.raises(BlockNotFound, match=r"The state at block .* has been pruned"):
+        node.eth_get_balance(address, latest - 2)
+    with pytest.raises(BlockNotFound, match=r"Block .* has been pruned"):
+        node.eth_get_block_by_number(latest - 4, with_transactions=False)
+    with pytest.raises(TransactionNotFound):
+        node.eth_get_transaction_by_hash(tx_hash)
+
+
+def test_dump_and_load_state(tmp_path, node, root_account, another_account):
+    rpc_node = RPCNode(node)
+    transfer(rpc_node, root_account, another_account, 10**9, 0)
+
+    path = tmp_path / "state.bin"
+    node.dump_state(path)
+    loaded = Node.load_state(path)
+    rpc_loaded = RPCNode(loaded)
+
+    assert rpc_loaded.rpc("eth_chainId") == rpc_node.rpc("eth_chainId")
+    assert rpc_loaded.rpc("eth_blockNumber") == "0x0"
+    assert get_balance(rpc_loaded, another_account) == 10**9
+    assert get_balance(rpc_loaded, root_account) == get_balance(rpc_node, root_account)
+
+    # The loaded chain can be extended
+    transfer(rpc_loaded, root_account, another_account, 10**9, 1)
+    assert get_balance(rpc_loaded, another_account) == 2 * 10**9
+
+
+def test_load_invalid_state(tmp_path):
+    path = tmp_path / "state.bin"
+    path.write_bytes(b"not a state")
+    with pytest.raises(ValidationError, match="Not a state file"):
+        Node.load_state(path)
+
+
+def test_load_truncated_state(tmp_path, node):
+    path = tmp_path / "state.bin"
+    node.dump_state(path)
+    data = path.read_bytes()
+
+    # Cut in the metadata, in the index, and in the values
+    for size in (30, len(data) // 2, len(data) - 1):
+        path.write_bytes(data[:size])
+        with pytest.raises(ValidationError, match="truncated or corrupted"):
+            Node.load_state(path)
+
+
+def test_load_state_invalid_metadata(tmp_path, node):
+    path = tmp_path / "state.bin"
+    node.dump_state(path)
+    data = path.read_bytes()
+
+    # The metadata length is stored in the header, so the replacements keep the length
+    for old, new in [(b'"chain_id"', b'"chain_ix"'), (b'"prague"', b"12345678")]:
+        path.write_bytes(data.replace(old, new, 1))
+        with pytest.raises(ValidationError, match="is missing or is not of type"):
+            Node.load_state(path)
+
+    path.write_bytes(data.replace(b'"prague"', b'"pragua"', 1))
+    with pytest.raises(ValidationError, match="Invalid state file metadata"):
+        Node.load_state(path)
+
+
+def test_load_state_lazily(tmp_path, node, root_account, another_account):
+    rpc_node = RPCNode(node)
+    transfer(rpc_node, root_account, another_account, 10**9, 0)
+    path = tmp_path / "state.bin"
+    node.dump_state(path)
+
+    loaded = Node.load_state(path)
+    # The state stays in the file, only the genesis block is kept in memory
+    overlay = loaded._backend.chain.chaindb.db.wrapped_db
+    assert all(key not in overlay.base for key in overlay.kv_store)
+
+    loaded_copy = deepcopy(loaded)
+    transfer(RPCNode(loaded), root_account, another_account, 10**9, 1)
+    assert get_balance(RPCNode(loaded), another_account) == 2 * 10**9
+    assert get_balance(RPCNode(loaded_copy), another_account) == 10**9
+
+    # A state can be dumped from a loaded node too
+    path2 = tmp_path / "state2.bin"
+    loaded.dump_state(path2)
+    assert get_balance(RPCNode(Node.load_state(path2)), another_account) == 2 * 10**9
+
+
+def test_apply_state_patch(node, another_account):
+    address = Address.from_hex(another_account.address)
+    # PUSH1 0 SLOAD PUSH1 0 MSTORE PUSH1 32 PUSH1 0 RETURN: returns the value at slot 0
+    code = bytes.fromhex("60005460005260206000f3")
+
+    block_number = node.eth_block_number()
+    node.apply_state_patch(
+        {address: AccountState(balance=10**18, nonce=5, code=code, storage={0: 123})}
+    )
+    # One block for the whole patch
+    assert node.eth_block_number() == block_number + 1
+
+    assert node.eth_get_balance(address, BlockLabel.LATEST) == 10**18
+    assert node.eth_get_transaction_count(address, BlockLabel.LATEST) == 5
+    assert node.eth_get_code(address, BlockLabel.LATEST) == code
+    assert node.eth_call(EthCallParams(to=address), BlockLabel.LATEST) == (123).to_bytes(32, "big")
+
+    # Invalid patches are not applied partially
+    with pytest.raises(ValidationError, match="Invalid state patch"):
+        node.apply_state_patch(
+            {address: AccountState(balance=1), Address(b"\x01" * 20): AccountState(balance=-1)}
+        )
+    assert node.eth_get_balance(address, BlockLabel.LATEST) == 10**18
+
+
+def test_genesis_accounts():
+    accounts = derive_accounts(3)
+    assert derive_accounts(2) == accounts[:2]
+
+    code = b"\x60\x00"
+    genesis_accounts = {address: AccountState(balance=10**18) for _key, address in accounts}
+    genesis_accounts[accounts[0][1]] = AccountState(nonce=1, code=code, storage={1: 2})
+    node = Node(root_balance_wei=10**18, genesis_accounts=genesis_accounts)
+
+    assert node.eth_block_number() == 0
+    for _key, address in accounts[1:]:
+        assert node.eth_get_balance(address, BlockLabel.LATEST) == 10**18
+    address = accounts[0][1]
+    assert node.eth_get_balance(address, BlockLabel.LATEST) == 0
+    assert node.eth_get_transaction_count(address, BlockLabel.LATEST) == 1
+    assert node.eth_get_code(address, BlockLabel.LATEST) == code
+    assert node.eth_get_storage_at(address, 1, BlockLabel.LATEST) == (2).to_bytes(32, "big")
+
+    with pytest.raises(ValidationError, match="Invalid balance"):
+        Node(root_balance_wei=10**18, genesis_accounts={address: AccountState(balance=-1)})
+
+
+def test_concurrent_reads(root_account, another_account):
+    node = Node(root_balance_wei=10**18, state_history=2, block_history=4)
+    rpc_node = RPCNode(node)
+    address = Address.from_hex(another_account.address)
+    errors = []
+    done = threading.Event()
+
+    def read():
+        try:
+            while not done.is_set():
+                node.eth_get_balance(address, BlockLabel.LATEST)
+                node.eth_get_block_by_number(BlockLabel.LATEST, with_transactions=True)
+        except Exception as exc:  # noqa: BLE001
+            errors.append(exc)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+
+    # Mining with pruning and transactions in parallel with the queries
+    for nonce in range(3):
+        transfer(rpc_node, root_account, another_account, 10**9, nonce)
+        node.mine_blocks(100)
+
+    done.set()
+    for reader in readers:
+        reader.join()
+    assert errors == []
+
+    # Queries do not wait for the mutations
+    with node._lock:
+        result = []
+        reader = threading.Thread(
+            target=lambda: result.append(node.eth_get_balance(address, BlockLabel.LATEST))
+        )
+        reader.start()
+        reader.join(timeout=10)
+        assert result == [3 * 10**9]
+
+
+def test_concurrent_latest_queries(root_account, another_account):
+    node = Node(root_balance_wei=10**18, auto_mine_transactions=False, mempool=True)
+    rpc_node = RPCNode(node)
+    address = Address.from_hex(another_account.address)
+    errors = []
+    done = threading.Event()
+
+    def read():
+        try:
+            while not done.is_set():
+                latest_number = node.eth_block_number()
+                latest = node.eth_get_block_by_number(BlockLabel.LATEST, with_transactions=False)
+                pending = node.eth_get_block_by_number(BlockLabel.PENDING, with_transactions=False)
+                assert latest_number <= latest.number < pending.number
+                node.eth_get_balance(address, BlockLabel.LATEST)
+                node.eth_fee_history(4, BlockLabel.LATEST, [50])
+                node.txpool_status()
+        except Exception as exc:  # noqa: BLE001
+            errors.append(exc)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+
+    for nonce in range(20):
+        transfer(rpc_node, root_account, another_account, 10**9, nonce)
+        node.mine_block()
+        node.mine_blocks(5)
+
+    done.set()
+    for reader in readers:
+        reader.join()
+    assert errors == []
+    assert node.eth_get_balance(address, BlockLabel.LATEST) == 20 * 10**9
+
+
+def test_async_node(root_account, another_account):
+    node = Node(root_balance_wei=10**18)
+    rpc_node = RPCNode(node)
+
+    async def run():
+        async_node = AsyncNode(node)
+        try:
+            filter_id = await async_node.eth_new_block_filter()
+            waiter = asyncio.create_task(async_node.wait_for_filter_changes(filter_id))
+            await asyncio.sleep(0.1)
+            assert not waiter.done()
+
+            # The change is made from another thread
+            await asyncio.to_thread(transfer, rpc_node, root_account, another_account, 10**9, 0)
+            block_hashes = await asyncio.wait_for(waiter, 10)
+            assert len(block_hashes) == 1
+
+            assert await async_node.wait_for_filter_changes(filter_id, timeout=0.1) == []
+
+            address = Address.from_hex(another_account.address)
+            assert await async_node.eth_get_balance(address, BlockLabel.LATEST) == 10**9
+            params = FilterParams(from_block=0, to_block=BlockLabel.LATEST)
+            assert await async_node.eth_get_logs(params) == node.eth_get_logs(params)
+
+            async_rpc_node = AsyncRPCNode(async_node)
+            assert await async_rpc_node.rpc("eth_blockNumber") == "0x1"
+            assert (
+                await async_rpc_node.rpc("eth_getLogs", {"fromBlock": "0x0", "toBlock": "latest"})
+                == []
+            )
+        finally:
+            async_node.close()
+
+    asyncio.run(run())
+
+
+def test_profile(node, root_account):
+    callee = Address(b"\xbb" * 20)
+    caller = Address(b"\xaa" * 20)
+    # PUSH1 1 PUSH1 0 SSTORE STOP
+    node.set_code(callee, bytes.fromhex("600160005500"))
+    # CALL(GAS, callee, 0, 0, 0, 0, 0) STOP
+    node.set_code(caller, bytes.fromhex("6000600060006000600073" + bytes(callee).hex() + "5af100"))
+
+    profile = node.debug_profile_call(EthCallParams(to=caller), BlockLabel.LATEST)
+    assert profile.success
+    assert [(frame.depth, frame.address) for frame in profile.call_frames] == [
+        (0, caller),
+        (1, callee),
+    ]
+    opcodes = {opcode.mnemonic: opcode for opcode in profile.opcodes}
+    assert opcodes["SSTORE"].count == 1
+    assert profile.opcodes[0].mnemonic == "SSTORE"
+    # The gas of the nested frames is not counted twice
+    assert sum(opcode.gas for opcode in profile.opcodes) == profile.gas
+    assert sum(contract.gas for contract in profile.contracts) == profile.gas
+    assert profile.call_frames[0].gas == profile.gas
+
+    # The same execution as a transaction, profiled by replaying it
+    tx = {
+        "type": 2,
+        "chainId": node.eth_chain_id(),
+        "to": caller.checksum,
+        "value": 0,
+        "gas": 100000,
+        "maxFeePerGas": node.eth_gas_price().as_wei(),
+        "maxPriorityFeePerGas": 10**9,
+        "nonce": 0,
+    }
+    tx_hash = node.eth_send_raw_transaction(root_account.sign_transaction(tx).raw_transaction)
+    tx_profile = node.debug_profile_transaction(tx_hash)
+    assert tx_profile.gas == profile.gas
+    assert [opcode.mnemonic for opcode in tx_profile.opcodes] == [
+        opcode.mnemonic for opcode in profile.opcodes
+    ]
+
+    rpc_profile = RPCNode(node).rpc("debug_profileTransaction", "0x" + bytes(tx_hash).hex())
+    assert rpc_profile["gas"] == hex(profile.gas)
+    assert rpc_profile["callFrames"][1]["address"] == callee.checksum
+
+    with pytest.raises(TransactionNotFound):
+        node.debug_profile_transaction(TxHash(b"\x00" * 32))
+
+    # The transactions executed after the state of their block was patched cannot be replayed
+    node.disable_auto_mine_transactions()
+    before_patch = call_contract(node, root_account, caller, 1)
+    node.set_code(callee, bytes.fromhex("00"))
+    after_patch = call_contract(node, root_account, caller, 2)
+    node.mine_block()
+    assert node.debug_profile_transaction(before_patch).success
+    with pytest.raises(ValidationError, match=r"state of its block .* was patched"):
+        node.debug_profile_transaction(after_patch)
+
+
+def test_record_and_replay(tmp_path, another_account):
+    path = tmp_path / "requests.jsonl"
+
+    node = Node(root_balance_wei=10**18, seed=b"seed")
+    root_account = Account.from_key(node.root_private_key)
+    recorder = RPCRecorder(RPCNode(node), path)
+    transfer(recorder, root_account, another_account, 10**9, 0)
+    recorder.rpc("evm_increaseTime", 100)
+    recorder.rpc("evm_mine")
+    recorder.rpc("eth_getBlockByNumber", "latest", True)
+    with pytest.raises(RPCError):
+        recorder.rpc("eth_getBalance", "0x00")
+    recorder.close()
+
+    # A node with the same seed produces the same responses
+    stats = replay_rpc(RPCNode(Node(root_balance_wei=10**18, seed=b"seed")), path, max_speed=True)
+    assert stats.requests == 7
+    assert stats.mismatches == 0
+    assert len(stats.latencies) == stats.requests
+    assert stats.latency_percentile(50) <= stats.latency_percentile(100) == max(stats.latencies)
+
+    # With a different seed the block hashes are different
+    stats = replay_rpc(RPCNode(Node(root_balance_wei=10**18, seed=b"other")), path, max_speed=True)
+    assert stats.mismatches > 0
+
+
+def test_deterministic_timestamps():
+    stored_timestamps = []
+    for _ in range(2):
+        node = Node(root_balance_wei=10**18, seed=b"seed")
+        # The virtual clock starts at the genesis timestamp
+        genesis = node.eth_get_block_by_number(0, with_transactions=False)
+        pending = node.eth_get_block_by_number(BlockLabel.PENDING, with_transactions=False)
+        assert pending.timestamp == genesis.timestamp + 1
+
+        root_account = Account.from_key(node.root_private_key)
+        contract = Address(b"\x01" * 20)
+        node.set_code(contract, TIMESTAMP_CONTRACT_CODE)
+        node.increase_time(100)
+        call_contract(node, root_account, contract, 0)
+
+        stored_timestamp = get_stored_timestamp(node, contract)
+        latest = node.eth_get_block_by_number(BlockLabel.LATEST, with_transactions=False)
+        assert stored_timestamp == latest.timestamp
+        stored_timestamps.append(stored_timestamp)
+
+    assert stored_timestamps[0] == stored_timestamps[1]
+
+
+def test_mempool(another_account):
+    (key1, address1), (key2, address2) = derive_accounts(2)
+    node = Node(
+        root_balance_wei=10**18,
+        auto_mine_transactions=False,
+        mempool=True,
+        genesis_accounts={
+            address: AccountState(balance=10**18) for address in (address1, address2)
+        },
+    )
+    gas_price = node.eth_gas_price().as_wei()
+
+    def send(key, nonce, tip, gas=21000):
+        tx = {
+            "type": 2,
+            "chainId": node.eth_chain_id(),
+            "to": another_account.address,
+            "value": 1,
+            "gas": gas,
+            "maxFeePerGas": gas_price + tip,
+            "maxPriorityFeePerGas": tip,
+            "nonce": nonce,
+        }
+        signed_tx = Account.from_key(key).sign_transaction(tx).raw_transaction
+        return node.eth_send_raw_transaction(signed_tx)
+
+    tx1 = send(key1, 0, 10**9)
+    # Two of these do not fit into one block
+    large_gas = (
+        node.eth_get_block_by_number(BlockLabel.LATEST, with_transactions=False).gas_limit - 10000
+    )
+    send(key1, 2, 10**9, gas=large_gas)  # Waits for nonce 1
+    tx2 = send(key2, 0, 5 * 10**9)
+    status = node.txpool_status()
+    assert (status.pending, status.queued) == (2, 1)
+    assert list(node.txpool_content().queued[address1]) == [2]
+    assert node.eth_get_transaction_by_hash(tx1).block_hash is None
+    with pytest.raises(TransactionNotFound):
+        node.eth_get_transaction_receipt(tx1)
+
+    with pytest.raises(ValidationError, match="underpriced"):
+        send(key1, 0, 10**9 + 1)
+
+    node.mine_block()
+    with pytest.raises(ValidationError, match="nonce 0 is too low"):
+        send(key2, 0, 10**9)
+
+    # The higher tip goes first
+    block = node.eth_get_block_by_number(BlockLabel.LATEST, with_transactions=False)
+    assert block.transactions == (tx2, tx1)
+    status = node.txpool_status()
+    assert (status.pending, status.queued) == (0, 1)
+
+    # Filling the gap
+    send(key1, 1, 10**9, gas=large_gas)
+    status = node.txpool_status()
+    assert (status.pending, status.queued) == (2, 0)
+    node.mine_block()
+    assert node.eth_get_transaction_count(address1, BlockLabel.LATEST) == 2
+    assert node.txpool_status().pending == 1
+    node.mine_block()
+    assert node.eth_get_transaction_count(address1, BlockLabel.LATEST) == 3
+
+    rpc_status = RPCNode(node).rpc("txpool_status")
+    assert rpc_status == {"pending": "0x0", "queued": "0x0"}
+
+
+def test_batch_mining_with_mempool():
+    ((key, address),) = derive_accounts(1)
+    node = Node(
+        root_balance_wei=10**18,
+        auto_mine_transactions=False,
+        mempool=True,
+        genesis_accounts={address: AccountState(balance=10**18)},
+    )
+    node.set_batch_mining(transactions=2)
+    account = Account.from_key(key)
+    to = Account.create()
+
+    rpc_node = RPCNode(node)
+    transfer(rpc_node, account, to, 10**9, 0)
+    # Cannot be included until the nonce 1 is sent, so it does not count towards the batch
+    transfer(rpc_node, account, to, 10**9, 2)
+    assert node.eth_block_number() == 0
+
+    transfer(rpc_node, account, to, 10**9, 1)
+    assert node.eth_block_number() == 1
+    assert get_balance(rpc_node, to) == 3 * 10**9
+
+
+def test_batch_and_interval_mining(node, root_account, another_account):
+    rpc_node = RPCNode(node)
+    rpc_node.rpc("evm_setAutomine", False)
+    node.set_batch_mining(transactions=2)
+    block_number = node.eth_block_number()
+
+    transfer(rpc_node, root_account, another_account, 10**9, 0)
+    assert node.eth_block_number() == block_number
+    transfer(rpc_node, root_account, another_account, 10**9, 1)
+    assert node.eth_block_number() == block_number + 1
+
+    rpc_node.rpc("evm_setIntervalMining", 20)
+    deadline = time.monotonic() + 5
+    while node.eth_block_number() < block_number + 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert node.eth_block_number() >= block_number + 3
+
+    rpc_node.rpc("evm_setIntervalMining", 0)
+    # A block may still be in the process of being mined
+    time.sleep(0.05)
+    block_number = node.eth_block_number()
+    time.sleep(0.1)
+    assert node.eth_block_number() == block_number
+
+
+def test_fee_history(node, root_account, another_account):
+    rpc_node = RPCNode(node)
+    node.disable_auto_mine_transactions()
+    for nonce, tip in enumerate([3, 1, 2]):
+        tx = {
+            "type": 2,
+            "chainId": node.eth_chain_id(),
+            "to": another_account.address,
+            "value": 1,
+            "gas": 21000,
+            "maxFeePerGas": node.eth_gas_price().as_wei() + 10**10,
+            "maxPriorityFeePerGas": tip * 10**9,
+            "nonce": nonce,
+        }
+        node.eth_send_raw_transaction(root_account.sign_transaction(tx).raw_transaction)
+    node.mine_blocks(2)
+
+    latest = node.eth_get_block_by_number(BlockLabel.LATEST, with_transactions=False)
+    history = node.eth_fee_history(10, BlockLabel.LATEST, [0, 50, 100])
+    assert history.oldest_block == 0
+    assert len(history.base_fee_per_gas) == 4
+    assert history.base_fee_per_gas[-2] == latest.base_fee_per_gas
+    assert history.gas_used_ratio[1] == 3 * 21000 / latest.gas_limit
+    assert history.reward[1] == (Amount.gwei(1), Amount.gwei(2), Amount.gwei(3))
+    assert history.reward[2] == (Amount(0), Amount(0), Amount(0))
+    assert node.eth_gas_price() == latest.base_fee_per_gas + Amount.gwei(1)
+
+    result = rpc_node.rpc("eth_feeHistory", 1, "latest", [50])
+    assert result["oldestBlock"] == hex(2)
+    assert result["reward"] == [["0x0"]]
+
+    with pytest.raises(RPCError, match="Expected at most 3 parameters, got 4"):
+        rpc_node.rpc("eth_feeHistory", 1, "latest", [50], [50])
+
+    with pytest.raises(ValidationError, match="monotonically increasing"):
+        node.eth_fee_history(1, BlockLabel.LATEST, [50, 10])
+
+
+def test_fee_history_retention():
+    node = Node(root_balance_wei=10**18, state_history=2, block_history=4)
+    # Not enough blocks to trigger a database cleanup
+    node.mine_blocks(10)
+    history = node.eth_fee_history(10, BlockLabel.LATEST, None)
+    assert history.oldest_block == 7
+    assert len(history.gas_used_ratio) == 4
+
+
+def test_block_receipts(node, root_account, another_account):
+    rpc_node = RPCNode(node)
+    node.disable_auto_mine_transactions()
+    for nonce in range(3):
+        transfer(rpc_node, root_account, another_account, 10**9, nonce)
+
+    with pytest.raises(BlockNotFound, match="pending block"):
+        node.eth_get_block_receipts(BlockLabel.PENDING)
+
+    node.mine_blocks(1)
+    block = node.eth_get_block_by_number(BlockLabel.LATEST, with_transactions=False)
+    receipts = node.eth_get_block_receipts(BlockLabel.LATEST)
+    assert receipts == [node.eth_get_transaction_receipt(tx_hash) for tx_hash in block.transactions]
+    assert [receipt.cumulative_gas_used for receipt in receipts] == [21000, 42000, 63000]
+
+    assert rpc_node.rpc("eth_getBlockReceipts", "latest")[2]["gasUsed"] == hex(21000)
+    assert rpc_node.rpc("eth_getBlockReceipts", hex(100)) is None
+
+
+def test_state_snapshot(node, another_account):
+    address = Address.from_hex(another_account.address)
+    start = node.eth_block_number()
+    # More blocks than the snapshot keeps, so that the oldest states are read from the tries
+    for i in range(1, 21):
+        node.apply_state_patch(
+            {address: AccountState(balance=i, storage={1: i % 3}, code=bytes([i]))}
+        )
+
+    for i in range(1, 21):
+        block = start + i
+        assert node.eth_get_balance(address, block) == i
+        assert node.eth_get_storage_at(address, 1, block) == (i % 3).to_bytes(32, byteorder="big")
+        assert node.eth_get_code(address, block) == bytes([i])
+    assert node.eth_get_balance(address, start) == 0
+
+    # Changes not mined yet are visible in the pending state only
+    node.disable_auto_mine_transactions()
+    node.set_storage_at(address, 2, 5)
+    assert node.eth_get_storage_at(address, 2, BlockLabel.PENDING)[-1] == 5
+    assert node.eth_get_storage_at(address, 2, BlockLabel.LATEST)[-1] == 0
+
+
+def test_state_snapshot_cache_size(monkeypatch):
+    monkeypatch.setattr(alysis._snapshot, "MAX_CACHED_ENTRIES", 8)
+    node = Node(root_balance_wei=10**18)
+    address = Address(b"\x01" * 20)
+    node.set_balance(address, 1)
+
+    # Nonexistent accounts are cached too, but only the recently requested ones are kept
+    for index in range(20):
+        assert node.eth_get_balance(Address(index.to_bytes(20, "big")), BlockLabel.LATEST) == 0
+    assert len(node._backend._snapshot._accounts) == 8
+
+    # The cached entries are dropped when a change to them is flattened into the base state
+    for balance in range(2, 4):
+        node.set_balance(address, balance)
+        for other_balance in range(20):
+            node.set_balance(Address(b"\x02" * 20), other_balance)
+        assert node.eth_get_balance(address, BlockLabel.LATEST) == balance
+
+
+def test_storage_range(node, another_account):
+    address = Address.from_hex(another_account.address)
+    node.apply_state_patch({address: AccountState(storage={slot: slot + 1 for slot in range(10)})})
+
+    entries = []
+    start_key = 32 * b"\x00"
+    while start_key is not None:
+        storage_range = node.debug_storage_range_at(address, BlockLabel.LATEST, start_key, 3)
+        assert len(storage_range.entries) <= 3
+        entries.extend(storage_range.entries)
+        start_key = storage_range.next_key
+
+    assert [entry.key for entry in entries] == sorted(entry.key for entry in entries)
+    assert {entry.slot: entry.value for entry in entries} == {slot: slot + 1 for slot in range(10)}
+
+    with pytest.raises(ValidationError, match="must be 32 bytes long"):
+        node.debug_storage_range_at(address, BlockLabel.LATEST, b"\x00", 3)
+
+
+def test_state_diff(node, root_account, another_account):
+    address = Address.from_hex(another_account.address)
+    diffs = []
+    unsubscribe = node.on_state_diff(diffs.append)
+
+    node.apply_state_patch({address: AccountState(balance=10**9, storage={1: 2})})
+    node.apply_state_patch({address: AccountState(storage={1: 3, 2: 4})})
+    unsubscribe()
+    node.mine_blocks(count=20)
+
+    assert [diff.block_number for diff in diffs] == [1, 2]
+
+    created = diffs[0].accounts[address]
+    assert created.old is None
+    assert created.new == AccountState(balance=10**9, nonce=0, code=b"", storage={1: 2})
+
+    # The block is no longer in the recent snapshot layers, so the tries are compared
+    changed = node.get_state_diff(2)
+    assert changed == diffs[1]
+    assert changed.accounts[address] == AccountDiff(
+        old=AccountState(balance=10**9, nonce=0, code=b"", storage={1: 2, 2: 0}),
+        new=AccountState(balance=10**9, nonce=0, code=b"", storage={1: 3, 2: 4}),
+    )
+
+    rpc_node = RPCNode(node)
+    transfer(rpc_node, root_account, another_account, 10**9, 0)
+    rpc_diff = rpc_node.rpc("debug_getStateDiff", "latest")
+    assert rpc_diff[another_account.address] == {
+        "balance": {"*": {"from": hex(10**9), "to": hex(2 * 10**9)}},
+        "nonce": "=",
+        "code": "=",
+        "storage": {},
+    }
+    assert rpc_diff[root_account.address]["nonce"] == {"*": {"from": "0x0", "to": "0x1"}}
+
+    with pytest.raises(BlockNotFound, match="genesis block"):
+        node.get_state_diff(0)
+    assert rpc_node.rpc("debug_getStateDiff", "pending") is None
+
+
+def test_state_diff_pruned_parent():
+    node = Node(root_balance_wei=10**18, state_history=1, block_history=20)
+    address = Address(b"\x05" * 20)
+    node.mine_blocks(60)
+    node.set_code(address, b"\x60\x00")
+    node.set_code(address, b"\x60\x01")
+    node.mine_blocks(2)
+
+    # The block is recent enough for its diff to be in the snapshot,
+    # but the state before it (and the old code) has been pruned
+    with pytest.raises(BlockNotFound, match="The state at block 61 has been pruned"):
+        node.get_state_diff(62)
+
+
+def test_listeners(node, root_account, another_account):
+    # Emits a log with the word 42 as data
+    contract = Address(b"\x01" * 20)
+    node.set_code(contract, bytes.fromhex("602a60005260206000a000"))
+
+    blocks = []
+    logs = []
+    other_logs = []
+    pending_transactions = []
+    node.on_block(blocks.append)
+    unsubscribe = node.on_logs(
+        FilterParams(from_block=BlockLabel.LATEST, to_block=BlockLabel.LATEST, address=contract),
+        logs.append,
+    )
+    node.on_logs(
+        FilterParams(
+            from_block=BlockLabel.LATEST, to_block=BlockLabel.LATEST, address=Address(b"\x02" * 20)
+        ),
+        other_logs.append,
+    )
+    node.on_pending_transaction(pending_transactions.append)
+
+    tx = {
+        "type": 2,
+        "chainId": node.eth_chain_id(),
+        "to": contract.checksum,
+        "value": 0,
+        "gas": 100000,
+        "maxFeePerGas": int(node.eth_gas_price()),
+        "maxPriorityFeePerGas": 10**9,
+        "nonce": 0,
+    }
+    tx_hash = node.eth_send_raw_transaction(root_account.sign_transaction(tx).raw_transaction)
+
+    assert pending_transactions == [tx_hash]
+    assert [block.number for block in blocks] == [2]
+    assert blocks[0].transactions == (tx_hash,)
+    assert len(logs) == 1
+    (log_entry,) = logs[0]
+    assert log_entry.address == contract
+    assert log_entry.data == (42).to_bytes(32, byteorder="big")
+    assert log_entry.transaction_hash == tx_hash
+    assert other_logs == []
+
+    unsubscribe()
+    unsubscribe()
+    transfer(RPCNode(node), root_account, another_account, 10**9, 1)
+    tx["nonce"] = 2
+    node.eth_send_raw_transaction(root_account.sign_transaction(tx).raw_transaction)
+    assert [block.number for block in blocks] == [2, 3, 4]
+    assert len(pending_transactions) == 3
+    assert len(logs) == 1
+
+
+def test_failing_listeners(caplog, node, root_account, another_account):
+    def fail(_value):
+        raise RuntimeError("listener error")
+
+    blocks = []
+    node.on_block(fail)
+    node.on_block(blocks.append)
+    node.on_pending_transaction(fail)
+    filter_id = node.eth_new_block_filter()
+
+    # The errors do not interrupt the processing of the mined blocks
+    node.mine_blocks(3)
+    assert len(blocks) == 3
+    assert len(node.eth_get_filter_changes(filter_id)) == 3
+
+    # The transaction is accepted and mined without the error propagating
+    rpc_node = RPCNode(node)
+    transfer(rpc_node, root_account, another_account, 10**9, 0)
+    assert get_balance(rpc_node, another_account) == 10**9
+    assert len(blocks) == 4
+
+    assert len(caplog.records) == 5
+    assert all(str(record.exc_info[1]) == "listener error" for record in caplog.records)
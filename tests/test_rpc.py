@@ -1,3 +1,7 @@
+import pytest
+from ethereum_rpc import RPCError
+
+
 def test_eth_get_balance(rpc_node, root_account, another_account):
     tx = {
         "type": 2,
@@ -42,3 +46,56 @@ def test_net_peer_count(rpc_node):
 
 def test_eth_coinbase(rpc_node):
     assert rpc_node.rpc("eth_coinbase") == "0x" + (20 * b"\x00").hex()
+
+
+def test_hardhat_mine(rpc_node):
+    assert rpc_node.rpc("hardhat_mine", hex(1000), hex(12))
+    assert rpc_node.rpc("eth_blockNumber") == hex(1000)
+
+    first = rpc_node.rpc("eth_getBlockByNumber", hex(1), False)
+    last = rpc_node.rpc("eth_getBlockByNumber", hex(1000), False)
+    assert int(last["timestamp"], 16) - int(first["timestamp"], 16) == 999 * 12
+    assert last["parentHash"] == rpc_node.rpc("eth_getBlockByNumber", hex(999), False)["hash"]
+
+
+def test_evm_increase_time(rpc_node):
+    latest = rpc_node.rpc("eth_getBlockByNumber", "latest", False)
+    assert rpc_node.rpc("evm_increaseTime", 3600) == "3600"
+    assert rpc_node.rpc("evm_mine") == "0x0"
+    mined = rpc_node.rpc("eth_getBlockByNumber", "latest", False)
+    assert int(mined["timestamp"], 16) - int(latest["timestamp"], 16) >= 3600
+
+
+def test_evm_mine_timestamp(rpc_node):
+    timestamp = int(rpc_node.rpc("eth_getBlockByNumber", "latest", False)["timestamp"], 16) + 100
+    rpc_node.rpc("evm_mine", timestamp)
+    assert rpc_node.rpc("eth_getBlockByNumber", "latest", False)["timestamp"] == hex(timestamp)
+
+
+def test_hardhat_set_state(rpc_node, another_account):
+    address = another_account.address
+    assert rpc_node.rpc("hardhat_setBalance", address, "0x1234") is True
+    assert rpc_node.rpc("anvil_setNonce", address, 7) is True
+    assert rpc_node.rpc("hardhat_setCode", address, "0x6000") is True
+    assert rpc_node.rpc("anvil_setStorageAt", address, "0x1", "0x" + "00" * 31 + "05") is True
+
+    assert rpc_node.rpc("eth_getBalance", address, "latest") == "0x1234"
+    assert rpc_node.rpc("eth_getTransactionCount", address, "latest") == "0x7"
+    assert rpc_node.rpc("eth_getCode", address, "latest") == "0x6000"
+    assert rpc_node.rpc("eth_getStorageAt", address, "0x1", "latest") == "0x" + "00" * 31 + "05"
+
+
+def test_eth_get_block_range(rpc_node):
+    rpc_node.rpc("hardhat_mine", hex(10))
+
+    blocks = rpc_node.rpc("eth_getBlockRange", hex(3), "latest", False)
+    assert [block["number"] for block in blocks] == [hex(number) for number in range(3, 11)]
+    assert blocks == [
+        rpc_node.rpc("eth_getBlockByNumber", hex(number), False) for number in range(3, 11)
+    ]
+
+    pending = rpc_node.rpc("eth_getBlockRange", "latest", "pending", False)
+    assert pending[1]["hash"] is None
+
+    with pytest.raises(RPCError, match="is after the last one"):
+        rpc_node.rpc("eth_getBlockRange", hex(5), hex(4), False)